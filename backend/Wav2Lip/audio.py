@@ -1,6 +1,7 @@
 import librosa
 import librosa.filters
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 # import tensorflow as tf
 from scipy import signal
 from scipy.io import wavfile
@@ -50,6 +51,34 @@ def melspectrogram(wav):
         return _normalize(S)
     return S
 
+def mel_chunk_starts(num_mel_frames, fps, mel_step_size=16):
+    """Start column of the mel window fed to the model for every video frame.
+
+    Windows advance by 80/fps columns and the final window is pinned to the end of
+    the spectrogram, exactly like the per-frame loop this replaces.
+    """
+    if num_mel_frames < mel_step_size:
+        raise ValueError('Audio too short: need at least {} mel frames, got {}'.format(mel_step_size, num_mel_frames))
+
+    mel_idx_multiplier = 80. / fps
+    last_start = num_mel_frames - mel_step_size
+    count = int(np.ceil((last_start + 1) / mel_idx_multiplier)) + 1
+    starts = (np.arange(count) * mel_idx_multiplier).astype(np.int64)
+    starts = starts[starts <= last_start]
+    return np.append(starts, last_start)
+
+def mel_windows(mel, mel_step_size=16):
+    """Zero-copy view of every ``mel_step_size`` wide window of ``mel``.
+
+    Returns a read-only array of shape (T - mel_step_size + 1, num_mels, mel_step_size)
+    whose entry ``s`` aliases ``mel[:, s:s + mel_step_size]``. Index it with the
+    result of ``mel_chunk_starts`` to gather a batch in a single copy.
+    """
+    num_mels, num_frames = mel.shape
+    row_stride, col_stride = mel.strides
+    return as_strided(mel, shape=(num_frames - mel_step_size + 1, num_mels, mel_step_size),
+                      strides=(col_stride, row_stride, col_stride), writeable=False)
+
 def _lws_processor():
     import lws
     return lws.lws(hp.n_fft, get_hop_size(), fftsize=hp.win_size, mode="speech")
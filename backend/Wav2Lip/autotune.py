@@ -0,0 +1,140 @@
+import json
+import os
+import sys
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PROFILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'autotune_profile.json')
+
+FACE_DET_CANDIDATES = (1, 2, 4, 8, 16, 32)
+WAV2LIP_CANDIDATES = (16, 32, 64, 128, 256)
+
+
+def wav2lip_variant(backend, threads, channels_last=False):
+    """Profile variant for the generator.
+
+    Its input is always 96x96 face crops, so the cost depends on the execution
+    backend and thread count rather than on the upload resolution. Tune after the
+    backend has been selected, so the profile describes the model that runs.
+    """
+    return '{}{}-t{}'.format(backend, '-cl' if channels_last else '', threads)
+
+
+def rss_mb():
+    """Resident set size of this process in MB (0 when it cannot be read)."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2 ** 20
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # Peak rather than current RSS, but still grows with the batch size
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+    except ImportError:
+        return 0.
+
+
+class BatchAutotuner:
+    """Picks batch sizes by measurement and remembers them across jobs.
+
+    On the first job for a given (stage, device, variant) each candidate batch
+    size is timed; the fastest one that stays within ``max_rss_mb`` is written to
+    a JSON profile, so later jobs -- including later ``inference.py`` processes --
+    reuse it without benchmarking again.
+    """
+
+    def __init__(self, profile_path=PROFILE_PATH, max_rss_mb=0, trials=2, tolerance=0.05):
+        self.profile_path = profile_path
+        self.max_rss_mb = max_rss_mb
+        self.trials = trials
+        # Prefer the smaller batch when it is within this fraction of the best fps
+        self.tolerance = tolerance
+        self.profile = self._read()
+
+    @staticmethod
+    def key(stage, device, variant):
+        """``variant`` is whatever the measured cost depends on besides the device:
+        the frame resolution (a shape tuple) for face detection, ``wav2lip_variant()``
+        for the generator."""
+        if isinstance(variant, (tuple, list)):
+            variant = '{}x{}'.format(*variant[:2])
+        return '{}:{}:{}'.format(stage, device, variant)
+
+    def lookup(self, stage, device, variant):
+        entry = self.profile.get(self.key(stage, device, variant))
+        return entry['batch_size'] if entry else None
+
+    def tune(self, stage, device, variant, run, candidates, max_items=None):
+        """Return the batch size to use for ``stage``, benchmarking on a profile miss.
+
+        ``run(batch_size)`` must process one batch of that many items. Candidates
+        above ``max_items`` (the size of the job) are skipped, and the sweep stops at
+        the first candidate that raises ``RuntimeError`` (out of memory) or exceeds
+        the RSS budget.
+        """
+        cached = self.lookup(stage, device, variant)
+        if cached is not None:
+            print('Autotune {}: using cached batch size {}'.format(stage, cached))
+            return cached
+
+        sizes = [b for b in candidates if max_items is None or b <= max_items] or [min(candidates)]
+        results = []
+        for batch_size in sizes:
+            try:
+                fps, rss = self._measure(run, batch_size)
+            except RuntimeError as e:
+                print('Autotune {}: batch size {} failed ({}), stopping sweep'.format(stage, batch_size, e))
+                break
+            print('Autotune {}: batch size {} -> {:.1f} frames/s, RSS {:.0f} MB'.format(stage, batch_size, fps, rss))
+            if self.max_rss_mb and rss > self.max_rss_mb:
+                break
+            results.append({'batch_size': batch_size, 'fps': round(fps, 2), 'rss_mb': round(rss, 1)})
+
+        if not results:
+            return sizes[0]
+
+        best_fps = max(r['fps'] for r in results)
+        best = next(r for r in results if r['fps'] >= best_fps * (1. - self.tolerance))
+        if max_items is None or max_items >= max(candidates):
+            # Only a full sweep is worth remembering; a short job could not try the larger sizes
+            self.profile[self.key(stage, device, variant)] = dict(best, sweep=results, time=int(time.time()))
+            self._write()
+        print('Autotune {}: selected batch size {}'.format(stage, best['batch_size']))
+        return best['batch_size']
+
+    def _measure(self, run, batch_size):
+        run(batch_size)  # warm-up: allocator growth, lazy init
+        start = time.perf_counter()
+        for _ in range(self.trials):
+            run(batch_size)
+        elapsed = time.perf_counter() - start
+        return batch_size * self.trials / elapsed, rss_mb()
+
+    def _read(self):
+        try:
+            with open(self.profile_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self):
+        # Several worker processes may tune concurrently: merge with what is on disk
+        # and replace the file atomically
+        profile = self._read()
+        profile.update(self.profile)
+        self.profile = profile
+        tmp_path = '{}.{}.tmp'.format(self.profile_path, os.getpid())
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.profile, f, indent=2)
+            os.replace(tmp_path, self.profile_path)
+        except OSError as e:
+            print('Autotune: could not save profile {}: {}'.format(self.profile_path, e))
@@ -0,0 +1,71 @@
+import cv2
+import numpy as np
+import torch
+
+
+class BatchAssembler:
+    """Reusable float32 NCHW input buffers for the Wav2Lip generator.
+
+    Faces and mel windows are written straight into buffers allocated once per job
+    (page-locked when running on CUDA), masked and normalised in place and handed to
+    the model as tensors sharing that memory, so building a batch allocates nothing.
+
+    The tensors returned by ``assemble`` alias the internal buffers: consume them
+    before assembling the next batch.
+    """
+
+    def __init__(self, batch_size, img_size=96, num_mels=80, mel_step_size=16, device='cpu'):
+        self.batch_size = batch_size
+        self.img_size = img_size
+        self.device = device
+
+        pin = 'cuda' in device and torch.cuda.is_available()
+        self._img = torch.empty((batch_size, 6, img_size, img_size), dtype=torch.float32, pin_memory=pin)
+        self._mel = torch.empty((batch_size, 1, num_mels, mel_step_size), dtype=torch.float32, pin_memory=pin)
+        # numpy views sharing storage with the tensors above
+        self._img_np = self._img.numpy()
+        self._mel_np = self._mel.numpy()
+        self._face = np.empty((img_size, img_size, 3), dtype=np.uint8)
+
+    def assemble(self, faces, mel_windows, mel_starts):
+        """Fill the buffers for one batch and return ``(img_batch, mel_batch)`` on ``device``.
+
+        ``faces`` is either a list of BGR uint8 crops (any size, resized here) or a
+        single crop that is reused for every item; ``mel_windows`` and ``mel_starts``
+        come from ``audio.mel_windows`` / ``audio.mel_chunk_starts``.
+        """
+        n = len(mel_starts)
+        if n > self.batch_size:
+            raise ValueError('Batch of {} exceeds assembler capacity {}'.format(n, self.batch_size))
+
+        img = self._img_np[:n]
+        if isinstance(faces, np.ndarray) and faces.ndim == 3:
+            # Static avatar: broadcast one face into every slot
+            self._fill(img, self._resized(faces))
+        else:
+            for i, face in enumerate(faces):
+                self._fill(img[i], self._resized(face))
+
+        # Channels 0-2 are the masked copy: zero their lower half, then normalise
+        img[..., :3, self.img_size // 2:, :] = 0
+        img *= 1. / 255.
+
+        mel = self._mel_np[:n, 0]
+        for i, start in enumerate(mel_starts):
+            mel[i] = mel_windows[start]
+
+        return (self._img[:n].to(self.device, non_blocking=True),
+                self._mel[:n].to(self.device, non_blocking=True))
+
+    @staticmethod
+    def _fill(dst, face):
+        # Copy from the uint8 source for both halves so numpy never sees overlapping
+        # operands (which would make it buffer the whole batch)
+        chw = face.transpose(2, 0, 1)
+        dst[..., :3, :, :] = chw
+        dst[..., 3:, :, :] = chw
+
+    def _resized(self, face):
+        if face.shape[:2] == (self.img_size, self.img_size):
+            return face
+        return cv2.resize(face, (self.img_size, self.img_size), dst=self._face)
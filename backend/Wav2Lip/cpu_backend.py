@@ -0,0 +1,142 @@
+import copy
+
+import torch
+from torch import nn
+
+BACKENDS = ('eager', 'torchscript', 'compile', 'int8')
+
+
+class FrameWav2Lip(nn.Module):
+    """Single-frame (B, C, H, W) forward of ``Wav2Lip`` without data-dependent control flow.
+
+    Same computation as ``Wav2Lip.forward`` for 4-D inputs, written so that it can be
+    traced by TorchScript and symbolically traced by FX for quantization.
+    """
+
+    def __init__(self, model):
+        super(FrameWav2Lip, self).__init__()
+        self.model = model
+
+    def forward(self, audio_sequences, face_sequences):
+        audio_embedding = self.model.audio_encoder(audio_sequences)
+
+        feats = []
+        x = face_sequences
+        for f in self.model.face_encoder_blocks:
+            x = f(x)
+            feats.append(x)
+
+        x = audio_embedding
+        for f in self.model.face_decoder_blocks:
+            x = f(x)
+            x = torch.cat((x, feats.pop()), dim=1)
+
+        return self.model.output_block(x)
+
+
+class ChannelsLast(nn.Module):
+    """Runs the wrapped model with NHWC (channels-last) activations."""
+
+    def __init__(self, model):
+        super(ChannelsLast, self).__init__()
+        self.model = model.to(memory_format=torch.channels_last)
+
+    def forward(self, audio_sequences, face_sequences):
+        return self.model(audio_sequences.contiguous(memory_format=torch.channels_last),
+                          face_sequences.contiguous(memory_format=torch.channels_last))
+
+
+def set_num_threads(num_threads):
+    """Pin torch's intra-op pool size; 0 keeps torch's default (one thread per core)."""
+    if num_threads and num_threads > 0:
+        torch.set_num_threads(num_threads)
+    return torch.get_num_threads()
+
+
+def psnr(reference, candidate):
+    mse = torch.mean((reference.float() - candidate.float()) ** 2).item()
+    if mse == 0:
+        return float('inf')
+    return 10 * torch.log10(torch.tensor(1. / mse)).item()
+
+
+def optimize_for_cpu(model, backend='eager', sample_inputs=None, num_threads=0,
+                     channels_last=False, min_psnr=35.):
+    """Return a CPU-optimised version of an eval-mode ``Wav2Lip`` generator.
+
+    ``backend`` is one of ``BACKENDS``:
+      - eager: the fp32 module as is
+      - torchscript: traced and frozen TorchScript graph
+      - compile: ``torch.compile`` (falls back to eager when unavailable)
+      - int8: FX static post-training quantization, calibrated on ``sample_inputs``
+
+    ``sample_inputs`` is a ``(mel_batch, img_batch)`` pair from the job being served.
+    Part of it is used for tracing/calibration and the rest is held out for a quality
+    check against the fp32 output (see ``split_held_out``): when the PSNR drops below
+    ``min_psnr`` the fp32 model is returned.
+    """
+    if backend not in BACKENDS:
+        raise ValueError('Unknown CPU backend {!r}, expected one of {}'.format(backend, BACKENDS))
+
+    threads = set_num_threads(num_threads)
+    print('CPU backend: {} ({} threads{})'.format(backend, threads, ', channels-last' if channels_last else ''))
+
+    if backend == 'eager' and not channels_last:
+        return model
+    if sample_inputs is None:
+        raise ValueError('The {} backend needs sample inputs for tracing and the quality check'.format(backend))
+
+    (mel_batch, img_batch), (check_mel, check_img) = split_held_out(*sample_inputs)
+    frame_model = FrameWav2Lip(model).eval()
+
+    try:
+        with torch.no_grad():
+            if backend == 'int8':
+                optimized = _quantize(frame_model, mel_batch, img_batch)
+            else:
+                optimized = ChannelsLast(copy.deepcopy(frame_model)) if channels_last else frame_model
+                if backend == 'torchscript':
+                    optimized = torch.jit.freeze(torch.jit.trace(optimized.eval(), (mel_batch, img_batch)))
+                elif backend == 'compile':
+                    optimized = torch.compile(optimized)
+
+            reference = model(check_mel, check_img)
+            score = psnr(reference, optimized(check_mel, check_img))
+    except Exception as e:
+        print('CPU backend {} unavailable, using fp32 eager: {}'.format(backend, e))
+        return model
+
+    print('CPU backend {} PSNR vs fp32: {:.2f} dB'.format(backend, score))
+    if score < min_psnr:
+        print('PSNR below {:.1f} dB, falling back to fp32 eager'.format(min_psnr))
+        return model
+    return optimized
+
+
+def split_held_out(mel_batch, img_batch):
+    """Split a sample batch into calibration inputs and held-out check inputs.
+
+    Scoring on the calibration batch would hide overfitting of the int8 activation
+    ranges (and of anything specialised while tracing). With two or more frames the
+    second half is held out; a single frame is checked on its mirrored face and
+    time-reversed mel window, which the calibration never saw.
+    """
+    if len(mel_batch) >= 2:
+        half = len(mel_batch) // 2
+        return (mel_batch[:half], img_batch[:half]), (mel_batch[half:], img_batch[half:])
+    return (mel_batch, img_batch), (torch.flip(mel_batch, dims=[-1]), torch.flip(img_batch, dims=[-1]))
+
+
+def _quantize(frame_model, mel_batch, img_batch):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = 'x86' if 'x86' in torch.backends.quantized.supported_engines else torch.backends.quantized.engine
+    torch.backends.quantized.engine = engine
+
+    # Conv + BatchNorm + ReLU blocks are fused by prepare_fx; observers pick up the
+    # activation ranges of the calibration batch
+    prepared = prepare_fx(copy.deepcopy(frame_model), get_default_qconfig_mapping(engine),
+                          (mel_batch, img_batch))
+    prepared(mel_batch, img_batch)
+    return convert_fx(prepared)
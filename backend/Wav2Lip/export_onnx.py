@@ -0,0 +1,112 @@
+"""
+Export the Wav2Lip generator and the S3FD face detector to ONNX.
+
+The files are written next to their .pth weights (wav2lip_gan.onnx, s3fd.onnx),
+which is where Wav2Lipv2Wrapper and SFDDetector look for them before falling back
+to torch. Run from the repository root:
+
+    python backend/Wav2Lip/export_onnx.py --checkpoint_path backend/checkpoints/wav2lip_gan.pth
+"""
+import argparse
+import inspect
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import torch
+
+from cpu_backend import FrameWav2Lip
+from onnx_backend import OnnxModule, onnx_available, onnx_path_for
+from face_detection.detection.sfd.net_s3fd import s3fd
+from face_detection.detection.sfd.sfd_detector import models_urls
+
+SFD_WEIGHTS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'face_detection', 'detection', 'sfd', 's3fd.pth')
+
+
+def load_wav2lip(path):
+    from models import Wav2Lip
+    checkpoint = torch.load(path, map_location=lambda storage, loc: storage)
+    s = checkpoint["state_dict"] if "state_dict" in checkpoint else checkpoint
+    model = Wav2Lip()
+    model.load_state_dict({k.replace('module.', ''): v for k, v in s.items()})
+    return model.eval()
+
+
+def load_s3fd(path):
+    if os.path.isfile(path):
+        weights = torch.load(path, map_location=lambda storage, loc: storage)
+    else:
+        from torch.utils.model_zoo import load_url
+        weights = load_url(models_urls['s3fd'], map_location=lambda storage, loc: storage)
+    net = s3fd()
+    net.load_state_dict(weights)
+    return net.eval()
+
+
+def export_wav2lip(model, out_path, opset):
+    mel = torch.randn(2, 1, 80, 16)
+    face = torch.rand(2, 6, 96, 96)
+    _export(FrameWav2Lip(model).eval(), (mel, face), out_path,
+            input_names=['mel', 'face'], output_names=['pred'],
+            dynamic_axes={'mel': {0: 'batch'}, 'face': {0: 'batch'}, 'pred': {0: 'batch'}},
+            opset_version=opset, do_constant_folding=True)
+    return (mel, face), model
+
+
+def export_s3fd(net, out_path, opset):
+    imgs = torch.randn(2, 3, 256, 320) * 50
+    output_names = ['{}{}'.format(kind, i) for i in range(1, 7) for kind in ('cls', 'reg')]
+    dynamic_axes = {name: {0: 'batch', 2: 'h_{}'.format(name), 3: 'w_{}'.format(name)} for name in output_names}
+    dynamic_axes['imgs'] = {0: 'batch', 2: 'height', 3: 'width'}
+    _export(net, (imgs,), out_path, input_names=['imgs'], output_names=output_names,
+            dynamic_axes=dynamic_axes, opset_version=opset, do_constant_folding=True)
+    return (imgs,), net
+
+
+def _export(model, inputs, out_path, **kwargs):
+    # Newer torch defaults to the dynamo exporter; the TorchScript exporter handles
+    # dynamic_axes and older opsets for these plain conv nets more reliably
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        kwargs['dynamo'] = False
+    with torch.no_grad():
+        torch.onnx.export(model, inputs, out_path, **kwargs)
+    print('Exported {}'.format(out_path))
+
+
+def verify(out_path, inputs, reference_model):
+    if not onnx_available(out_path):
+        print('onnxruntime not installed, skipping verification of {}'.format(out_path))
+        return
+    with torch.no_grad():
+        expected = reference_model(*inputs)
+    actual = OnnxModule(out_path)(*inputs)
+    if torch.is_tensor(expected):
+        expected, actual = [expected], [actual]
+    err = max(float(np.abs(e.numpy() - a.numpy()).max()) for e, a in zip(expected, actual))
+    print('{}: max abs diff vs torch = {:.2e}'.format(out_path, err))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export Wav2Lip and S3FD to ONNX for ONNX Runtime CPU inference')
+    parser.add_argument('--checkpoint_path', type=str, help='Wav2Lip checkpoint (.pth)')
+    parser.add_argument('--sfd_path', type=str, default=SFD_WEIGHTS, help='S3FD weights (downloaded if missing)')
+    parser.add_argument('--opset', type=int, default=13)
+    parser.add_argument('--skip_sfd', default=False, action='store_true')
+    args = parser.parse_args()
+
+    if args.checkpoint_path:
+        out_path = onnx_path_for(args.checkpoint_path)
+        inputs, model = export_wav2lip(load_wav2lip(args.checkpoint_path), out_path, args.opset)
+        verify(out_path, inputs, FrameWav2Lip(model).eval())
+
+    if not args.skip_sfd:
+        out_path = onnx_path_for(args.sfd_path)
+        inputs, net = export_s3fd(load_s3fd(args.sfd_path), out_path, args.opset)
+        verify(out_path, inputs, net)
+
+
+if __name__ == '__main__':
+    main()
@@ -45,7 +45,7 @@ ROOT = os.path.dirname(os.path.abspath(__file__))
 
 class FaceAlignment:
     def __init__(self, landmarks_type, network_size=NetworkSize.LARGE,
-                 device='cuda', flip_input=False, face_detector='sfd', verbose=False):
+                 device='cuda', flip_input=False, face_detector='sfd', verbose=False, num_threads=0):
         self.device = device
         self.flip_input = flip_input
         self.landmarks_type = landmarks_type
@@ -59,9 +59,24 @@ class FaceAlignment:
         # Get the face detector
         face_detector_module = __import__('face_detection.detection.' + face_detector,
                                           globals(), locals(), [face_detector], 0)
-        self.face_detector = face_detector_module.FaceDetector(device=device, verbose=verbose)
+        self.face_detector = face_detector_module.FaceDetector(device=device, verbose=verbose,
+                                                               num_threads=num_threads)
+
+    def get_detections_for_batch(self, images, max_side=0):
+        """Best face box ``(x1, y1, x2, y2)`` per image, or None.
+
+        With ``max_side`` > 0, frames whose longest side is larger are downscaled to it
+        before running the detector and the boxes are mapped back to full resolution,
+        so detection cost does not grow with the upload resolution.
+        """
+        h, w = images.shape[1:3]
+        scale_x = scale_y = 1.
+        if max_side and max(h, w) > max_side:
+            scale = max_side / float(max(h, w))
+            size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+            images = np.stack([cv2.resize(image, size, interpolation=cv2.INTER_AREA) for image in images])
+            scale_x, scale_y = size[0] / float(w), size[1] / float(h)
 
-    def get_detections_for_batch(self, images):
         images = images[..., ::-1]
         detected_faces = self.face_detector.detect_from_batch(images.copy())
         results = []
@@ -73,7 +88,8 @@ class FaceAlignment:
             d = d[0]
             d = np.clip(d, 0, None)
             
-            x1, y1, x2, y2 = map(int, d[:-1])
+            x1, y1, x2, y2 = d[0] / scale_x, d[1] / scale_y, d[2] / scale_x, d[3] / scale_y
+            x1, y1, x2, y2 = int(x1), int(y1), min(int(x2), w), min(int(y2), h)
             results.append((x1, y1, x2, y2))
 
         return results
\ No newline at end of file
@@ -8,15 +8,27 @@ from .net_s3fd import s3fd
 from .bbox import *
 from .detect import *
 
+try:
+    from onnx_backend import OnnxModule, onnx_available, onnx_path_for
+except ImportError:
+    OnnxModule = None
+
 models_urls = {
     's3fd': 'https://www.adrianbulat.com/downloads/python-fan/s3fd-619a316812.pth',
 }
 
 
 class SFDDetector(FaceDetector):
-    def __init__(self, device, path_to_detector=os.path.join(os.path.dirname(os.path.abspath(__file__)), 's3fd.pth'), verbose=False):
+    def __init__(self, device, path_to_detector=os.path.join(os.path.dirname(os.path.abspath(__file__)), 's3fd.pth'), verbose=False,
+                 num_threads=0):
         super(SFDDetector, self).__init__(device, verbose)
 
+        # Prefer the ONNX Runtime export (export_onnx.py) on CPU, fall back to torch
+        path_to_onnx = onnx_path_for(path_to_detector) if OnnxModule else None
+        if 'cpu' in device and OnnxModule and onnx_available(path_to_onnx):
+            self.face_detector = OnnxModule(path_to_onnx, num_threads=num_threads)
+            return
+
         # Initialise the face detector
         if not os.path.isfile(path_to_detector):
             model_weights = load_url(models_urls['s3fd'])
@@ -0,0 +1,83 @@
+import cv2
+import numpy as np
+
+
+class KeyframeFaceTracker:
+    """Face boxes for a video with S3FD on keyframes only.
+
+    Every ``keyframe_interval``-th frame goes through the detector (batched); the
+    frames in between are tracked by template-matching the last detected face in a
+    window around the previous box on a small grayscale copy. When the match score
+    drops below ``min_score`` the tracker has drifted (occlusion, fast motion, face
+    turning) and that frame is detected again, becoming the new reference.
+    """
+
+    def __init__(self, detector, keyframe_interval=10, min_score=0.6, search_margin=0.25,
+                 track_side=320, det_max_side=0):
+        self.detector = detector
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.min_score = min_score
+        self.search_margin = search_margin
+        self.track_side = track_side
+        self.det_max_side = det_max_side
+        self.detections = 0
+
+    def track(self, images, batch_size=16):
+        """Return one ``(x1, y1, x2, y2)`` box (or None when no face was found) per image."""
+        n = len(images)
+        h, w = images[0].shape[:2]
+        scale = min(1., self.track_side / float(max(h, w)))
+        size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+
+        keyframes = list(range(0, n, self.keyframe_interval))
+        boxes = [None] * n
+        for i in range(0, len(keyframes), batch_size):
+            idx = keyframes[i:i + batch_size]
+            for j, rect in zip(idx, self._detect([images[j] for j in idx])):
+                boxes[j] = rect
+
+        template = None
+        for i in range(n):
+            gray = cv2.cvtColor(cv2.resize(images[i], size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+            if i % self.keyframe_interval and boxes[i - 1] is not None:
+                box, score = self._match(gray, template, boxes[i - 1], scale)
+                if score >= self.min_score:
+                    boxes[i] = box
+                    continue
+                boxes[i] = self._detect([images[i]])[0]
+
+            template = self._crop(gray, boxes[i], scale) if boxes[i] is not None else None
+
+        print('Face tracking: {} detections for {} frames'.format(self.detections, n))
+        return boxes
+
+    def _detect(self, images):
+        self.detections += len(images)
+        return self.detector.get_detections_for_batch(np.array(images), self.det_max_side)
+
+    @staticmethod
+    def _crop(gray, box, scale):
+        x1, y1, x2, y2 = [int(round(v * scale)) for v in box]
+        return gray[y1:max(y2, y1 + 1), x1:max(x2, x1 + 1)]
+
+    def _match(self, gray, template, box, scale):
+        """Best position of ``template`` near ``box``; returns (box, normalised score)."""
+        th, tw = template.shape
+        x1, y1 = int(round(box[0] * scale)), int(round(box[1] * scale))
+        mx, my = int(tw * self.search_margin) + 1, int(th * self.search_margin) + 1
+        sx1, sy1 = max(0, x1 - mx), max(0, y1 - my)
+        sx2, sy2 = min(gray.shape[1], x1 + tw + mx), min(gray.shape[0], y1 + th + my)
+        window = gray[sy1:sy2, sx1:sx2]
+        if template.size == 0 or window.shape[0] < th or window.shape[1] < tw:
+            return box, -1.
+
+        result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (dx, dy) = cv2.minMaxLoc(result)
+        # Shift the previous full-resolution box by the matched offset
+        shift_x = (sx1 + dx - x1) / scale
+        shift_y = (sy1 + dy - y1) / scale
+        h, w = gray.shape[0] / scale, gray.shape[1] / scale
+        bw, bh = box[2] - box[0], box[3] - box[1]
+        nx1 = int(min(max(0, box[0] + shift_x), w - bw))
+        ny1 = int(min(max(0, box[1] + shift_y), h - bh))
+        return (nx1, ny1, nx1 + bw, ny1 + bh), score
@@ -6,6 +6,11 @@ from tqdm import tqdm
 from glob import glob
 import torch, face_detection
 from models import Wav2Lip
+from batching import BatchAssembler
+from compositor import Compositor
+from cpu_backend import BACKENDS, optimize_for_cpu
+from face_tracking import KeyframeFaceTracker
+from autotune import BatchAutotuner, FACE_DET_CANDIDATES, WAV2LIP_CANDIDATES, wav2lip_variant
 import platform
 
 # Path to local FFmpeg executable (Hardcoded relative path for now)
@@ -38,6 +43,9 @@ parser.add_argument('--wav2lip_batch_size', type=int, help='Batch size for Wav2L
 
 parser.add_argument('--resize_factor', default=1, type=int, 
 			help='Reduce the resolution by this factor. Sometimes, best results are obtained at 480p or 720p')
+parser.add_argument('--det_max_side', default=0, type=int,
+			help='Run face detection on a copy downscaled to this longest side (e.g. 480); boxes are mapped back '
+			'and the output keeps full resolution. 0 detects at full resolution')
 
 parser.add_argument('--crop', nargs='+', type=int, default=[0, -1, 0, -1], 
 					help='Crop video to a smaller region (top, bottom, left, right). Applied after resize_factor and rotate arg. ' 
@@ -54,6 +62,27 @@ parser.add_argument('--rotate', default=False, action='store_true',
 parser.add_argument('--nosmooth', default=False, action='store_true',
 					help='Prevent smoothing face detections over a short temporal window')
 
+parser.add_argument('--keyframe_interval', default=1, type=int,
+					help='For videos, run face detection every N frames and track the face in between '
+					'(re-detecting when tracking drifts). 1 detects on every frame')
+parser.add_argument('--track_min_score', default=0.6, type=float,
+					help='Template-match score below which a tracked frame is detected again')
+
+parser.add_argument('--feather', default=0.1, type=float,
+					help='Fraction of the face box over which the pasted face is blended into the frame. 0 disables blending')
+
+parser.add_argument('--cpu_backend', default='eager', choices=BACKENDS,
+					help='Wav2Lip execution mode on CPU: fp32 eager, TorchScript, torch.compile or int8 quantized')
+parser.add_argument('--num_threads', default=0, type=int,
+					help='Intra-op threads for CPU inference (0 keeps the torch default)')
+parser.add_argument('--channels_last', default=False, action='store_true',
+					help='Run the CPU model with channels-last (NHWC) memory format')
+
+parser.add_argument('--autotune', default=False, action='store_true',
+					help='Benchmark face detection and Wav2Lip batch sizes on the first job and reuse the best from the profile')
+parser.add_argument('--autotune_max_rss', default=0, type=int,
+					help='RSS budget in MB for autotuned batch sizes (0 means no limit)')
+
 args = parser.parse_args()
 args.img_size = 96
 
@@ -61,25 +90,39 @@ if os.path.isfile(args.face) and args.face.split('.')[1] in ['jpg', 'png', 'jpeg
 	args.static = True
 
 def get_smoothened_boxes(boxes, T):
-	for i in range(len(boxes)):
-		if i + T > len(boxes):
-			window = boxes[len(boxes) - T:]
-		else:
-			window = boxes[i : i + T]
-		boxes[i] = np.mean(window, axis=0)
-	return boxes
+	# Forward moving average over T boxes via a cumulative sum; the last T-1 boxes
+	# reuse the final full window
+	n = len(boxes)
+	T = min(T, n)
+	csum = np.zeros((n + 1, boxes.shape[1]), dtype=np.float64)
+	np.cumsum(boxes, axis=0, out=csum[1:])
+	starts = np.minimum(np.arange(n), n - T)
+	return ((csum[starts + T] - csum[starts]) / T).astype(boxes.dtype)
 
 def face_detect(images):
 	detector = face_detection.FaceAlignment(face_detection.LandmarksType._2D, 
-											flip_input=False, device=device)
+											flip_input=False, device=device, num_threads=args.num_threads)
 
 	batch_size = args.face_det_batch_size
+	if args.autotune and len(images) > 1:
+		# Keyed on the resolution the detector actually sees (frames are downscaled to det_max_side)
+		h, w = images[0].shape[:2]
+		scale = min(1., args.det_max_side / float(max(h, w))) if args.det_max_side else 1.
+		det_shape = (max(1, int(round(h * scale))), max(1, int(round(w * scale))))
+		batch_size = autotuner.tune('face_det', device, det_shape,
+									lambda n: detector.get_detections_for_batch(np.array(images[:n]), args.det_max_side),
+									FACE_DET_CANDIDATES, max_items=len(images))
 	
 	while 1:
 		predictions = []
 		try:
-			for i in tqdm(range(0, len(images), batch_size)):
-				predictions.extend(detector.get_detections_for_batch(np.array(images[i:i + batch_size])))
+			if args.keyframe_interval > 1 and len(images) > 1:
+				tracker = KeyframeFaceTracker(detector, args.keyframe_interval, args.track_min_score,
+											det_max_side=args.det_max_side)
+				predictions = tracker.track(images, batch_size)
+			else:
+				for i in tqdm(range(0, len(images), batch_size)):
+					predictions.extend(detector.get_detections_for_batch(np.array(images[i:i + batch_size]), args.det_max_side))
 		except RuntimeError:
 			if batch_size == 1: 
 				raise RuntimeError('Image too big to run face detection on GPU. Please use the --resize_factor argument')
@@ -111,9 +154,7 @@ def face_detect(images):
 	del detector
 	return results 
 
-def datagen(frames, mels):
-	img_batch, mel_batch, frame_batch, coords_batch = [], [], [], []
-
+def datagen(frames, mel_windows, mel_starts):
 	if args.box[0] == -1:
 		if not args.static:
 			face_det_results = face_detect(frames) # BGR2RGB for CNN face detection
@@ -124,45 +165,52 @@ def datagen(frames, mels):
 		y1, y2, x1, x2 = args.box
 		face_det_results = [[f[y1: y2, x1:x2], (y1, y2, x1, x2)] for f in frames]
 
-	for i, m in enumerate(mels):
-		idx = 0 if args.static else i%len(frames)
-		frame_to_save = frames[idx].copy()
-		face, coords = face_det_results[idx].copy()
-
-		face = cv2.resize(face, (args.img_size, args.img_size))
-			
-		img_batch.append(face)
-		mel_batch.append(m)
-		frame_batch.append(frame_to_save)
-		coords_batch.append(coords)
-
-		if len(img_batch) >= args.wav2lip_batch_size:
-			img_batch, mel_batch = np.asarray(img_batch), np.asarray(mel_batch)
-
-			img_masked = img_batch.copy()
-			img_masked[:, args.img_size//2:] = 0
-
-			img_batch = np.concatenate((img_masked, img_batch), axis=3) / 255.
-			mel_batch = np.reshape(mel_batch, [len(mel_batch), mel_batch.shape[1], mel_batch.shape[2], 1])
+	assembler = BatchAssembler(args.wav2lip_batch_size, args.img_size, device=device)
 
-			yield img_batch, mel_batch, frame_batch, coords_batch
-			img_batch, mel_batch, frame_batch, coords_batch = [], [], [], []
+	start = 0
+	while start < len(mel_starts):
+		# The batch size may be retuned by the consumer after the first batch (--autotune)
+		if assembler.batch_size != args.wav2lip_batch_size:
+			assembler = BatchAssembler(args.wav2lip_batch_size, args.img_size, device=device)
+		end = min(start + args.wav2lip_batch_size, len(mel_starts))
+		face_batch, frame_batch, coords_batch = [], [], []
 
-	if len(img_batch) > 0:
-		img_batch, mel_batch = np.asarray(img_batch), np.asarray(mel_batch)
+		for i in range(start, end):
+			idx = 0 if args.static else i%len(frames)
+			face, coords = face_det_results[idx]
 
-		img_masked = img_batch.copy()
-		img_masked[:, args.img_size//2:] = 0
+			face_batch.append(face)
+			frame_batch.append(frames[idx])
+			coords_batch.append(coords)
 
-		img_batch = np.concatenate((img_masked, img_batch), axis=3) / 255.
-		mel_batch = np.reshape(mel_batch, [len(mel_batch), mel_batch.shape[1], mel_batch.shape[2], 1])
+		# Resize, mask and normalise straight into the reusable NCHW buffers
+		img_batch, mel_batch = assembler.assemble(face_batch, mel_windows, mel_starts[start:end])
 
 		yield img_batch, mel_batch, frame_batch, coords_batch
+		start = end
 
 mel_step_size = 16
 device = 'cuda' if torch.cuda.is_available() else 'cpu'
 print('Using {} for inference.'.format(device))
 
+autotuner = BatchAutotuner(max_rss_mb=args.autotune_max_rss) if args.autotune else None
+
+def tune_wav2lip_batch_size(model, num_frames):
+	# Generator cost does not depend on the content, so random inputs are enough
+	mel = torch.rand(max(WAV2LIP_CANDIDATES), 1, 80, mel_step_size, device=device)
+	img = torch.rand(max(WAV2LIP_CANDIDATES), 6, args.img_size, args.img_size, device=device)
+
+	def run(n):
+		with torch.no_grad():
+			model(mel[:n], img[:n])
+		if device == 'cuda':
+			torch.cuda.synchronize()
+
+	backend = args.cpu_backend if device == 'cpu' else device
+	variant = wav2lip_variant(backend, torch.get_num_threads(), args.channels_last and device == 'cpu')
+	# A short clip only tries sizes it can fill (and is not stored in the profile)
+	return autotuner.tune('wav2lip', device, variant, run, WAV2LIP_CANDIDATES, max_items=num_frames)
+
 def _load(checkpoint_path):
 	if device == 'cuda':
 		checkpoint = torch.load(checkpoint_path)
@@ -251,47 +299,40 @@ def main():
 	if np.isnan(mel.reshape(-1)).sum() > 0:
 		raise ValueError('Mel contains nan! Using a TTS voice? Add a small epsilon noise to the wav file and try again')
 
-	mel_chunks = []
-	mel_idx_multiplier = 80./fps 
-	i = 0
-	while 1:
-		start_idx = int(i * mel_idx_multiplier)
-		if start_idx + mel_step_size > len(mel[0]):
-			mel_chunks.append(mel[:, len(mel[0]) - mel_step_size:])
-			break
-		mel_chunks.append(mel[:, start_idx : start_idx + mel_step_size])
-		i += 1
+	mel_windows = audio.mel_windows(mel, mel_step_size)
+	mel_starts = audio.mel_chunk_starts(mel.shape[1], fps, mel_step_size)
+
+	print("Length of mel chunks: {}".format(len(mel_starts)))
 
-	print("Length of mel chunks: {}".format(len(mel_chunks)))
+	full_frames = full_frames[:len(mel_starts)]
 
-	full_frames = full_frames[:len(mel_chunks)]
+	model = load_model(args.checkpoint_path)
 
 	batch_size = args.wav2lip_batch_size
-	gen = datagen(full_frames.copy(), mel_chunks)
+	gen = datagen(full_frames.copy(), mel_windows, mel_starts)
+	compositor = Compositor(feather=args.feather)
 
 	for i, (img_batch, mel_batch, frames, coords) in enumerate(tqdm(gen, 
-											total=int(np.ceil(float(len(mel_chunks))/batch_size)))):
+											total=int(np.ceil(float(len(mel_starts))/batch_size)))):
 		if i == 0:
-			model = load_model(args.checkpoint_path)
+			if device == 'cpu':
+				# The first batch doubles as tracing/calibration input and quality check
+				model = optimize_for_cpu(model, args.cpu_backend, (mel_batch, img_batch),
+										num_threads=args.num_threads, channels_last=args.channels_last)
+			if args.autotune:
+				# Tuned on the model that actually runs; later batches use the result
+				args.wav2lip_batch_size = tune_wav2lip_batch_size(model, len(mel_starts))
 			print ("Model loaded")
 
 			frame_h, frame_w = full_frames[0].shape[:-1]
 			out = cv2.VideoWriter('temp/result.avi', 
 									cv2.VideoWriter_fourcc(*'DIVX'), fps, (frame_w, frame_h))
 
-		img_batch = torch.FloatTensor(np.transpose(img_batch, (0, 3, 1, 2))).to(device)
-		mel_batch = torch.FloatTensor(np.transpose(mel_batch, (0, 3, 1, 2))).to(device)
-
 		with torch.no_grad():
 			pred = model(mel_batch, img_batch)
 
-		pred = pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.
-		
-		for p, f, c in zip(pred, frames, coords):
-			y1, y2, x1, x2 = c
-			p = cv2.resize(p.astype(np.uint8), (x2 - x1, y2 - y1))
-
-			f[y1:y2, x1:x2] = p
+		# Batched resize + feathered blend; source frames are never modified
+		for f in compositor.composite(pred, frames, coords):
 			out.write(f)
 
 	out.release()
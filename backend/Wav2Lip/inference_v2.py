@@ -10,6 +10,7 @@ import copy
 import math
 import os
 import platform
+import shutil
 import subprocess
 import sys
 import tempfile
@@ -25,6 +26,11 @@ import torch
 from PIL import Image
 from tqdm import tqdm
 from models import Wav2Lip as wav2lip_model
+from batching import BatchAssembler
+from compositor import Compositor
+from cpu_backend import optimize_for_cpu
+from onnx_backend import OnnxModule, onnx_available, onnx_path_for
+from autotune import BatchAutotuner, WAV2LIP_CANDIDATES, wav2lip_variant
 import audio
 
 import face_detection
@@ -65,6 +71,18 @@ def load_model(path):
     return model.eval()
 
 
+def load_generator(path, num_threads=0):
+    """ONNX Runtime session when an export sits next to the checkpoint (CPU only), else torch.
+
+    ``num_threads`` caps ONNX Runtime's intra-op threads (0 = its default), so pool workers
+    stay on their own core partition.
+    """
+    onnx_path = onnx_path_for(path)
+    if device == 'cpu' and onnx_available(onnx_path):
+        return OnnxModule(onnx_path, num_threads=num_threads)
+    return load_model(path)
+
+
 def get_video_fps(vfile):
     cap = cv2.VideoCapture(vfile)
     fps = cap.get(cv2.CAP_PROP_FPS)
@@ -76,40 +94,97 @@ class Wav2Lipv2Wrapper:
     A simplified wrapper for Wav2Lipv2 inference that matches the interface expected by main.py
     but implements the logic from the user provided code snippet.
     """
-    def __init__(self, checkpoint_path, ffmpeg_path):
+    def __init__(self, checkpoint_path, ffmpeg_path, cpu_backend='eager', num_threads=0, channels_last=False,
+                 autotune=False, det_max_side=0):
         self.checkpoint_path = checkpoint_path
         self.ffmpeg_path = ffmpeg_path
         self.device = device
-        self.model = load_model(self.checkpoint_path)
+        self.model = load_generator(self.checkpoint_path, num_threads)
+        # CPU optimisation needs a real batch for tracing/calibration, so it is
+        # applied on the first inference call (not needed for ONNX Runtime)
+        self.cpu_backend = cpu_backend
+        self.num_threads = num_threads
+        self.channels_last = channels_last
+        self._cpu_optimized = device != 'cpu' or isinstance(self.model, OnnxModule)
         self.img_size = 96 # Wav2Lip standard
         self.mel_step_size = 16
+        # Batch size is measured once per (device, backend, threads) and cached in the profile
+        self.autotuner = BatchAutotuner() if autotune else None
+        self.batch_size = 128
+        # Longest side face detection runs at (0 = full resolution), see FaceAlignment.get_detections_for_batch
+        self.det_max_side = det_max_side
+        # Seconds spent per phase (detect / infer / encode) by the last inference call
+        self.last_timings = {}
         print("Wav2Lipv2 Model loaded")
 
+    def _batch_size_for(self, num_frames):
+        """Autotuned generator batch size; call after the CPU backend has been applied"""
+        if self.autotuner is None:
+            return self.batch_size
+        mel = torch.rand(max(WAV2LIP_CANDIDATES), 1, 80, self.mel_step_size, device=device)
+        img = torch.rand(max(WAV2LIP_CANDIDATES), 6, self.img_size, self.img_size, device=device)
+
+        def run(n):
+            with torch.no_grad():
+                self.model(mel[:n], img[:n])
+            if device == 'cuda':
+                torch.cuda.synchronize()
+
+        if isinstance(self.model, OnnxModule):
+            variant = wav2lip_variant('onnx', self.num_threads)
+        elif device == 'cpu':
+            variant = wav2lip_variant(self.cpu_backend, torch.get_num_threads(), self.channels_last)
+        else:
+            variant = wav2lip_variant(device, 0)
+        # A short clip only tries sizes it can fill (and is not stored in the profile)
+        return self.autotuner.tune('wav2lip', device, variant, run, WAV2LIP_CANDIDATES, max_items=num_frames)
+
     def inference(self, face_path, audio_path, outfile):
+        # face_path may also be a decoded BGR frame and audio_path a 16 kHz float PCM
+        # array (e.g. handed over through shared memory by the inference pool)
+        # Intermediate files go to a private directory so that several wrappers
+        # (e.g. inference pool workers) can run at the same time
+        work_dir = tempfile.mkdtemp(prefix='wav2lip_')
+        self.last_timings = {}
+        try:
+            return self._inference(face_path, audio_path, outfile, work_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _inference(self, face_path, audio_path, outfile, work_dir):
         # This implements the core inference loop adapted for single image + audio
         
         # 1. Load Audio
-        if not audio_path.endswith('.wav'):
-             print('Extracting raw audio...')
-             temp_wav = 'temp/temp.wav'
-             command = '{} -y -i {} -strict -2 {}'.format(self.ffmpeg_path, audio_path, temp_wav)
-             subprocess.call(command, shell=True)
-             audio_path = temp_wav
+        if isinstance(audio_path, np.ndarray):
+             wav = audio_path
+             # ffmpeg still needs a file to mux the soundtrack (save_wav rescales in place)
+             audio_path = os.path.join(work_dir, 'audio.wav')
+             audio.save_wav(wav.astype(np.float32), audio_path, 16000)
+        else:
+             if not audio_path.endswith('.wav'):
+                  print('Extracting raw audio...')
+                  temp_wav = os.path.join(work_dir, 'temp.wav')
+                  command = '{} -y -i {} -strict -2 {}'.format(self.ffmpeg_path, audio_path, temp_wav)
+                  subprocess.call(command, shell=True)
+                  audio_path = temp_wav
+             wav = audio.load_wav(audio_path, 16000)
 
-        wav = audio.load_wav(audio_path, 16000)
         mel = audio.melspectrogram(wav)
         
         # 2. Load Face (Image)
-        if face_path.split('.')[1] in ['jpg', 'png', 'jpeg']:
-             frame = cv2.imread(face_path)
+        is_frame = isinstance(face_path, np.ndarray)
+        if is_frame or os.path.splitext(face_path)[1].lower() in ['.jpg', '.png', '.jpeg']:
+             frame = face_path if is_frame else cv2.imread(face_path)
              fps = 25.0 # Default for image
              
              # Face Detection
-             detector = face_detection.FaceAlignment(face_detection.LandmarksType._2D, flip_input=False, device=device)
+             phase_start = time.perf_counter()
+             detector = face_detection.FaceAlignment(face_detection.LandmarksType._2D, flip_input=False, device=device,
+                                                     num_threads=self.num_threads)
              
              # Detect face
              batch_size = 1 # Simple batch
-             predictions = detector.get_detections_for_batch(np.array([frame]))
+             predictions = detector.get_detections_for_batch(np.array([frame]), self.det_max_side)
              rect = predictions[0]
              
              if rect is None:
@@ -124,76 +199,57 @@ class Wav2Lipv2Wrapper:
              
              face_crop = frame[y1:y2, x1:x2]
              coords = (y1, y2, x1, x2)
+             self.last_timings['detect'] = time.perf_counter() - phase_start
              
              # Resize to model input
              face_resized = cv2.resize(face_crop, (self.img_size, self.img_size))
              
              # Generate Frames
-             mel_idx_multiplier = 80./fps
-             i = 0
-             mel_chunks = []
-             while 1:
-                 start_idx = int(i * mel_idx_multiplier)
-                 if start_idx + self.mel_step_size > len(mel[0]):
-                     mel_chunks.append(mel[:, len(mel[0]) - self.mel_step_size:])
-                     break
-                 mel_chunks.append(mel[:, start_idx : start_idx + self.mel_step_size])
-                 i += 1
+             mel_windows = audio.mel_windows(mel, self.mel_step_size)
+             mel_starts = audio.mel_chunk_starts(mel.shape[1], fps, self.mel_step_size)
              
-             print(f"Generating {len(mel_chunks)} frames...")
+             print(f"Generating {len(mel_starts)} frames...")
              
              # Inference Loop
-             batch_size = 128
-             gen_frames = []
-             
-             # Prepare Batches
-             img_batch = []
-             mel_batch_list = []
+             phase_start = time.perf_counter()
+             if not self._cpu_optimized:
+                 # The first batch of the job is the tracing/calibration input; optimising before
+                 # tuning makes the tuned batch size describe the model that actually runs
+                 sample = BatchAssembler(min(self.batch_size, len(mel_starts)), self.img_size, device=device)
+                 img_b, mel_b = sample.assemble(face_resized, mel_windows, mel_starts[:self.batch_size])
+                 self.model = optimize_for_cpu(self.model, self.cpu_backend, (mel_b, img_b),
+                                               num_threads=self.num_threads, channels_last=self.channels_last)
+                 self._cpu_optimized = True
+             batch_size = self._batch_size_for(len(mel_starts))
              
-             for m in mel_chunks:
-                 img_batch.append(face_resized)
-                 mel_batch_list.append(m)
+             # Masking (Wav2Lip specific: mask lower half) and normalisation happen
+             # in place inside the assembler's reusable buffers
+             assembler = BatchAssembler(batch_size, self.img_size, device=device)
              
-             img_batch = np.asarray(img_batch)
-             mel_batch_list = np.asarray(mel_batch_list)
-             
-             # Masking (Wav2Lip specific: mask lower half)
-             img_masked = img_batch.copy()
-             img_masked[:, self.img_size//2:] = 0
-             img_batch = np.concatenate((img_masked, img_batch), axis=3) / 255.
-             mel_batch_list = np.reshape(mel_batch_list, [len(mel_batch_list), mel_batch_list.shape[1], mel_batch_list.shape[2], 1])
+             # Predict and composite each batch straight into the output video
+             temp_video = os.path.join(work_dir, 'result.avi')
+             frame_h, frame_w = frame.shape[:-1]
+             out = cv2.VideoWriter(temp_video, cv2.VideoWriter_fourcc(*'DIVX'), fps, (frame_w, frame_h))
+             compositor = Compositor()
              
-             # Predict
-             pred_batches = []
-             for i in tqdm(range(0, len(img_batch), batch_size)):
-                 img_b = torch.FloatTensor(np.transpose(img_batch[i:i+batch_size], (0, 3, 1, 2))).to(device)
-                 mel_b = torch.FloatTensor(np.transpose(mel_batch_list[i:i+batch_size], (0, 3, 1, 2))).to(device)
+             for i in tqdm(range(0, len(mel_starts), batch_size)):
+                 img_b, mel_b = assembler.assemble(face_resized, mel_windows, mel_starts[i:i+batch_size])
                  
                  with torch.no_grad():
                      pred = self.model(mel_b, img_b)
                  
-                 pred = pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.
-                 pred_batches.append(pred)
-                 
-             pred_all = np.concatenate(pred_batches, axis=0)
-             
-             # Reconstruct Video
-             temp_video = 'temp/result.avi'
-             frame_h, frame_w = frame.shape[:-1]
-             out = cv2.VideoWriter(temp_video, cv2.VideoWriter_fourcc(*'DIVX'), fps, (frame_w, frame_h))
-             
-             for p in pred_all:
-                 p = cv2.resize(p.astype(np.uint8), (x2 - x1, y2 - y1))
-                 
-                 f = frame.copy()
-                 f[y1:y2, x1:x2] = p
-                 out.write(f)
+                 n = len(pred)
+                 for f in compositor.composite(pred, [frame] * n, [coords] * n):
+                     out.write(f)
                  
              out.release()
+             self.last_timings['infer'] = time.perf_counter() - phase_start
              
              # Merge Audio
+             phase_start = time.perf_counter()
              command = '{} -y -i {} -i {} -strict -2 -q:v 1 {}'.format(self.ffmpeg_path, audio_path, temp_video, outfile)
              subprocess.call(command, shell=True)
+             self.last_timings['encode'] = time.perf_counter() - phase_start
              
              return outfile
 
@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+import torch
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+
+def onnx_available(path):
+    """True when ONNX Runtime is installed and an exported model exists at ``path``."""
+    return ort is not None and bool(path) and os.path.isfile(path)
+
+
+def onnx_path_for(weights_path):
+    """The ONNX file ``export_onnx.py`` writes next to a ``.pth`` checkpoint."""
+    return os.path.splitext(weights_path)[0] + '.onnx'
+
+
+class OnnxModule:
+    """Drop-in replacement for an eval-mode torch module, backed by ONNX Runtime on CPU.
+
+    Accepts torch tensors or numpy arrays and returns torch tensors (a list when the
+    graph has several outputs), so existing pre/post-processing works unchanged.
+    """
+
+    def __init__(self, path, num_threads=0):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if num_threads and num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        print('Loaded ONNX model: {}'.format(path))
+
+    def __call__(self, *inputs):
+        feeds = {name: _to_numpy(x) for name, x in zip(self.input_names, inputs)}
+        outputs = [torch.from_numpy(o) for o in self.session.run(None, feeds)]
+        return outputs[0] if len(outputs) == 1 else outputs
+
+    def eval(self):
+        return self
+
+    def to(self, *args, **kwargs):
+        return self
+
+
+def _to_numpy(x):
+    if torch.is_tensor(x):
+        x = x.detach().cpu().numpy()
+    return np.ascontiguousarray(x, dtype=np.float32)
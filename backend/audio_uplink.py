@@ -0,0 +1,129 @@
+"""
+上行音频聚合
+浏览器按采集回调的大小发送 PCM（ScriptProcessor 4096 采样 / AudioWorklet 128 采样），
+这里把它重新切成服务端推荐的帧长（ASR 200ms、实时对话 100ms）再发送；
+缓冲里最早的数据等待超过 flush_timeout 时先把不足一帧的部分发出去，避免说话末尾被卡住。
+同时按 RFC 3550 的方法估计到达抖动。
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+
+class UplinkAggregator:
+    """
+    Args:
+        send: async send(segment)，按顺序逐帧调用
+        frame_ms: 目标帧长（毫秒）
+        sample_rate / sample_width / channels: PCM 格式，用于把时长换算成字节并按采样对齐
+        flush_timeout_ms: 不足一帧的数据最多等待多久
+    """
+
+    def __init__(self, send: Callable[[bytes], Awaitable[None]], frame_ms: int = 200, sample_rate: int = 16000,
+                 sample_width: int = 2, channels: int = 1, flush_timeout_ms: int = 300):
+        self.send = send
+        self.frame_ms = frame_ms
+        self.sample_bytes = sample_width * channels
+        self.bytes_per_ms = sample_rate * self.sample_bytes / 1000
+        self.frame_bytes = max(self.sample_bytes, int(sample_rate * frame_ms / 1000) * self.sample_bytes)
+        self.flush_timeout = flush_timeout_ms / 1000
+
+        self._buffer = bytearray()
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._closed = False
+
+        # jitter: 到达间隔与音频时长之差的平滑绝对值
+        self._last_arrival: Optional[float] = None
+        self._last_duration = 0.0
+        self.jitter = 0.0
+        self.max_gap = 0.0
+
+        self.chunks_in = 0
+        self.bytes_in = 0
+        self.frames_out = 0
+        self.timeout_flushes = 0
+
+    async def push(self, data: bytes):
+        if self._closed or not data:
+            return
+        self._track_arrival(len(data))
+        async with self._lock:
+            was_empty = not self._buffer
+            self._buffer.extend(data)
+            sent = False
+            while len(self._buffer) >= self.frame_bytes:
+                segment = bytes(self._buffer[:self.frame_bytes])
+                del self._buffer[:self.frame_bytes]
+                await self._send(segment)
+                sent = True
+            if not self._buffer:
+                self._cancel_timer()
+            elif was_empty or sent:
+                # 剩下的数据（大部分）是这次刚到的，从现在开始计时
+                self._arm_timer()
+
+    async def flush(self):
+        """把缓冲里剩下的（按采样对齐的）数据立即发出"""
+        async with self._lock:
+            self._cancel_timer()
+            size = len(self._buffer) - len(self._buffer) % self.sample_bytes
+            if size:
+                segment = bytes(self._buffer[:size])
+                del self._buffer[:size]
+                await self._send(segment)
+
+    async def close(self):
+        """发送剩余数据；之后的 push 被忽略"""
+        if self._closed:
+            return
+        await self.flush()
+        self._closed = True
+
+    async def _send(self, segment: bytes):
+        self.frames_out += 1
+        await self.send(segment)
+
+    async def _on_timeout(self):
+        self._timer = None
+        if self._buffer and not self._closed:
+            self.timeout_flushes += 1
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[Uplink] Timeout flush failed: {e}")
+
+    def _arm_timer(self):
+        self._cancel_timer()
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(self.flush_timeout, lambda: asyncio.ensure_future(self._on_timeout()))
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _track_arrival(self, size: int):
+        now = time.monotonic()
+        if self._last_arrival is not None:
+            gap = now - self._last_arrival
+            self.max_gap = max(self.max_gap, gap)
+            # 上一块音频的时长就是理想的到达间隔
+            self.jitter += (abs(gap - self._last_duration) - self.jitter) / 16
+        self._last_arrival = now
+        self._last_duration = size / self.bytes_per_ms / 1000
+        self.chunks_in += 1
+        self.bytes_in += size
+
+    def stats(self) -> dict:
+        return {
+            "chunks_in": self.chunks_in,
+            "bytes_in": self.bytes_in,
+            "frames_out": self.frames_out,
+            "timeout_flushes": self.timeout_flushes,
+            "frame_ms": self.frame_ms,
+            "jitter_ms": round(self.jitter * 1000, 1),
+            "max_gap_ms": round(self.max_gap * 1000, 1),
+            "buffered_ms": round(len(self._buffer) / self.bytes_per_ms, 1),
+        }
@@ -0,0 +1,64 @@
+"""
+TTS 连接池基准
+在本地替身服务（volc_standin.py，模拟 50ms 握手）上对比每次新建连接与 TTSConnectionPool 复用连接的
+顺序请求延迟，并验证服务端断开后连接池能自动重连。
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from volc_standin import VolcTTSStandin
+from volc_tts import TTSConnectionPool, generate_volc_tts_ws
+
+
+async def _sequential(pool, requests, output_path):
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        await generate_volc_tts_ws(f"你好 {i}", output_path, "standin_voice", app_id="app", token="token",
+                                   cluster="volcano_tts", pool=pool)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _summary(latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    return f"mean {statistics.mean(latencies) * 1e3:7.1f} ms  p95 {p95 * 1e3:7.1f} ms"
+
+
+async def run(requests=30, handshake_delay=0.05):
+    output_path = os.path.join(tempfile.gettempdir(), "bench_tts_pool.mp3")
+
+    async with VolcTTSStandin(handshake_delay=handshake_delay) as server:
+        # max_idle=0: every request opens (and closes) its own connection, as before
+        cold = TTSConnectionPool(server.url, max_idle=0)
+        cold_lat = await _sequential(cold, requests, output_path)
+        cold_conns = server.connections
+
+        warm = TTSConnectionPool(server.url)
+        warm_lat = await _sequential(warm, requests, output_path)
+        warm_conns = server.connections - cold_conns
+        await warm.close()
+
+    print(f"new connection per request: {_summary(cold_lat)}  connections {cold_conns}")
+    print(f"pooled connections:         {_summary(warm_lat)}  connections {warm_conns}  {warm.stats}")
+
+    # Server closes every connection after 3 requests: the pool must notice and reconnect
+    async with VolcTTSStandin(handshake_delay=0, max_requests_per_conn=3) as server:
+        pool = TTSConnectionPool(server.url)
+        await _sequential(pool, 10, output_path)
+        await pool.close()
+        print(f"server-side close every 3 requests: 10 ok, {server.connections} connections, {pool.stats}")
+
+    os.remove(output_path)
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,99 @@
+"""
+火山引擎二进制帧编解码基准
+对比旧实现（下面的 legacy_*，也是 tests/test_volc_protocol.py 的对照实现）与 volc_codec
+在 TTS 音频分片大小下的编解码耗时。正确性由 tests/test_volc_protocol.py 的往返 fuzz 保证：
+
+    python -m pytest backend/tests
+"""
+
+import io
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import volc_codec as codec
+from volc_protocol import Message, MsgType, MsgTypeFlagBits
+
+
+# ---- 旧实现（BytesIO + 每条消息构造读写函数列表），作为对照 ----
+
+LEGACY_SEQ_TYPES = [
+    MsgType.FullClientRequest,
+    MsgType.FullServerResponse,
+    MsgType.FrontEndResultServer,
+    MsgType.AudioOnlyClient,
+    MsgType.AudioOnlyServer,
+]
+
+
+def legacy_marshal(msg: Message) -> bytes:
+    buffer = io.BytesIO()
+    buffer.write(struct.pack("B", (msg.version << 4) | msg.header_size))
+    buffer.write(struct.pack("B", (msg.type << 4) | msg.flag))
+    buffer.write(struct.pack("B", (msg.serialization << 4) | msg.compression))
+    buffer.write(b"\x00")
+    writers = []
+    if msg.type in LEGACY_SEQ_TYPES:
+        if msg.flag in [MsgTypeFlagBits.PositiveSeq, MsgTypeFlagBits.NegativeSeq]:
+            writers.append(lambda b: b.write(struct.pack(">i", msg.sequence)))
+    elif msg.type == MsgType.Error:
+        writers.append(lambda b: b.write(struct.pack(">I", msg.error_code)))
+    writers.append(lambda b: (b.write(struct.pack(">I", len(msg.payload))), b.write(msg.payload)))
+    for writer in writers:
+        writer(buffer)
+    return buffer.getvalue()
+
+
+def legacy_from_bytes(data: bytes) -> Message:
+    msg = Message(type=MsgType(data[1] >> 4), flag=MsgTypeFlagBits(data[1] & 0b1111))
+    buffer = io.BytesIO(data)
+    buffer.read(4)
+    readers = []
+    if msg.type in LEGACY_SEQ_TYPES:
+        if msg.flag in [MsgTypeFlagBits.PositiveSeq, MsgTypeFlagBits.NegativeSeq]:
+            readers.append(lambda b: setattr(msg, "sequence", struct.unpack(">i", b.read(4))[0]))
+    elif msg.type == MsgType.Error:
+        readers.append(lambda b: setattr(msg, "error_code", struct.unpack(">I", b.read(4))[0]))
+
+    def read_payload(b):
+        size_bytes = b.read(4)
+        if size_bytes:
+            size = struct.unpack(">I", size_bytes)[0]
+            if size > 0:
+                msg.payload = b.read(size)
+    readers.append(read_payload)
+    for reader in readers:
+        reader(buffer)
+    return msg
+
+
+# ---- benchmark ----
+
+def _time(fn, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def bench(repeat=20000):
+    print(f"{'case':<34}{'legacy us':>12}{'fast us':>12}{'speedup':>10}")
+    for size in (320, 4096, 32768):
+        msg = Message(type=MsgType.AudioOnlyServer, flag=MsgTypeFlagBits.PositiveSeq,
+                      sequence=7, payload=os.urandom(size))
+        data = msg.marshal()
+        for name, legacy, fast, arg in (
+            (f"marshal audio {size}B", legacy_marshal, Message.marshal, msg),
+            (f"unmarshal audio {size}B", legacy_from_bytes, Message.from_bytes, data),
+            (f"volc_codec.decode audio {size}B", lambda d: legacy_from_bytes(d).payload,
+             lambda d: codec.decode(d).payload, data),
+        ):
+            old, new = _time(legacy, arg, repeat), _time(fast, arg, repeat)
+            print(f"{name:<34}{old:>12.2f}{new:>12.2f}{old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
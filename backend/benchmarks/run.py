@@ -0,0 +1,465 @@
+"""
+后端热路径基准套件
+离线运行，不访问火山引擎 / 方舟：协议帧、词库、消息文件、音频和模型输入都在本地生成，
+模型在没有权重文件时使用固定种子的随机权重（只测吞吐，不看结果）。
+
+用例：
+- content_filter: ContentFilter.filter_input，词库规模由 --lexicon-size 指定（默认 50000 词）
+- json_persist:   main.py 的 add_message_to_conversation / save_chat_message，文件中已有 10k / 100k 条消息
+- volc_protocol:  ResponseParser.parse_response（ASR 结果帧）与 Message.marshal（TTS 音频帧）
+- audio:          Wav2Lip audio.melspectrogram
+- s3fd:           S3FD batch_detect（CPU）
+- wav2lip:        Wav2Lip 前向吞吐（CPU）
+
+结果写成 JSON（--output），并与保存的基线比较（--baseline，默认 baseline.json）：
+中位数变慢超过 --threshold 的用例记为回归，进程以退出码 1 结束。--save-baseline 把本次结果存为基线。
+
+    python backend/benchmarks/run.py                  # 全部用例
+    python backend/benchmarks/run.py -k volc -k audio # 只跑名字包含 volc 或 audio 的用例
+    python backend/benchmarks/run.py -k wav2lip.forward/batch-16
+    python backend/benchmarks/run.py --quick --save-baseline
+"""
+
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..")
+WAV2LIP_DIR = os.path.join(BACKEND_DIR, "Wav2Lip")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+sys.path.insert(0, BACKEND_DIR)
+
+
+class Bench:
+    """
+    一个计时单元
+
+    Args:
+        name: 结果中的名字（用例名/变体）
+        fn: 被计时的无参函数，每次调用算一次样本
+        items: 每次调用处理的条数（帧数、消息数……），用于换算吞吐
+        unit: items 的单位
+        params: 写入结果的参数，基线比较时参数不同的用例不做比较
+        prepare: 计时前调用的无参函数（例如重置数据文件），不计入耗时
+    """
+
+    def __init__(self, name: str, fn: Callable[[], object], items: int = 1, unit: str = "op",
+                 params: Optional[dict] = None, prepare: Optional[Callable[[], object]] = None):
+        self.name = name
+        self.fn = fn
+        self.items = items
+        self.unit = unit
+        self.params = params or {}
+        self.prepare = prepare
+
+
+# 用例名 -> setup(options) -> List[Bench]；setup 抛 ImportError 时整个用例记为跳过
+CASES: Dict[str, Callable] = {}
+
+
+def case(name: str):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+@contextlib.contextmanager
+def _quiet():
+    """屏蔽被测模块初始化时的打印"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# ---- 内容过滤 ----
+
+@case("content_filter")
+def content_filter_cases(options):
+    from content_filter import ContentFilter
+    import random
+
+    rng = random.Random(0)
+    chars = [chr(c) for c in range(0x4e00, 0x4e00 + 3000)]
+    size = options.lexicon_size
+    categories = ["political", "sexual", "violence", "illegal", "spam", "other"]
+    lexicon = {category: [] for category in categories}
+    for i in range(size):
+        word = "".join(rng.choice(chars) for _ in range(rng.randint(2, 5)))
+        lexicon[categories[i % len(categories)]].append(word)
+
+    work_dir = tempfile.mkdtemp(prefix="dh_bench_filter_")
+    config_file = os.path.join(work_dir, "filter_config.json")
+    with open(config_file, "w", encoding="utf-8") as f:
+        json.dump(lexicon, f, ensure_ascii=False)
+    with _quiet():
+        content_filter = ContentFilter(config_file=config_file, use_lexicon=False)
+
+    # 不命中任何词的正常对话（最常见的情况，命中会写违规日志）
+    short = "今天天气怎么样，适合出去走走吗？"
+    long = "请帮我总结一下这篇文章的主要内容，并给出三点建议。" * 20
+    for text in (short, long):
+        assert content_filter.filter_input(text)[2] == []
+
+    params = {"lexicon_size": size}
+    return [
+        Bench(f"content_filter.filter_input/short-{len(short)}ch", lambda: content_filter.filter_input(short),
+              params=params),
+        Bench(f"content_filter.filter_input/long-{len(long)}ch", lambda: content_filter.filter_input(long),
+              params=params),
+    ]
+
+
+# ---- JSON 持久化 ----
+
+def _import_main(work_dir: str):
+    """在临时目录里导入 main，avatars/ 等数据文件都落在这个目录下（没有 secrets.json，不会连外部服务）"""
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        with _quiet():
+            import main
+    finally:
+        os.chdir(cwd)
+    return main
+
+
+@case("json_persist")
+def json_persist_cases(options):
+    work_dir = tempfile.mkdtemp(prefix="dh_bench_json_")
+    main = _import_main(work_dir)
+    sizes = (1000,) if options.quick else (10000, 100000)
+
+    def seed(path, records):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+
+    benches = []
+    for size in sizes:
+        conv_ids = [str(uuid.uuid4()) for _ in range(max(1, size // 50))]
+        messages = [{"id": str(uuid.uuid4()), "conversation_id": conv_ids[i % len(conv_ids)],
+                     "role": "user" if i % 2 == 0 else "assistant",
+                     "content": f"第 {i} 条消息：你好，请介绍一下你自己。", "timestamp": 1700000000.0 + i}
+                    for i in range(size)]
+        chat_history = [{"session_id": m["conversation_id"], "role": m["role"], "content": m["content"],
+                         "timestamp": m["timestamp"]} for m in messages]
+
+        def add_message(conv_id=conv_ids[0]):
+            main.add_message_to_conversation(conv_id, "user", "新消息")
+
+        def save_chat(session_id=conv_ids[0]):
+            main.save_chat_message(session_id, "user", "新消息")
+
+        def reset(messages=messages, chat_history=chat_history):
+            seed(main.MESSAGES_FILE, messages)
+            seed(main.CONVERSATIONS_FILE, [])
+            seed(main.CHAT_HISTORY_FILE, chat_history)
+
+        # 计时前重置文件；计时期间每次调用追加一条，规模变化可以忽略
+        params = {"messages": size}
+        benches.append(Bench(f"json_persist.add_message_to_conversation/{size}", add_message, params=params,
+                             prepare=reset))
+        benches.append(Bench(f"json_persist.save_chat_message/{size}", save_chat, params=params, prepare=reset))
+    return benches
+
+
+# ---- 火山引擎协议 ----
+
+@case("volc_protocol")
+def volc_protocol_cases(options):
+    import struct
+    from volc_asr import ResponseParser
+    from volc_protocol import Message, MsgType, MsgTypeFlagBits
+
+    benches = []
+    # 替身服务端的 ASR 结果帧：gzip JSON，带 sequence；分别是中间结果和带分句/逐字时间戳的长结果。
+    # AsrResponse 在访问 payload_msg 时才解压、解析 JSON，计时要包含这一步
+    for label, words in (("partial", 8), ("final-utterances", 120)):
+        text = "今天天气不错我们出去走走吧" * (words // 12 + 1)
+        body = {"result": {"text": text[:words],
+                           "utterances": [{"text": text[:words], "definite": True, "start_time": 0,
+                                           "end_time": words * 200,
+                                           "words": [{"text": ch, "start_time": i * 200, "end_time": i * 200 + 180}
+                                                     for i, ch in enumerate(text[:words])]}]},
+                "audio_info": {"duration": words * 200}}
+        payload = gzip.compress(json.dumps(body, ensure_ascii=False).encode("utf-8"))
+        frame = bytes([0x11, 0x91, 0x11, 0x00]) + struct.pack(">iI", 7, len(payload)) + payload
+        assert ResponseParser.parse_response(frame).payload_msg == body
+        benches.append(Bench(f"volc_protocol.parse_response/{label}-{len(frame)}B",
+                             lambda frame=frame: ResponseParser.parse_response(frame).payload_msg))
+
+    for size in (320, 4096, 32768):
+        msg = Message(type=MsgType.AudioOnlyServer, flag=MsgTypeFlagBits.PositiveSeq, sequence=7,
+                      payload=os.urandom(size))
+        benches.append(Bench(f"volc_protocol.Message.marshal/audio-{size}B", msg.marshal))
+    return benches
+
+
+# ---- Wav2Lip ----
+
+def _wav2lip_path():
+    if WAV2LIP_DIR not in sys.path:
+        sys.path.insert(0, WAV2LIP_DIR)
+
+
+def _torch_setup(options):
+    import torch
+    if options.threads:
+        torch.set_num_threads(options.threads)
+    torch.manual_seed(0)
+    return torch
+
+
+@case("audio")
+def audio_cases(options):
+    import numpy as np
+    _wav2lip_path()
+    import audio
+    from hparams import hparams as hp
+
+    rng = np.random.default_rng(0)
+    benches = []
+    for seconds in ((1, 5) if options.quick else (1, 10, 60)):
+        wav = (rng.standard_normal(int(seconds * hp.sample_rate)) * 0.1).astype(np.float32)
+        frames = audio.melspectrogram(wav).shape[1]
+        benches.append(Bench(f"audio.melspectrogram/{seconds}s", lambda wav=wav: audio.melspectrogram(wav),
+                             items=frames, unit="mel frame", params={"seconds": seconds}))
+    return benches
+
+
+@case("s3fd")
+def s3fd_cases(options):
+    import numpy as np
+    torch = _torch_setup(options)
+    _wav2lip_path()
+    from face_detection.detection.sfd.detect import batch_detect
+    from face_detection.detection.sfd.net_s3fd import s3fd
+
+    weights = os.path.join(WAV2LIP_DIR, "face_detection", "detection", "sfd", "s3fd.pth")
+    net = s3fd()
+    if os.path.isfile(weights):
+        net.load_state_dict(torch.load(weights, map_location="cpu"))
+        source = "s3fd.pth"
+    else:
+        # 随机权重下几乎每个位置都会超过 0.05 的候选阈值，逐个候选的解码循环会掩盖网络本身的耗时；
+        # 把分类头压向背景类，只测网络前向和后处理的固定开销
+        source = "random"
+        with torch.no_grad():
+            for name, module in net.named_modules():
+                if name.endswith("mbox_conf"):
+                    module.weight.mul_(0.01)
+                    module.bias.zero_()
+                    module.bias[-1] = -6.0
+    net.eval()
+
+    rng = np.random.default_rng(0)
+    height, width = (240, 320) if options.quick else (360, 640)
+    benches = []
+    for batch in ((1, 4) if options.quick else (1, 8)):
+        imgs = rng.integers(0, 255, (batch, height, width, 3), dtype=np.uint8).astype(np.float32)
+        benches.append(Bench(f"s3fd.batch_detect/{batch}x{width}x{height}",
+                             lambda imgs=imgs: batch_detect(net, imgs, "cpu"), items=batch, unit="frame",
+                             params={"weights": source, "threads": torch.get_num_threads()}))
+    return benches
+
+
+@case("wav2lip")
+def wav2lip_cases(options):
+    torch = _torch_setup(options)
+    _wav2lip_path()
+    from models import Wav2Lip
+
+    weights = os.path.join(WAV2LIP_DIR, "checkpoints", "wav2lip.pth")
+    model = Wav2Lip()
+    if os.path.isfile(weights):
+        state = torch.load(weights, map_location="cpu")["state_dict"]
+        model.load_state_dict({k.replace("module.", ""): v for k, v in state.items()})
+        source = "wav2lip.pth"
+    else:
+        source = "random"
+    model.eval()
+
+    benches = []
+    for batch in ((1, 16) if options.quick else (1, 16, 128)):
+        mel = torch.randn(batch, 1, 80, 16)
+        faces = torch.rand(batch, 6, 96, 96)
+
+        def forward(mel=mel, faces=faces):
+            with torch.no_grad():
+                return model(mel, faces)
+
+        benches.append(Bench(f"wav2lip.forward/batch-{batch}", forward, items=batch, unit="frame",
+                             params={"weights": source, "threads": torch.get_num_threads()}))
+    return benches
+
+
+# ---- 计时与报告 ----
+
+def measure(bench: Bench, min_time: float, min_repeat: int, max_repeat: int) -> dict:
+    if bench.prepare is not None:
+        bench.prepare()
+    # warm-up；微秒级的函数每个样本连续调用 number 次，让计时器开销可以忽略
+    t = time.perf_counter()
+    bench.fn()
+    number = max(1, min(10000, int(0.001 / max(time.perf_counter() - t, 1e-7))))
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < min_repeat or (time.perf_counter() - start < min_time and len(samples) < max_repeat):
+        t = time.perf_counter()
+        for _ in range(number):
+            bench.fn()
+        samples.append((time.perf_counter() - t) / number)
+
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        "repeat": len(samples),
+        "number": number,
+        "median_ms": median * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "min_ms": samples[0] * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        "stdev_ms": statistics.stdev(samples) * 1000 if len(samples) > 1 else 0.0,
+        "throughput": bench.items / median,
+        "unit": bench.unit,
+        "params": bench.params,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> dict:
+    env = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "commit": _git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+    try:
+        import torch
+        env["torch"] = torch.__version__
+        env["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return env
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[dict]:
+    """按中位数和基线比较；ratio > 1 + threshold 为回归，参数不同或基线里没有的用例跳过"""
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if "median_ms" not in current or not previous or "median_ms" not in previous:
+            continue
+        if previous.get("params") != current.get("params"):
+            continue
+        ratio = current["median_ms"] / previous["median_ms"] if previous["median_ms"] else float("inf")
+        status = "regression" if ratio > 1 + threshold else "improved" if ratio < 1 - threshold else "ok"
+        rows.append({"name": name, "baseline_ms": previous["median_ms"], "current_ms": current["median_ms"],
+                     "ratio": ratio, "status": status})
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Backend hot-path benchmarks")
+    parser.add_argument("-k", dest="patterns", action="append", default=[],
+                        help="only run cases whose name contains this string, or benchmarks whose name "
+                             "starts with it (repeatable)")
+    parser.add_argument("--list", action="store_true", help="list cases and exit")
+    parser.add_argument("--quick", action="store_true", help="smaller inputs and shorter runs (smoke test)")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds to spend per benchmark")
+    parser.add_argument("--min-repeat", type=int, default=5)
+    parser.add_argument("--max-repeat", type=int, default=10000)
+    parser.add_argument("--threads", type=int, default=0, help="torch CPU threads (0 = torch default)")
+    parser.add_argument("--lexicon-size", type=int, default=50000)
+    parser.add_argument("--output", help="write results JSON to this path")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE,
+                        help="store these results as the baseline (default path: %(const)s)")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="relative slowdown of the median counted as a regression")
+    options = parser.parse_args(argv)
+
+    if options.list:
+        for name in CASES:
+            print(name)
+        return 0
+    if options.quick:
+        options.min_time = min(options.min_time, 0.2)
+        options.min_repeat = min(options.min_repeat, 3)
+        options.lexicon_size = min(options.lexicon_size, 5000)
+
+    def selected(name):
+        return not options.patterns or any(p in name for p in options.patterns)
+
+    results = {}
+    print(f"{'benchmark':<52}{'median ms':>12}{'p95 ms':>12}{'throughput':>22}")
+    for case_name, setup in CASES.items():
+        # 变体名都以 "用例名." 开头：模式是用例名的一部分时跑全部变体，以用例名开头时按变体名过滤
+        if options.patterns and not any(p in case_name or p.startswith(case_name) for p in options.patterns):
+            continue
+        try:
+            benches = setup(options)
+        except ImportError as e:
+            results[case_name] = {"skipped": f"missing dependency: {e}"}
+            print(f"{case_name:<52}skipped ({e})")
+            continue
+        for bench in benches:
+            if not (selected(case_name) or selected(bench.name)):
+                continue
+            result = measure(bench, options.min_time, options.min_repeat, options.max_repeat)
+            results[bench.name] = result
+            rate = f"{result['throughput']:,.1f} {bench.unit}/s"
+            print(f"{bench.name:<52}{result['median_ms']:>12.4f}{result['p95_ms']:>12.4f}{rate:>22}")
+
+    report = {"environment": environment(), "options": {"quick": options.quick, "min_time": options.min_time},
+              "results": results}
+
+    exit_code = 0
+    if options.baseline and os.path.isfile(options.baseline) and options.save_baseline != options.baseline:
+        with open(options.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline.get("results", {}), options.threshold)
+        report["comparison"] = {"baseline": os.path.abspath(options.baseline),
+                                "baseline_environment": baseline.get("environment"),
+                                "threshold": options.threshold, "rows": rows}
+        if rows:
+            print(f"\nvs baseline {options.baseline} (commit {(baseline.get('environment') or {}).get('commit')})")
+            print(f"{'benchmark':<52}{'baseline ms':>12}{'current ms':>12}{'ratio':>8}  status")
+            for row in rows:
+                print(f"{row['name']:<52}{row['baseline_ms']:>12.4f}{row['current_ms']:>12.4f}"
+                      f"{row['ratio']:>8.2f}  {row['status']}")
+        regressions = [row["name"] for row in rows if row["status"] == "regression"]
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {options.threshold:.0%}: {', '.join(regressions)}")
+            exit_code = 1
+
+    for path in filter(None, (options.output, options.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"results written to {path}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
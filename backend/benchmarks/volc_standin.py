@@ -0,0 +1,98 @@
+"""
+本地火山引擎 TTS 替身服务
+在本机端口上实现与 openspeech.bytedance.com/api/v1/tts/ws_binary 相同的二进制协议：
+收到 FullClientRequest 后按分片返回 AudioOnlyServer 消息（最后一片 sequence 为负）。
+可模拟握手耗时（TLS + 鉴权）、合成耗时和服务端主动断开，用于连接池等组件的测试与基准。
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+import websockets
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from volc_protocol import Message, MsgType, MsgTypeFlagBits
+
+
+class VolcTTSStandin:
+    """
+    Args:
+        handshake_delay: 每次新建连接额外等待的秒数，模拟 TLS/鉴权往返
+        first_chunk_delay: 收到请求到第一片音频的秒数
+        chunk_delay: 相邻音频分片之间的秒数
+        chunks: 每个请求返回的分片数
+        chunk_bytes: 每片音频字节数
+        max_requests_per_conn: 单个连接处理多少个请求后由服务端关闭，0 表示不限
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, handshake_delay: float = 0.05,
+                 first_chunk_delay: float = 0.02, chunk_delay: float = 0.005, chunks: int = 8,
+                 chunk_bytes: int = 4096, max_requests_per_conn: int = 0):
+        self.host = host
+        self.port = port
+        self.handshake_delay = handshake_delay
+        self.first_chunk_delay = first_chunk_delay
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+        self.chunk_bytes = chunk_bytes
+        self.max_requests_per_conn = max_requests_per_conn
+        self.connections = 0
+        self.requests = 0
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/api/v1/tts/ws_binary"
+
+    async def start(self):
+        self._server = await websockets.serve(self._handler, self.host, self.port,
+                                              process_request=self._process_request, compression=None)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _process_request(self, connection, request):
+        if self.handshake_delay:
+            await asyncio.sleep(self.handshake_delay)
+        return None
+
+    async def _handler(self, websocket):
+        self.connections += 1
+        served = 0
+        async for data in websocket:
+            request = Message.from_bytes(data)
+            if request.type != MsgType.FullClientRequest:
+                continue
+            self.requests += 1
+            served += 1
+            text = json.loads(request.payload)["request"]["text"]
+            await self.send_audio(websocket, text)
+            if self.max_requests_per_conn and served >= self.max_requests_per_conn:
+                await websocket.close()
+                return
+
+    async def send_audio(self, websocket, text: str):
+        await asyncio.sleep(self.first_chunk_delay)
+        seed = text.encode("utf-8") or b"\x00"
+        chunk = (seed * (self.chunk_bytes // len(seed) + 1))[:self.chunk_bytes]
+        for i in range(1, self.chunks + 1):
+            last = i == self.chunks
+            msg = Message(type=MsgType.AudioOnlyServer,
+                          flag=MsgTypeFlagBits.NegativeSeq if last else MsgTypeFlagBits.PositiveSeq,
+                          sequence=-i if last else i, payload=chunk)
+            await websocket.send(msg.marshal())
+            if not last and self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
@@ -9,6 +9,11 @@ import os
 from typing import Tuple, List, Dict
 from enum import Enum
 
+try:
+    import backend.metrics as metrics
+except ImportError:
+    import metrics
+
 # 尝试导入 Sensitive-lexicon 加载器
 try:
     from sensitive_lexicon_loader import SensitiveLexiconLoader
@@ -221,6 +226,10 @@ class ContentFilter:
         Returns:
             (是否通过, 过滤后的文本, 命中的关键词列表)
         """
+        with metrics.CONTENT_FILTER_SCAN.labels("input").time():
+            return self._scan(text)
+
+    def _scan(self, text: str) -> Tuple[bool, str, List[str]]:
         if not text:
             return True, text, []
 
@@ -269,7 +278,8 @@ class ContentFilter:
         if not text:
             return True, text
 
-        passed, _, _ = self.filter_input(text)
+        with metrics.CONTENT_FILTER_SCAN.labels("output").time():
+            passed, _, _ = self._scan(text)
 
         if not passed:
             # 返回安全的默认回复
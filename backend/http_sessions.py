@@ -0,0 +1,106 @@
+"""
+出站 HTTP / WebSocket 连接复用
+进程级的 aiohttp.ClientSession 注册表，在应用启动时创建、关闭时统一释放。
+各 session 使用调好参数的 TCPConnector（DNS 缓存、keep-alive、连接数上限），
+不再每条 /ws/asr 连接都新建 session / connector / DNS 缓存 / TLS 上下文。
+同步代码（llm.py 的 requests 调用）使用共享的 requests.Session，复用到方舟接口的 keep-alive 连接。
+"""
+
+import threading
+from typing import Dict, Optional
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SessionRegistry:
+    """
+    Args:
+        limit: 每个 session 的总连接数上限（WebSocket 长连接也占名额，0 表示不限）
+        limit_per_host: 单个主机的连接数上限（0 表示不限）
+        dns_ttl: DNS 解析结果缓存秒数
+        keepalive_timeout: 空闲 keep-alive 连接保留秒数
+        sync_pool_size: requests.Session 每个主机保留的连接数
+    """
+
+    def __init__(self, limit: int = 0, limit_per_host: int = 0, dns_ttl: int = 300,
+                 keepalive_timeout: float = 30.0, sync_pool_size: int = 16):
+        self.configure(limit=limit, limit_per_host=limit_per_host, dns_ttl=dns_ttl,
+                       keepalive_timeout=keepalive_timeout, sync_pool_size=sync_pool_size)
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._sync_session: Optional[requests.Session] = None
+        self._sync_lock = threading.Lock()
+        self.created = 0
+
+    def configure(self, limit: int = None, limit_per_host: int = None, dns_ttl: int = None,
+                  keepalive_timeout: float = None, sync_pool_size: int = None):
+        """修改连接参数，只影响之后新建的 session"""
+        if limit is not None:
+            self.limit = limit
+        if limit_per_host is not None:
+            self.limit_per_host = limit_per_host
+        if dns_ttl is not None:
+            self.dns_ttl = dns_ttl
+        if keepalive_timeout is not None:
+            self.keepalive_timeout = keepalive_timeout
+        if sync_pool_size is not None:
+            self.sync_pool_size = sync_pool_size
+
+    def get(self, name: str = "default") -> aiohttp.ClientSession:
+        """
+        取出（必要时创建）名为 name 的共享 session
+
+        必须在事件循环里调用。调用方不要关闭它，也不要用 async with 包住它。
+        """
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[name] = session
+            self.created += 1
+        return session
+
+    def sync(self) -> requests.Session:
+        """线程间共享的 requests.Session"""
+        with self._sync_lock:
+            if self._sync_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.sync_pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sync_session = session
+            return self._sync_session
+
+    async def start(self):
+        """应用启动时预先建好默认 session"""
+        self.get()
+
+    async def close(self):
+        sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            if not session.closed:
+                await session.close()
+        with self._sync_lock:
+            sync_session, self._sync_session = self._sync_session, None
+        if sync_session is not None:
+            sync_session.close()
+
+    def stats(self) -> dict:
+        return {
+            "sessions": sorted(name for name, session in self._sessions.items() if not session.closed),
+            "created": self.created,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "dns_ttl": self.dns_ttl,
+            "keepalive_timeout": self.keepalive_timeout,
+        }
+
+
+# Shared by all outbound clients of this process
+sessions = SessionRegistry()
@@ -0,0 +1,406 @@
+"""
+Wav2Lip 推理进程池
+启动 K 个常驻推理进程，每个进程绑定一组互不重叠的 CPU 核心（sched_setaffinity + torch.set_num_threads），
+任务按最少负载分发；所有队列已满时拒绝新任务（调用方返回 429 + Retry-After），并提供利用率统计。
+图像帧 / PCM 等数组输入经每个进程独立的共享内存环（shm_ring.py）传递，不经过 pickle。
+"""
+
+import asyncio
+import math
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    from backend.shm_ring import RingFullError, ShmRing
+    import backend.metrics as metrics
+except ImportError:
+    from shm_ring import RingFullError, ShmRing
+    import metrics
+
+WAV2LIP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Wav2Lip")
+
+
+class PoolFullError(Exception):
+    """所有推理进程的队列都已满"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference pool is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def available_cores() -> List[int]:
+    """当前进程允许使用的 CPU 核心编号"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cores(num_workers: int, cores: Optional[List[int]] = None) -> List[List[int]]:
+    """把核心尽量平均地切分成 num_workers 组，组之间不重叠"""
+    cores = list(cores if cores is not None else available_cores())
+    num_workers = max(1, min(num_workers, len(cores)))
+    base, extra = divmod(len(cores), num_workers)
+    groups, start = [], 0
+    for i in range(num_workers):
+        size = base + (1 if i < extra else 0)
+        groups.append(cores[start:start + size])
+        start += size
+    return groups
+
+
+def decode_image(data: bytes) -> Optional[np.ndarray]:
+    """把上传的图片字节解码成 BGR 帧，失败时返回 None"""
+    try:
+        import cv2
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    except Exception:
+        return None
+
+
+def _unpack(ring, item):
+    if isinstance(item, tuple) and item and item[0] == "shm":
+        return ring.view(item[1])
+    return item
+
+
+def _worker_main(worker_id, cores, checkpoint_path, ffmpeg_path, wrapper_kwargs, jobs, results, ring_spec=None):
+    """推理进程入口：绑定核心、加载模型，然后循环处理任务"""
+    # 必须在 import torch 之前设置，OpenMP 线程池按此大小创建
+    os.environ["OMP_NUM_THREADS"] = str(len(cores))
+    os.environ["MKL_NUM_THREADS"] = str(len(cores))
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError as e:
+            print(f"[InferencePool] worker {worker_id}: cannot pin to cores {cores}: {e}")
+
+    sys.path.insert(0, WAV2LIP_DIR)
+    import torch
+    torch.set_num_threads(len(cores))
+    try:
+        from inference_v2 import Wav2Lipv2Wrapper
+        wrapper = Wav2Lipv2Wrapper(checkpoint_path, ffmpeg_path, num_threads=len(cores), **wrapper_kwargs)
+    except Exception as e:
+        results.put((worker_id, None, False, f"model load failed: {e}", 0.0, {}))
+        return
+    ring = ShmRing.attach(ring_spec) if ring_spec else None
+    results.put((worker_id, None, True, "ready", 0.0, {}))
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, face, audio, outfile = job
+        start = time.time()
+        try:
+            # 共享内存中的数组以零拷贝视图交给推理，完成后归还槽位
+            output = wrapper.inference(_unpack(ring, face), _unpack(ring, audio), outfile)
+            results.put((worker_id, job_id, True, output, time.time() - start, wrapper.last_timings))
+        except Exception as e:
+            results.put((worker_id, job_id, False, str(e), time.time() - start, wrapper.last_timings))
+        finally:
+            for item in (face, audio):
+                if ring and isinstance(item, tuple) and item and item[0] == "shm":
+                    ring.release(item[1])
+    if ring:
+        ring.close()
+
+
+class _Worker:
+    def __init__(self, worker_id: int, cores: List[int]):
+        self.worker_id = worker_id
+        self.cores = cores
+        self.process = None
+        self.jobs = None
+        self.ring = None
+        self.pending = set()
+        self.ready = False
+        # 模型加载失败的进程不再重启
+        self.broken = False
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.started_at = time.time()
+
+
+class InferencePool:
+    """
+    Wav2Lip 多进程推理池
+
+    Args:
+        checkpoint_path: Wav2Lip 权重路径
+        ffmpeg_path: FFmpeg 可执行文件
+        num_workers: 推理进程数，0 表示按核心数自动选择（每进程约 4 核）
+        max_queue_per_worker: 每个进程最多同时持有的任务数（含正在执行的）
+        ring_slot_mb: 共享内存槽位大小（MB），放不下的数组退回 pickle 传输，0 表示不用共享内存
+        wrapper_kwargs: 透传给 Wav2Lipv2Wrapper 的参数（cpu_backend、autotune 等）
+    """
+
+    def __init__(self, checkpoint_path: str, ffmpeg_path: str, num_workers: int = 0,
+                 max_queue_per_worker: int = 2, ring_slot_mb: int = 8, **wrapper_kwargs):
+        self.checkpoint_path = checkpoint_path
+        self.ffmpeg_path = ffmpeg_path
+        self.max_queue_per_worker = max(1, max_queue_per_worker)
+        self.ring_slot_bytes = ring_slot_mb << 20
+        self.wrapper_kwargs = wrapper_kwargs
+
+        cores = available_cores()
+        if num_workers <= 0:
+            num_workers = max(1, len(cores) // 4)
+        self.workers = [_Worker(i, group) for i, group in enumerate(partition_cores(num_workers, cores))]
+
+        self._ctx = mp.get_context("spawn")
+        self._results = None
+        self._futures: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._collector = None
+        self._running = False
+        self.rejected = 0
+        self.shm_transfers = 0
+        self.pickle_transfers = 0
+        self.path_transfers = 0
+        # 单个任务耗时的滑动平均，用于估算 Retry-After
+        self.avg_job_seconds = 10.0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self):
+        if self._running:
+            return
+        self._results = self._ctx.Queue()
+        for worker in self.workers:
+            self._spawn(worker)
+        self._running = True
+        self._collector = threading.Thread(target=self._collect, name="inference-pool-results", daemon=True)
+        self._collector.start()
+        print(f"[InferencePool] started {len(self.workers)} workers, cores: {[w.cores for w in self.workers]}")
+
+    def _spawn(self, worker: _Worker):
+        if self.ring_slot_bytes and worker.ring is None:
+            # 每个任务最多两个数组（人脸帧 + PCM）
+            worker.ring = ShmRing(slots=2 * self.max_queue_per_worker, slot_bytes=self.ring_slot_bytes)
+        worker.jobs = self._ctx.Queue()
+        worker.ready = False
+        # 利用率按进程的生命周期计算，重启后重新累计
+        worker.started_at = time.time()
+        worker.busy_seconds = 0.0
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.worker_id, worker.cores, self.checkpoint_path, self.ffmpeg_path,
+                  self.wrapper_kwargs, worker.jobs, self._results,
+                  worker.ring.spec() if worker.ring else None),
+            name=f"wav2lip-worker-{worker.worker_id}",
+            daemon=True,
+        )
+        worker.process.start()
+
+    def has_healthy_workers(self) -> bool:
+        """是否还有模型加载成功（或仍在启动）的进程；全部 broken 时池子不可能再接任务"""
+        with self._lock:
+            return any(not w.broken for w in self.workers)
+
+    def has_capacity(self) -> bool:
+        with self._lock:
+            return any(len(w.pending) < self.max_queue_per_worker for w in self.workers if not w.broken)
+
+    def reject(self) -> int:
+        """记一次满载拒绝（/pool/stats 和 /metrics），返回建议的 Retry-After 秒数"""
+        self.rejected += 1
+        metrics.WAV2LIP_JOBS.labels("rejected").inc()
+        return self.retry_after()
+
+    def retry_after(self) -> int:
+        """按排队任务数和平均耗时估算多久后会有空位"""
+        queued = sum(len(w.pending) for w in self.workers)
+        waves = queued / float(len(self.workers) * self.max_queue_per_worker)
+        return max(1, int(math.ceil(self.avg_job_seconds * waves)))
+
+    async def submit(self, face, audio, outfile: str, face_path: Optional[str] = None):
+        """
+        提交一个推理任务，返回输出文件路径（输入不受支持时为 None）
+
+        face 为图片路径或 BGR 帧（ndarray），audio 为音频路径或 16kHz PCM（ndarray）；
+        数组优先经共享内存传给推理进程。face_path 是同一张图片在磁盘上的路径：
+        帧放不进共享内存槽位（例如 4K 图片）时改传路径，不把整帧 pickle 进管道
+
+        Raises:
+            PoolFullError: 所有进程的队列都已满
+            RuntimeError: 推理失败或推理进程退出
+        """
+        if not self._running:
+            self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        job_id = uuid.uuid4().hex
+
+        with self._lock:
+            candidates = [w for w in self.workers if not w.broken]
+            if not candidates:
+                raise RuntimeError("No inference workers available")
+            worker = min(candidates, key=lambda w: (len(w.pending), not w.ready))
+            if len(worker.pending) >= self.max_queue_per_worker:
+                raise PoolFullError(self.reject())
+            worker.pending.add(job_id)
+            refs = []
+            job = (job_id, self._pack(worker, face, refs, face_path), self._pack(worker, audio, refs), outfile)
+            self._futures[job_id] = (loop, future, worker, refs)
+
+        worker.jobs.put(job)
+        return await future
+
+    def _pack(self, worker: _Worker, item, refs: list, path: Optional[str] = None):
+        if not isinstance(item, np.ndarray):
+            return item
+        if worker.ring is not None and worker.ring.fits(item):
+            try:
+                ref = worker.ring.put(np.ascontiguousarray(item))
+                refs.append(ref)
+                self.shm_transfers += 1
+                return ("shm", ref)
+            except RingFullError:
+                pass
+        if path is not None:
+            self.path_transfers += 1
+            return path
+        self.pickle_transfers += 1
+        return item
+
+    def _collect(self):
+        # 进程存活检查按固定间隔做，不能只在结果队列空闲时做：
+        # 其他进程持续出结果时，挂掉的进程上的任务会一直等不到失败
+        next_check = time.monotonic() + 1.0
+        while self._running:
+            now = time.monotonic()
+            if now >= next_check:
+                self._check_workers()
+                next_check = now + 1.0
+            try:
+                worker_id, job_id, ok, payload, elapsed, phases = self._results.get(timeout=max(0.0, next_check - now))
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            worker = self.workers[worker_id]
+            if job_id is None:
+                worker.ready = ok
+                worker.broken = not ok
+                print(f"[InferencePool] worker {worker_id}: {payload}")
+                continue
+
+            with self._lock:
+                worker.pending.discard(job_id)
+                entry = self._futures.pop(job_id, None)
+                worker.busy_seconds += elapsed
+                if ok:
+                    worker.completed += 1
+                    self.avg_job_seconds = 0.8 * self.avg_job_seconds + 0.2 * elapsed
+                else:
+                    worker.failed += 1
+            metrics.WAV2LIP_JOBS.labels("ok" if ok else "error").inc()
+            for phase, seconds in phases.items():
+                metrics.WAV2LIP_PHASE.labels(phase).observe(seconds)
+            if entry:
+                loop, future, _, _ = entry
+                error = None if ok else RuntimeError(payload)
+                loop.call_soon_threadsafe(_resolve, future, payload, error)
+
+    def _check_workers(self):
+        """推理进程意外退出时让其任务失败并重启进程"""
+        for worker in self.workers:
+            if worker.process is None or worker.process.is_alive() or not self._running:
+                continue
+            if not worker.ready:
+                # 启动阶段就退出（导入或加载失败），重启也无济于事
+                worker.broken = True
+            if worker.broken and not worker.pending:
+                continue
+            print(f"[InferencePool] worker {worker.worker_id} exited with code {worker.process.exitcode}"
+                  f"{'' if worker.broken else ', restarting'}")
+            with self._lock:
+                lost = [self._futures.pop(job_id, None) for job_id in worker.pending]
+                worker.failed += len(worker.pending)
+                metrics.WAV2LIP_JOBS.labels("error").inc(len(worker.pending))
+                worker.pending.clear()
+            for entry in lost:
+                if entry:
+                    loop, future, _, refs = entry
+                    # 进程没来得及归还的槽位由这里回收
+                    for ref in refs:
+                        worker.ring.release(ref)
+                    loop.call_soon_threadsafe(_resolve, future, None, RuntimeError("Inference worker exited"))
+            if not worker.broken:
+                self._spawn(worker)
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            workers = [{
+                "id": w.worker_id,
+                "pid": w.process.pid if w.process else None,
+                "alive": bool(w.process and w.process.is_alive()),
+                "ready": w.ready,
+                "broken": w.broken,
+                "cores": w.cores,
+                "pending": len(w.pending),
+                "completed": w.completed,
+                "failed": w.failed,
+                "utilization": round(w.busy_seconds / max(now - w.started_at, 1e-6), 3),
+            } for w in self.workers]
+        capacity = len(self.workers) * self.max_queue_per_worker
+        in_flight = sum(w["pending"] for w in workers)
+        return {
+            "running": self._running,
+            "workers": workers,
+            "capacity": capacity,
+            "in_flight": in_flight,
+            "load": round(in_flight / float(capacity), 3),
+            "rejected": self.rejected,
+            "avg_job_seconds": round(self.avg_job_seconds, 2),
+            "shm_transfers": self.shm_transfers,
+            "pickle_transfers": self.pickle_transfers,
+            "path_transfers": self.path_transfers,
+        }
+
+    def shutdown(self, timeout: float = 5.0):
+        if not self._running:
+            return
+        self._running = False
+        for worker in self.workers:
+            try:
+                worker.jobs.put(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        with self._lock:
+            pending = list(self._futures.values())
+            self._futures.clear()
+        for loop, future, _, _ in pending:
+            loop.call_soon_threadsafe(_resolve, future, None, RuntimeError("Inference pool shut down"))
+        for worker in self.workers:
+            if worker.ring is not None:
+                worker.ring.close()
+                worker.ring = None
+        print("[InferencePool] stopped")
+
+
+def _resolve(future, result, error):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
@@ -1,9 +1,14 @@
-import requests
 import json
 import logging
 import os
 from content_filter import ContentFilter
 
+# 与 main.py 相同的导入顺序，保证整个进程只有一个 HTTP 会话注册表
+try:
+    from backend.http_sessions import sessions
+except ImportError:
+    from http_sessions import sessions
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -96,7 +101,8 @@ def chat_with_ark(query: str, use_search: bool = True, system_prompt: str = None
     
     try:
         logger.info(f"Sending request to LLM: {query}")
-        response = requests.post(
+        # 共享 session，复用到方舟接口的 keep-alive 连接，省掉每次对话的 TCP/TLS 握手
+        response = sessions.sync().post(
             API_URL, 
             headers=headers, 
             json=payload, 
@@ -0,0 +1,116 @@
+"""
+WebSocket 热循环的日志
+- 日志记录只进队列（QueueHandler），由后台线程（QueueListener）写 stdout，事件循环不再等终端 I/O；
+- 每条连接一个关联 ID（asr-1a2b3c4d / phone-…），同一通话的日志可以 grep 出来；
+- 每个音频分片 / 每个事件这类高频日志用 throttled() 按 key 限速，期间被压掉的条数附在下一条里；
+- 级别由 LOG_LEVEL_WS 配置，默认 INFO，逐帧细节只在 DEBUG 下输出。
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+LOGGER_NAME = "dh"
+FORMAT = "%(asctime)s %(levelname)s %(name)s [%(conn_id)s] %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class _DefaultConnId(logging.Filter):
+    """没有经过 ConnLogger 的记录也要有 conn_id 字段，格式串才能用"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "conn_id"):
+            record.conn_id = "-"
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, records: queue.Queue):
+        super().__init__(records)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup(level="INFO", max_queue: int = 10000):
+    """
+    把 dh.* 日志接到异步队列上；重复调用只更新级别
+
+    Args:
+        level: 日志级别（名字或数字）
+        max_queue: 队列上限，写满时丢弃新日志而不是阻塞事件循环
+    """
+    global _listener
+    root = logging.getLogger(LOGGER_NAME)
+    root.setLevel(level)
+    if _listener is not None:
+        return
+
+    records = queue.Queue(max_queue)
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter(FORMAT))
+    stream.addFilter(_DefaultConnId())
+
+    handler = _DroppingQueueHandler(records)
+    root.addHandler(handler)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+
+
+def shutdown():
+    """写完队列里剩下的日志并停止后台线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+class ConnLogger(logging.LoggerAdapter):
+    """
+    带连接 ID 的 logger
+
+    Args:
+        logger: 底层 logger（get_logger 的返回值）
+        kind: 连接类型，作为 ID 前缀
+        conn_id: 指定 ID；为空时随机生成
+    """
+
+    def __init__(self, logger: logging.Logger, kind: str, conn_id: Optional[str] = None):
+        self.conn_id = conn_id or f"{kind}-{uuid.uuid4().hex[:8]}"
+        super().__init__(logger, {"conn_id": self.conn_id})
+        # key -> (上次输出时间, 之后被压掉的条数)
+        self._throttle: Dict[str, Tuple[float, int]] = {}
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**self.extra, **kwargs.get("extra", {})}
+        return msg, kwargs
+
+    def throttled(self, level: int, key: str, interval: float, msg: str, *args):
+        """同一个 key 每 interval 秒最多输出一条"""
+        if not self.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        last, suppressed = self._throttle.get(key, (0.0, 0))
+        if now - last < interval:
+            self._throttle[key] = (last, suppressed + 1)
+            return
+        self._throttle[key] = (now, 0)
+        if suppressed:
+            msg = f"{msg} (+{suppressed} suppressed)"
+        self.log(level, msg, *args)
@@ -5,8 +5,9 @@ import uuid
 import asyncio
 import time
 from fastapi import FastAPI, UploadFile, File, Form, BackgroundTasks, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
 import edge_tts
 import shutil
 from fastapi.staticfiles import StaticFiles
@@ -20,12 +21,41 @@ logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(le
 
 # Import Volcengine TTS helper (using absolute import assuming run from root)
 try:
-    from backend.volc_tts import generate_volc_tts_ws
+    from backend.volc_tts import generate_volc_tts_ws, stream_volc_tts, tts_pool
 except ImportError:
     try:
-        from volc_tts import generate_volc_tts_ws
+        from volc_tts import generate_volc_tts_ws, stream_volc_tts, tts_pool
     except:
-        pass
+        tts_pool = None
+
+try:
+    from backend.tts_stream import stream_edge_tts
+    from backend.tts_cache import TTSCache
+    from backend.tts_router import TTSRouter
+except ImportError:
+    from tts_stream import stream_edge_tts
+    from tts_cache import TTSCache
+    from tts_router import TTSRouter
+
+try:
+    from backend.inference_pool import InferencePool, PoolFullError, decode_image
+except ImportError:
+    from inference_pool import InferencePool, PoolFullError, decode_image
+
+try:
+    from backend.audio_uplink import UplinkAggregator
+    from backend.http_sessions import sessions as http_sessions
+    from backend.ws_relay import RelayChannel
+    import backend.log_utils as log_utils
+    import backend.metrics as metrics
+    from backend.tracing import Tracer
+except ImportError:
+    from audio_uplink import UplinkAggregator
+    from http_sessions import sessions as http_sessions
+    from ws_relay import RelayChannel
+    import log_utils
+    import metrics
+    from tracing import Tracer
 
 # Load Configuration from secrets.json if available
 SECRETS_FILE = os.path.abspath("secrets.json")
@@ -45,6 +75,13 @@ if os.path.exists(SECRETS_FILE):
     except Exception as e:
         print(f"Error loading secrets.json: {e}")
 
+def config_flag(key: str, default: bool) -> bool:
+    """Boolean setting; JSON booleans as well as strings such as "false" / "0" / "off" """
+    value = config.get(key, default)
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
 # Volcengine Configuration (Load from config or use defaults/env vars)
 # Default values are placeholders or fallback for development.
 # PRODUCTION: Use secrets.json to override these.
@@ -59,11 +96,40 @@ VOLC_ASR_APPID = config.get("VOLC_ASR_APPID", config.get("VOLC_APPID", os.enviro
 VOLC_ASR_TOKEN = config.get("VOLC_ASR_TOKEN", config.get("VOLC_TOKEN", os.environ.get("VOLC_ASR_TOKEN", "YOUR_ASR_TOKEN")))
 VOLC_ASR_CLUSTER = config.get("VOLC_ASR_CLUSTER", "volcengine_streaming_common")
 VOLC_ASR_RESOURCE_ID = config.get("VOLC_ASR_RESOURCE_ID", config.get("VOLC_RESOURCE_ID", "volc.bigasr.sauc.duration"))
+# Compression of uplink PCM frames: "none", "gzip" (level 1) or "adaptive"
+VOLC_ASR_AUDIO_COMPRESSION = config.get("VOLC_ASR_AUDIO_COMPRESSION", "none")
 
 # Realtime Config
 VOLC_REALTIME_APPID = config.get("VOLC_REALTIME_APPID", config.get("VOLC_APPID", os.environ.get("VOLC_REALTIME_APPID", "YOUR_REALTIME_APP_ID")))
 VOLC_REALTIME_TOKEN = config.get("VOLC_REALTIME_TOKEN", config.get("VOLC_TOKEN", os.environ.get("VOLC_REALTIME_TOKEN", "YOUR_REALTIME_TOKEN")))
 VOLC_REALTIME_RESOURCE_ID = config.get("VOLC_REALTIME_RESOURCE_ID", "volc.speech.dialog")
+VOLC_REALTIME_AUDIO_COMPRESSION = config.get("VOLC_REALTIME_AUDIO_COMPRESSION", "none")
+
+# Uplink PCM is re-chunked to these frame sizes before sending (ASR recommends 200ms, realtime dialog 100ms)
+ASR_UPLINK_FRAME_MS = int(config.get("ASR_UPLINK_FRAME_MS", 200))
+PHONE_UPLINK_FRAME_MS = int(config.get("PHONE_UPLINK_FRAME_MS", 100))
+# A partial frame is sent once its oldest byte has waited this long
+UPLINK_FLUSH_TIMEOUT_MS = int(config.get("UPLINK_FLUSH_TIMEOUT_MS", 300))
+# /ws/phone relay queues: audio backlog beyond these is dropped oldest-first; downlink audio is merged per send
+PHONE_UPLINK_MAX_MS = int(config.get("PHONE_UPLINK_MAX_MS", 2000))
+PHONE_DOWNLINK_MAX_MS = int(config.get("PHONE_DOWNLINK_MAX_MS", 10000))
+PHONE_DOWNLINK_BATCH_MS = int(config.get("PHONE_DOWNLINK_BATCH_MS", 200))
+
+# Shared outbound connection pool (0 = no limit; ASR WebSockets hold a connection each)
+http_sessions.configure(
+    limit=int(config.get("HTTP_POOL_LIMIT", 0)),
+    limit_per_host=int(config.get("HTTP_POOL_LIMIT_PER_HOST", 0)),
+    dns_ttl=int(config.get("HTTP_DNS_TTL", 300)),
+    keepalive_timeout=float(config.get("HTTP_KEEPALIVE_TIMEOUT", 30)),
+)
+
+# WebSocket bridge logs are written by a background thread; DEBUG adds per-chunk / per-event details
+log_utils.setup(config.get("LOG_LEVEL_WS", "INFO"))
+ws_logger = log_utils.get_logger("ws")
+
+# Per-turn latency traces (ASR -> LLM -> TTS -> browser); spans are also appended to TRACE_EXPORT_FILE if set
+tracer = Tracer(capacity=int(config.get("TRACE_BUFFER_SIZE", 200)),
+                export_path=config.get("TRACE_EXPORT_FILE") or None)
 
 # Common URL (Usually same, but good to be explicit)
 VOLC_URL = config.get("VOLC_URL", "wss://openspeech.bytedance.com/api/v3/sauc/bigmodel")
@@ -113,7 +179,7 @@ def add_to_history(url: str, meta: dict = None):
         "meta": meta or {}
     })
 
-    with open(HISTORY_FILE, "w") as f:
+    with metrics.JSON_PERSIST.labels("history").time(), open(HISTORY_FILE, "w") as f:
         json.dump(history, f, indent=4)
 
 app = FastAPI()
@@ -195,7 +261,7 @@ def save_chat_message(session_id: str, role: str, content: str):
 
     chat_history.append(message)
 
-    with open(CHAT_HISTORY_FILE, "w", encoding="utf-8") as f:
+    with metrics.JSON_PERSIST.labels("chat_history").time(), open(CHAT_HISTORY_FILE, "w", encoding="utf-8") as f:
         json.dump(chat_history, f, ensure_ascii=False, indent=2)
 
 @app.delete("/history")
@@ -219,7 +285,7 @@ async def delete_history_item(request: dict):
 
     history = [item for item in history if item["url"] != url_to_delete]
 
-    with open(HISTORY_FILE, "w") as f:
+    with metrics.JSON_PERSIST.labels("history").time(), open(HISTORY_FILE, "w") as f:
         json.dump(history, f, indent=4)
 
     return history
@@ -264,7 +330,7 @@ async def import_history(file: UploadFile = File(...)):
             if url not in existing_urls:
                 current_history.append(item)
 
-        with open(HISTORY_FILE, "w") as f:
+        with metrics.JSON_PERSIST.labels("history").time(), open(HISTORY_FILE, "w") as f:
             json.dump(current_history, f, indent=4)
 
         return {"status": "success", "count": len(valid_history)}
@@ -396,7 +462,7 @@ async def get_config():
 async def update_config(config: dict):
     """Update configuration"""
     try:
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
+        with metrics.JSON_PERSIST.labels("config").time(), open(CONFIG_FILE, "w", encoding="utf-8") as f:
             json.dump(config, f, ensure_ascii=False, indent=4)
         return {"status": "success"}
     except Exception as e:
@@ -432,10 +498,10 @@ async def clear_chat_history(session_id: str = None):
 
             chat_history = [msg for msg in chat_history if msg.get("session_id") != session_id]
 
-            with open(CHAT_HISTORY_FILE, "w", encoding="utf-8") as f:
+            with metrics.JSON_PERSIST.labels("chat_history").time(), open(CHAT_HISTORY_FILE, "w", encoding="utf-8") as f:
                 json.dump(chat_history, f, ensure_ascii=False, indent=2)
         else:
-            with open(CHAT_HISTORY_FILE, "w", encoding="utf-8") as f:
+            with metrics.JSON_PERSIST.labels("chat_history").time(), open(CHAT_HISTORY_FILE, "w", encoding="utf-8") as f:
                 json.dump([], f)
 
         return {"status": "success"}
@@ -454,7 +520,7 @@ def load_conversations():
     return []
 
 def save_conversations(conversations):
-    with open(CONVERSATIONS_FILE, "w", encoding="utf-8") as f:
+    with metrics.JSON_PERSIST.labels("conversations").time(), open(CONVERSATIONS_FILE, "w", encoding="utf-8") as f:
         json.dump(conversations, f, ensure_ascii=False, indent=2)
 
 def create_conversation(mode="phone", title=None):
@@ -495,7 +561,7 @@ def add_message_to_conversation(conv_id, role, content):
     messages.append(message)
 
     # Save messages
-    with open(MESSAGES_FILE, "w", encoding="utf-8") as f:
+    with metrics.JSON_PERSIST.labels("messages").time(), open(MESSAGES_FILE, "w", encoding="utf-8") as f:
         json.dump(messages, f, ensure_ascii=False, indent=2)
 
     # Update conversation
@@ -562,7 +628,7 @@ async def delete_conversation(conv_id: str):
             with open(MESSAGES_FILE, "r", encoding="utf-8") as f:
                 all_messages = json.load(f)
             all_messages = [m for m in all_messages if m.get("conversation_id") != conv_id]
-            with open(MESSAGES_FILE, "w", encoding="utf-8") as f:
+            with metrics.JSON_PERSIST.labels("messages").time(), open(MESSAGES_FILE, "w", encoding="utf-8") as f:
                 json.dump(all_messages, f, ensure_ascii=False, indent=2)
 
         return {"status": "success"}
@@ -602,9 +668,83 @@ WAV2LIP_PATH = "backend/Wav2Lip"
 WAV2LIP_PATH = "backend/Wav2Lip"
 CHECKPOINT_PATH = "backend/checkpoints/wav2lip_gan.pth"
 
+# Wav2Lip CPU execution mode: eager / torchscript / compile / int8 (see Wav2Lip/cpu_backend.py)
+WAV2LIP_CPU_BACKEND = config.get("WAV2LIP_CPU_BACKEND", "eager")
+WAV2LIP_NUM_THREADS = int(config.get("WAV2LIP_NUM_THREADS", 0))
+# Measure face-detection / Wav2Lip batch sizes on the first job and reuse them (Wav2Lip/autotune.py).
+# Off by default: the first job of every worker would pay for the sweep inside a user's request
+WAV2LIP_AUTOTUNE = config_flag("WAV2LIP_AUTOTUNE", False)
+# Face detection runs on a copy with this longest side; boxes are rescaled, output stays full-res
+WAV2LIP_DET_MAX_SIDE = int(config.get("WAV2LIP_DET_MAX_SIDE", 480))
+# Video avatars: detect every N frames and track in between (1 = detect every frame)
+WAV2LIP_KEYFRAME_INTERVAL = int(config.get("WAV2LIP_KEYFRAME_INTERVAL", 10))
+
+# Resident Wav2Lip worker processes for image avatars, each pinned to its own cores
+# (0 = one worker per ~4 cores, -1 = spawn inference.py per request as before)
+WAV2LIP_POOL_WORKERS = int(config.get("WAV2LIP_POOL_WORKERS", 0))
+WAV2LIP_POOL_QUEUE = int(config.get("WAV2LIP_POOL_QUEUE", 2))
+inference_pool = None
+if WAV2LIP_POOL_WORKERS >= 0:
+    inference_pool = InferencePool(
+        CHECKPOINT_PATH, FFMPEG_PATH,
+        num_workers=WAV2LIP_POOL_WORKERS,
+        max_queue_per_worker=WAV2LIP_POOL_QUEUE,
+        cpu_backend=WAV2LIP_CPU_BACKEND,
+        autotune=WAV2LIP_AUTOTUNE,
+        det_max_side=WAV2LIP_DET_MAX_SIDE,
+    )
+
+@app.on_event("startup")
+async def start_inference_pool():
+    if inference_pool:
+        inference_pool.start()
+    await http_sessions.start()
+
+@app.on_event("shutdown")
+async def stop_inference_pool():
+    if inference_pool:
+        inference_pool.shutdown()
+    if tts_pool:
+        await tts_pool.close()
+    await http_sessions.close()
+    tracer.close()
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/pool/stats")
+async def get_pool_stats():
+    if not inference_pool:
+        return {"running": False, "workers": []}
+    return inference_pool.stats()
+
+def pool_full_response(retry_after: int):
+    return JSONResponse(
+        status_code=429,
+        content={"message": "Avatar generation is busy, please retry later", "retry_after": retry_after},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+# Synthesized speech cache (memory + disk LRU), shared by /tts and /animate
+TTS_CACHE_DIR = os.path.abspath(config.get("TTS_CACHE_DIR", "cache/tts"))
+tts_cache = TTSCache(
+    TTS_CACHE_DIR,
+    memory_bytes=int(config.get("TTS_CACHE_MEMORY_MB", 32)) << 20,
+    disk_bytes=int(config.get("TTS_CACHE_DISK_MB", 512)) << 20,
+    inflight_timeout=float(config.get("TTS_INFLIGHT_TIMEOUT", 60)),
+)
+
 async def generate_audio_file(text: str, output_path: str, voice: str = "zh-CN-XiaoxiaoNeural"):
-    communicate = edge_tts.Communicate(text, voice)
-    await communicate.save(output_path)
+    async def synthesize():
+        audio = bytearray()
+        async for chunk in stream_edge_tts(text, voice):
+            audio.extend(chunk)
+        return bytes(audio)
+
+    data = await tts_cache.get_or_create(tts_cache.key(text, voice, "microsoft"), synthesize)
+    with open(output_path, "wb") as f:
+        f.write(data)
 
 def run_wav2lip_inference(face_path: str, audio_path: str, output_path: str):
     inference_script = os.path.join(WAV2LIP_PATH, "inference.py")
@@ -623,8 +763,14 @@ def run_wav2lip_inference(face_path: str, audio_path: str, output_path: str):
             "--audio", audio_path,
             "--outfile", output_path,
             "--resize_factor", "1",
-            "--nosmooth"
+            "--nosmooth",
+            "--cpu_backend", WAV2LIP_CPU_BACKEND,
+            "--num_threads", str(WAV2LIP_NUM_THREADS),
+            "--det_max_side", str(WAV2LIP_DET_MAX_SIDE),
+            "--keyframe_interval", str(WAV2LIP_KEYFRAME_INTERVAL)
         ]
+        if WAV2LIP_AUTOTUNE:
+            cmd.append("--autotune")
 
         print(f"Executing Wav2Lip: {' '.join(cmd)}")
 
@@ -653,6 +799,15 @@ async def animate_avatar(
     ext = os.path.splitext(image.filename)[1].lower()
     if not ext:
         ext = ".png"
+
+    use_pool = inference_pool is not None and ext in (".jpg", ".jpeg", ".png")
+    if use_pool and not inference_pool.has_healthy_workers():
+        # Every worker failed to load the model (e.g. missing checkpoint): a 429 could never succeed,
+        # so take the subprocess path, which falls back to a static WebM on failure
+        use_pool = False
+    # Reject early, before the upload and the dummy TTS are processed
+    if use_pool and not inference_pool.has_capacity():
+        return pool_full_response(inference_pool.reject())
         
     image_path = os.path.join(TEMP_DIR, f"{session_id}_input{ext}")
     audio_path = os.path.join(TEMP_DIR, f"{session_id}_dummy.mp3")
@@ -666,7 +821,23 @@ async def animate_avatar(
         dummy_text = "你好，我是数字人助手。我可以回答你的问题。"
         await generate_audio_file(dummy_text, audio_path)
 
-        success = run_wav2lip_inference(image_path, audio_path, output_video_path)
+        if use_pool:
+            try:
+                # The decoded frame travels to the worker through shared memory; frames too large
+                # for a slot are sent as the path of the upload already on disk
+                face = await asyncio.get_running_loop().run_in_executor(None, decode_image, content)
+                success = await inference_pool.submit(image_path if face is None else face,
+                                                      audio_path, output_video_path,
+                                                      face_path=image_path) is not None
+            except PoolFullError as e:
+                os.remove(image_path)
+                os.remove(audio_path)
+                return pool_full_response(e.retry_after)
+            except RuntimeError as e:
+                print(f"Inference pool error: {e}")
+                success = False
+        else:
+            success = run_wav2lip_inference(image_path, audio_path, output_video_path)
 
         final_output_path = os.path.join(TEMP_DIR, f"{session_id}_loop.webm")
         
@@ -743,56 +914,123 @@ async def animate_avatar(
         print(f"Animate error: {e}")
         return JSONResponse(status_code=500, content={"message": str(e)})
 
-@app.post("/tts")
-async def text_to_speech(
-    background_tasks: BackgroundTasks,
-    text: str = Form(...),
-    voice: str = Form("zh-CN-XiaoxiaoNeural"),
-    tts_provider: str = Form("microsoft")
-):
-    session_id = str(uuid.uuid4())
-    audio_path = os.path.join(TEMP_DIR, f"{session_id}.mp3")
+def volcengine_chunks(text: str, voice: str):
+    volc_voice = voice
+    if voice.startswith("zh-CN-") or voice.startswith("en-US-"):
+        volc_voice = "zh_female_meilinvyou_moon_bigtts"
+
+    print(f"[TTS] Using Volcengine voice: {volc_voice}")
+    return stream_volc_tts(
+        text,
+        volc_voice,
+        app_id=VOLC_TTS_APPID,
+        token=VOLC_TTS_TOKEN,
+        cluster=VOLC_TTS_CLUSTER
+    )
 
-    try:
-        if tts_provider == "volcengine":
-            volc_voice = voice
-            if voice.startswith("zh-CN-") or voice.startswith("en-US-"):
-                volc_voice = "zh_female_meilinvyou_moon_bigtts"
-
-            print(f"[TTS] Using Volcengine voice: {volc_voice}")
-
-            start_time = time.time()
-            await generate_volc_tts_ws(
-                text,
-                audio_path,
-                volc_voice,
-                app_id=VOLC_TTS_APPID,
-                token=VOLC_TTS_TOKEN,
-                cluster=VOLC_TTS_CLUSTER
-            )
-            duration = time.time() - start_time
-            print(f"[TTS] Generation Time (Volcengine): {duration:.4f}s")
-            
-        else:
-            start_time = time.time()
-            for _ in range(3):
-                try:
-                    await generate_audio_file(text, audio_path, voice)
-                    break
-                except Exception as retry_err:
-                    print(f"Edge TTS retry error: {retry_err}")
-                    await asyncio.sleep(1)
-            else:
-                raise Exception("Edge TTS failed after 3 retries")
-            duration = time.time() - start_time
-            print(f"[TTS] Generation Time (Edge): {duration:.4f}s")
+def microsoft_chunks(text: str, voice: str):
+    # A Volcengine voice id means we are the fallback for a Volcengine request
+    if not voice.endswith("Neural"):
+        voice = "zh-CN-XiaoxiaoNeural"
+    # One attempt only: the router fails over to the other provider instead of sleeping and retrying
+    return stream_edge_tts(text, voice, retries=1)
+
+# Per-provider latency/error tracking, hedged requests and circuit breaking for /tts
+tts_router = TTSRouter(
+    {"microsoft": microsoft_chunks, "volcengine": volcengine_chunks},
+    default_hedge_delay=float(config.get("TTS_HEDGE_DELAY", 1.5)),
+    failure_threshold=int(config.get("TTS_BREAKER_FAILURES", 3)),
+    cooldown=float(config.get("TTS_BREAKER_COOLDOWN", 30)),
+)
 
-        background_tasks.add_task(os.remove, audio_path)
+async def traced_chunks(chunks, trace_id: str, start: float, provider: str):
+    """Pass chunks through and record how long the whole stream took"""
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        tracer.add_span(trace_id, "tts.stream", start, provider=provider)
 
-        return FileResponse(audio_path, media_type="audio/mpeg")
+async def streaming_tts_response(text: str, voice: str, tts_provider: str, trace_id: str = None):
+    """Forward TTS audio to the client chunk by chunk; no temp file is written"""
+    start_time = time.time()
+    trace_start = time.monotonic()
+    key = tts_cache.key(text, voice, tts_provider)
+    # A cached result, or the result of an identical request that is being synthesized right now
+    data = await tts_cache.get(key)
+    if data is None:
+        data = await tts_cache.wait_inflight(key)
+    if data is not None:
+        metrics.TTS_REQUESTS.labels("cache", "hit").inc()
+        tracer.add_span(trace_id, "tts.first_chunk", trace_start, provider=tts_provider, cache="hit")
+        print(f"[TTS] Cache hit ({tts_provider}): {time.time() - start_time:.4f}s")
+        return Response(content=data, media_type="audio/mpeg", headers={"X-TTS-Cache": "hit"})
+
+    # Become the in-flight leader before synthesis starts, so identical requests that arrive
+    # while we wait for the first chunk coalesce onto this one
+    flight = tts_cache.lead(key)
+    try:
+        # Errors before the first chunk still produce a JSON 500
+        provider, chunks = await tts_router.stream(text, voice, tts_provider)
     except Exception as e:
+        tts_cache.abandon(key, flight)
+        metrics.TTS_REQUESTS.labels(tts_provider, "error").inc()
+        tracer.add_span(trace_id, "tts.first_chunk", trace_start, provider=tts_provider, error=str(e))
         print(f"TTS Final Error: {e}")
         return JSONResponse(status_code=500, content={"message": str(e)})
+    except BaseException:
+        tts_cache.abandon(key, flight)
+        raise
+    provider_chunks = chunks
+    # Fallback audio is not stored under the requested provider's key
+    if provider == tts_provider:
+        chunks = tts_cache.stream_through(key, chunks, flight)
+    else:
+        tts_cache.abandon(key, flight)
+    metrics.TTS_FIRST_CHUNK.labels(provider).observe(time.time() - start_time)
+    tracer.add_span(trace_id, "tts.first_chunk", trace_start, provider=provider, cache="miss")
+    if tracer.valid_id(trace_id):
+        chunks = traced_chunks(chunks, trace_id, trace_start, provider)
+    metrics.TTS_REQUESTS.labels(provider, "ok" if provider == tts_provider else "fallback").inc()
+    print(f"[TTS] First chunk ({provider}): {time.time() - start_time:.4f}s")
+    # The body generator only runs once the client reads it; if the client is gone before
+    # that, release the in-flight slot and the provider stream here instead
+    return StreamingResponse(chunks, media_type="audio/mpeg",
+                             headers={"X-TTS-Cache": "miss", "X-TTS-Provider": provider},
+                             background=BackgroundTask(release_tts_stream, key, flight, provider_chunks))
+
+async def release_tts_stream(key: str, flight, provider_chunks):
+    tts_cache.abandon(key, flight)
+    aclose = getattr(provider_chunks, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+@app.post("/tts")
+async def text_to_speech(
+    text: str = Form(...),
+    voice: str = Form("zh-CN-XiaoxiaoNeural"),
+    tts_provider: str = Form("microsoft"),
+    trace_id: str = Form(None)
+):
+    return await streaming_tts_response(text, voice, tts_provider, trace_id)
+
+@app.get("/tts/providers")
+async def get_tts_provider_stats():
+    return tts_router.stats()
+
+@app.get("/tts/cache/stats")
+async def get_tts_cache_stats():
+    return tts_cache.stats()
+
+@app.get("/tts/stream")
+async def text_to_speech_stream(
+    text: str,
+    voice: str = "zh-CN-XiaoxiaoNeural",
+    tts_provider: str = "microsoft",
+    trace_id: str = None
+):
+    # GET variant so that an <audio> element can start playing while audio is still arriving
+    return await streaming_tts_response(text, voice, tts_provider, trace_id)
 
 # Adjust sys.path to allow importing from current directory
 import sys
@@ -815,12 +1053,48 @@ except ImportError:
         print("警告: 内容过滤器不可用")
 
 try:
-    from backend.volc_realtime import RealtimeDialogClient
+    from backend.volc_realtime import RealtimeDialogClient, RealtimeSessionPool
 except ImportError:
     try:
-        from volc_realtime import RealtimeDialogClient
+        from volc_realtime import RealtimeDialogClient, RealtimeSessionPool
     except ImportError:
-        pass
+        RealtimeSessionPool = None
+
+# Pre-connected realtime sockets (StartConnection done) so a call only waits for StartSession
+# (0 = connect per call as before). Never pre-connect with the placeholder credentials,
+# that would only hammer the server with rejected handshakes
+REALTIME_POOL_SIZE = int(config.get("REALTIME_POOL_SIZE", 0))
+if any(str(value).startswith("YOUR_") for value in (VOLC_REALTIME_APPID, VOLC_REALTIME_TOKEN)):
+    REALTIME_POOL_SIZE = 0
+REALTIME_POOL_IDLE_TIMEOUT = float(config.get("REALTIME_POOL_IDLE_TIMEOUT", 20))
+realtime_pool = None
+if RealtimeSessionPool:
+    realtime_pool = RealtimeSessionPool(
+        lambda: RealtimeDialogClient(
+            app_id=VOLC_REALTIME_APPID,
+            access_token=VOLC_REALTIME_TOKEN,
+            resource_id=VOLC_REALTIME_RESOURCE_ID,
+            audio_compression=VOLC_REALTIME_AUDIO_COMPRESSION
+        ),
+        size=REALTIME_POOL_SIZE,
+        idle_timeout=REALTIME_POOL_IDLE_TIMEOUT,
+    )
+
+@app.on_event("startup")
+async def start_realtime_pool():
+    if realtime_pool:
+        realtime_pool.start()
+
+@app.on_event("shutdown")
+async def stop_realtime_pool():
+    if realtime_pool:
+        await realtime_pool.close()
+
+@app.get("/phone/pool")
+async def get_realtime_pool_stats():
+    if not realtime_pool:
+        return {"size": 0, "idle": 0}
+    return {"size": realtime_pool.size, "idle": realtime_pool.idle_count(), **realtime_pool.stats}
 
 # Initialize content filter
 content_filter = None
@@ -835,10 +1109,18 @@ class ChatRequest(BaseModel):
     text: str
     use_search: bool = True
     session_id: str = None
+    # From the /ws/asr final this message came from; a new trace is started if empty
+    trace_id: str = None
+
+class TraceReport(BaseModel):
+    # Browser-side timings: [{"name": "browser.chat", "duration_ms": 812.5, "end_offset_ms": 640.2}, ...]
+    # end_offset_ms = how long before the report the span ended (browser clock, so no clock sync needed)
+    spans: list
 
 @app.post("/chat")
 async def chat_endpoint(request: ChatRequest):
     print(f"Received chat request: {request.text}, use_search={request.use_search}")
+    trace_id = tracer.new_trace("voice_chat" if request.trace_id else "chat", request.trace_id)
 
     # Use existing conversation_id or create new one
     conversation_id = request.session_id
@@ -854,6 +1136,7 @@ async def chat_endpoint(request: ChatRequest):
     role_settings = get_active_role_settings()
 
     start_time = time.time()
+    llm_start = time.monotonic()
     response_text = chat_with_ark(
         request.text,
         use_search=request.use_search,
@@ -861,49 +1144,80 @@ async def chat_endpoint(request: ChatRequest):
         speaking_style=role_settings["speaking_style"]
     )
     duration = time.time() - start_time
+    metrics.LLM_LATENCY.observe(duration)
+    tracer.add_span(trace_id, "chat.llm", llm_start, search=request.use_search)
     print(f"LLM Response: {response_text}")
     print(f"[LLM] Response Time: {duration:.4f}s")
 
     # Save AI response
     add_message_to_conversation(conversation_id, "assistant", response_text)
 
-    return {"text": response_text, "session_id": conversation_id}
+    return {"text": response_text, "session_id": conversation_id, "trace_id": trace_id}
+
+@app.post("/traces/{trace_id}")
+async def report_trace(trace_id: str, report: TraceReport):
+    """Browser-side spans, placed relative to the moment the report arrives"""
+    now = time.monotonic()
+    for span in report.spans[:20]:
+        if isinstance(span, dict) and isinstance(span.get("duration_ms"), (int, float)):
+            name = str(span.get("name", "browser"))[:64]
+            offset = span.get("end_offset_ms")
+            end = now - (max(0.0, offset) / 1000 if isinstance(offset, (int, float)) else 0.0)
+            tracer.add_span(trace_id, name, end - max(0.0, span["duration_ms"]) / 1000, end, source="browser")
+    return {"ok": True}
+
+@app.get("/traces")
+async def get_traces(limit: int = 50, kind: str = None, format: str = "json"):
+    traces = tracer.recent(limit, kind)
+    if format == "jsonl":
+        body = "".join(json.dumps(t, ensure_ascii=False) + "\n" for t in traces)
+        return Response(content=body, media_type="application/x-ndjson")
+    return {"summary": tracer.summary(kind), "traces": traces}
+
+@app.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    trace = tracer.get(trace_id)
+    if trace is None:
+        return JSONResponse(status_code=404, content={"message": "Trace not found"})
+    return trace
 
 @app.websocket("/ws/phone")
 async def websocket_phone(websocket: WebSocket):
     await websocket.accept()
-    print("[Phone] Frontend connected")
+    log = log_utils.ConnLogger(ws_logger, "phone")
+    log.info("Frontend connected")
+    active_sockets = metrics.ACTIVE_WEBSOCKETS.labels("phone")
 
     voice = websocket.query_params.get("voice")
     if voice:
-        print(f"[Phone] Requested Voice: {voice}")
+        log.info("Requested voice: %s", voice)
 
     # Session tracking for chat history
     # Check if conversation_id is provided in query params
     conversation_id = websocket.query_params.get("conversation_id")
     if conversation_id:
-        print(f"[Phone] Using existing conversation: {conversation_id}")
+        log.info("Using existing conversation: %s", conversation_id)
     else:
         conversation_id = create_conversation(mode="phone")
-        print(f"[Phone] Created new conversation: {conversation_id}")
+        log.info("Created new conversation: %s", conversation_id)
 
     current_user_text = ""
     current_ai_text = ""
 
     role_settings = get_active_role_settings()
 
-    client = RealtimeDialogClient(
-        app_id=VOLC_REALTIME_APPID,
-        access_token=VOLC_REALTIME_TOKEN,
-        resource_id=VOLC_REALTIME_RESOURCE_ID
-    )
+    client = None
+    relays = []
 
     try:
-        await client.connect(
+        active_sockets.inc()
+        dial_start = time.time()
+        client = await realtime_pool.claim(
             voice=voice,
             system_prompt=role_settings["system_prompt"],
             speaking_style=role_settings["speaking_style"]
         )
+        log.info("Session started in %.3fs", time.time() - dial_start)
 
         # Send conversation_id to frontend
         await websocket.send_text(json.dumps({
@@ -911,16 +1225,47 @@ async def websocket_phone(websocket: WebSocket):
             "conversation_id": conversation_id
         }))
 
+        # Each direction goes through its own queue and sender task, so a slow browser
+        # doesn't stall reading from Volcengine and vice versa
+        uplink_relay = RelayChannel("phone uplink", client.send_audio,
+                                    bytes_per_ms=32, max_audio_ms=PHONE_UPLINK_MAX_MS)  # 16kHz int16
+        downlink_relay = RelayChannel("phone downlink", websocket.send_bytes, websocket.send_json,
+                                      bytes_per_ms=96, max_audio_ms=PHONE_DOWNLINK_MAX_MS,
+                                      max_batch_ms=PHONE_DOWNLINK_BATCH_MS)  # 24kHz float32
+        relays = [uplink_relay, downlink_relay]
+
+        # Current turn's trace: user starts talking (ASRInfo) -> ASR ends -> final text -> first reply text / audio
+        turn = {}
+
+        def trace_turn(name: str):
+            """Record the first occurrence of a turn milestone, measured from the end of the user's speech"""
+            if not turn or name in turn:
+                return
+            now = time.monotonic()
+            turn[name] = now
+            since = turn.get("speech_end") or turn.get("asr_final") or turn["speech_start"]
+            tracer.add_span(turn["trace_id"], f"phone.{name}", since, now)
+
+        uplink = UplinkAggregator(uplink_relay.put_audio, frame_ms=PHONE_UPLINK_FRAME_MS,
+                                  flush_timeout_ms=UPLINK_FLUSH_TIMEOUT_MS)
+
         async def frontend_to_volc():
             try:
                 while True:
                     data = await websocket.receive_bytes()
                     if not data: break
-                    await client.send_audio(data)
+                    await uplink.push(data)
             except WebSocketDisconnect:
-                print("[Phone] Frontend disconnected")
+                log.info("Frontend disconnected")
             except Exception as e:
-                print(f"[Phone] Frontend->Volc error: {e}")
+                log.error("Frontend->Volc error: %s", e)
+            finally:
+                # 发出缓冲里剩下的音频，并取消超时定时器
+                try:
+                    await uplink.close()
+                except Exception:
+                    pass
+                log.info("Uplink stats: %s", uplink.stats())
 
         async def volc_to_frontend():
             nonlocal current_user_text, current_ai_text
@@ -931,13 +1276,29 @@ async def websocket_phone(websocket: WebSocket):
                     
                     parsed = await client.parse_message(msg)
                     payload_msg = parsed.get('payload_msg')
+
+                    event = parsed.get('event')
+                    if event == 450:
+                        # ASRInfo: the user started talking (over the reply, queued reply audio is stale)
+                        downlink_relay.clear_audio()
+                        turn.clear()
+                        turn["trace_id"] = tracer.new_trace("phone", conn_id=log.conn_id,
+                                                            conversation_id=conversation_id)
+                        turn["speech_start"] = time.monotonic()
+                    elif event == 459 and turn and "speech_end" not in turn:
+                        # ASREnded
+                        turn["speech_end"] = time.monotonic()
+                        tracer.add_span(turn["trace_id"], "phone.user_speech", turn["speech_start"], turn["speech_end"])
                     
                     if isinstance(payload_msg, bytes):
                         # Audio data (PCM 24k)
-                        await websocket.send_bytes(payload_msg)
+                        if turn and "first_audio" not in turn:
+                            trace_turn("first_audio")
+                            tracer.add_span(turn["trace_id"], "phone.turn", turn["speech_start"], turn["first_audio"])
+                        await downlink_relay.put_audio(payload_msg)
                     elif isinstance(payload_msg, dict):
                         # Event
-                        print(f"[Phone] Received event: {payload_msg}")
+                        log.throttled(logging.DEBUG, "event", 1.0, "Received event %s: %s", parsed.get('event'), payload_msg)
 
                         # Save user message when ASR completes
                         if 'asr' in payload_msg and 'result' in payload_msg['asr']:
@@ -973,17 +1334,19 @@ async def websocket_phone(websocket: WebSocket):
                                         if content_filter:
                                             passed, _, keywords = content_filter.filter_input(user_text)
                                             if not passed:
-                                                print(f"[Phone] Input blocked: {keywords[:3]}")
+                                                log.warning("Input blocked: %s", keywords[:3])
                                                 content_filter.log_violation(user_text, keywords, "phone_input")
                                                 continue
 
                                         current_user_text = user_text
+                                        trace_turn("asr_final")
                                         add_message_to_conversation(conversation_id, "user", current_user_text)
-                                        print(f"[Phone] Saved user message: {current_user_text}")
+                                        log.info("Saved user message: %s", current_user_text)
                         
                         # Capture AI Response
                         # Event structure: {'content': '...', 'question_id': '...', 'reply_id': '...'}
                         if 'content' in payload_msg and payload_msg.get('question_id'):
+                            trace_turn("first_text")
                             current_ai_text += payload_msg['content']
 
                         # Save AI response when no_content flag is set (end of response)
@@ -992,54 +1355,84 @@ async def websocket_phone(websocket: WebSocket):
                             if content_filter:
                                 passed, filtered_text = content_filter.filter_output(current_ai_text)
                                 if not passed:
-                                    print(f"[Phone] Output blocked")
+                                    log.warning("Output blocked")
                                     content_filter.log_violation(current_ai_text, [], "phone_output")
                                     current_ai_text = filtered_text
 
                             add_message_to_conversation(conversation_id, "assistant", current_ai_text)
-                            print(f"[Phone] Saved AI message: {current_ai_text[:50]}...")
+                            log.info("Saved AI message: %s...", current_ai_text[:50])
                             current_ai_text = ""
 
-                        await websocket.send_json(payload_msg)
+                        await downlink_relay.put_message(payload_msg)
                         
             except Exception as e:
-                print(f"[Phone] Volc->Frontend error: {e}")
+                log.error("Volc->Frontend error: %s", e)
 
         # Run tasks
         consumer_task = asyncio.create_task(frontend_to_volc())
         producer_task = asyncio.create_task(volc_to_frontend())
         
+        # A sender task only finishes when its side of the bridge fails
+        relay_tasks = [relay.start() for relay in relays]
         done, pending = await asyncio.wait(
-            [consumer_task, producer_task],
+            [consumer_task, producer_task] + relay_tasks,
             return_when=asyncio.FIRST_COMPLETED,
         )
         
         for task in pending:
-            task.cancel()
+            # senders are drained by relay.close() below
+            if task not in relay_tasks:
+                task.cancel()
             
     except Exception as e:
-        print(f"[Phone] Error: {e}")
+        log.error("Error: %s", e)
     finally:
-        await client.close()
-        print("[Phone] Closed")
+        for relay in relays:
+            await relay.close()
+            log.info("%s stats: %s", relay.name, relay.stats())
+        if client:
+            await client.close()
+        active_sockets.dec()
+        log.info("Closed")
 
 @app.websocket("/ws/asr")
 async def websocket_asr(websocket: WebSocket):
     await websocket.accept()
-    print("Frontend WebSocket connected")
+    log = log_utils.ConnLogger(ws_logger, "asr")
+    log.info("Frontend connected")
+    active_sockets = metrics.ACTIVE_WEBSOCKETS.labels("asr")
 
     config = Config(VOLC_ASR_APPID, VOLC_ASR_TOKEN, VOLC_ASR_RESOURCE_ID)
 
     try:
-        print("Initializing AsrWsClient...")
-        async with AsrWsClient(VOLC_URL, config, segment_duration=200) as client:
-            print("Creating connection to Volcengine...")
+        active_sockets.inc()
+        async with AsrWsClient(VOLC_URL, config, segment_duration=ASR_UPLINK_FRAME_MS,
+                               audio_compression=VOLC_ASR_AUDIO_COMPRESSION,
+                               session=http_sessions.get()) as client:
             await client.create_connection()
-            print("Connection created.")
-
-            print("Sending full client request...")
             await client.send_full_client_request()
-            print("Full client request sent.")
+            log.info("Volcengine ASR session ready")
+
+            first_audio_at = None
+            first_result_seen = False
+
+            async def send_segment(segment: bytes):
+                nonlocal first_audio_at
+                if first_audio_at is None:
+                    first_audio_at = time.perf_counter()
+                request = volc_module.RequestBuilder.new_audio_only_request(
+                    client.seq,
+                    segment,
+                    is_last=False,
+                    encoder=client.encoder
+                )
+                await client.conn.send_bytes(request)
+                log.throttled(logging.DEBUG, "segment", 5.0, "Sent audio segment seq %d (%d bytes)", client.seq, len(segment))
+                client.seq += 1
+
+            uplink = UplinkAggregator(send_segment, frame_ms=client.segment_duration,
+                                      flush_timeout_ms=UPLINK_FLUSH_TIMEOUT_MS)
+
             async def frontend_to_volc():
                 try:
                     while True:
@@ -1047,43 +1440,40 @@ async def websocket_asr(websocket: WebSocket):
                         if not data:
                             break
 
-                        print(f"Received audio chunk from frontend: {len(data)} bytes")
-
-                        request = volc_module.RequestBuilder.new_audio_only_request(
-                            client.seq,
-                            data,
-                            is_last=False
-                        )
-                        await client.conn.send_bytes(request)
-                        print(f"Sent audio segment to Volcengine seq: {client.seq}")
-                        client.seq += 1
+                        await uplink.push(data)
 
                 except WebSocketDisconnect:
-                    print("Frontend disconnected (WebSocketDisconnect)")
+                    log.info("Frontend disconnected")
                 except Exception as e:
-                    print(f"Frontend->Volc error: {type(e).__name__}: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    log.exception("Frontend->Volc error: %s: %s", type(e).__name__, e)
+                finally:
+                    # 发出缓冲里剩下的音频，并取消超时定时器
+                    try:
+                        await uplink.close()
+                    except Exception:
+                        pass
+                    log.info("Uplink stats: %s", uplink.stats())
 
             async def volc_to_frontend():
+                nonlocal first_result_seen
                 sent_utterances = set()
                 last_sent_final = ""
                 last_sent_interim = ""
+                # Monotonic times of the current utterance's first and latest interim text, for tracing
+                utterance_start = None
+                last_interim_at = None
                 try:
                     async for msg in client.conn:
                         if msg.type == aiohttp.WSMsgType.BINARY:
                             response = volc_module.ResponseParser.parse_response(msg.data)
 
-                            print(f"--- [ASR RESPONSE] Seq: {response.payload_sequence} | Event: {response.event} | Code: {response.code} ---")
-                            if response.payload_msg:
-                                print(f"Payload: {response.payload_msg}")
-                            else:
-                                print("Payload: None")
-                            print("---------------------------------------------------------------")
+                            log.throttled(logging.DEBUG, "response", 1.0, "Response seq %s event %s code %s: %s",
+                                          response.payload_sequence, response.event, response.code, response.payload_msg)
 
                             if response.payload_msg and 'result' in response.payload_msg:
-                                from datetime import datetime
-                                print(f"[ASR] Result Received at: {datetime.now().strftime('%H:%M:%S.%f')[:-3]}")
+                                if not first_result_seen and first_audio_at is not None:
+                                    first_result_seen = True
+                                    metrics.ASR_FIRST_RESULT.observe(time.perf_counter() - first_audio_at)
                                 result = response.payload_msg['result']
                                 text = result.get('text', '')
                                 utterances = result.get('utterances', [])
@@ -1112,11 +1502,27 @@ async def websocket_asr(websocket: WebSocket):
                                     cleaned_interim = clean(interim)
 
                                     if cleaned_last == cleaned_interim or cleaned_last.startswith(cleaned_interim):
-                                        print(f"DUPLICATE FILTERED: interim='{interim}' vs last_final='{last_sent_final}'")
+                                        log.debug("Duplicate interim filtered: %r vs last final %r", interim, last_sent_final)
                                         interim = ""
 
+                                now = time.monotonic()
+                                if interim and interim != last_sent_interim:
+                                    utterance_start = utterance_start or now
+                                    last_interim_at = now
+
+                                # Each final starts a turn trace; the frontend passes the id on to /chat and /tts
+                                trace_id = None
+                                if new_finals:
+                                    trace_id = tracer.new_trace("voice_chat", conn_id=log.conn_id)
+                                    tracer.add_span(trace_id, "asr.utterance", utterance_start or now, now)
+                                    tracer.add_span(trace_id, "asr.endpoint", last_interim_at or now, now)
+                                    utterance_start = last_interim_at = None
+
                                 if new_finals or (interim and interim != last_sent_interim):
-                                    print(f"ASR UPDATE: finals={new_finals}, interim='{interim}'")
+                                    if new_finals:
+                                        log.info("ASR finals: %s (trace %s)", new_finals, trace_id)
+                                    else:
+                                        log.throttled(logging.DEBUG, "interim", 1.0, "ASR interim: %r", interim)
 
                                 if new_finals or (interim != last_sent_interim):
                                     last_sent_interim = interim
@@ -1124,18 +1530,17 @@ async def websocket_asr(websocket: WebSocket):
                                         "type": "asr_update",
                                         "text": text,
                                         "finals": new_finals,
-                                        "interim": interim
+                                        "interim": interim,
+                                        "trace_id": trace_id
                                     })
 
                             if response.is_last_package or response.code != 0:
-                                print(f"Volcengine finished. Last: {response.is_last_package}, Code: {response.code}")
+                                log.info("Volcengine finished. Last: %s, Code: %s", response.is_last_package, response.code)
                                 break
                         else:
-                            print(f"Volcengine non-binary message: {msg.type}")
+                            log.warning("Volcengine non-binary message: %s", msg.type)
                 except Exception as e:
-                    print(f"Volc->Frontend error: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    log.exception("Volc->Frontend error: %s", e)
 
             # Run concurrently
             consumer_task = asyncio.create_task(frontend_to_volc())
@@ -1150,8 +1555,10 @@ async def websocket_asr(websocket: WebSocket):
                 task.cancel()
 
     except Exception as e:
-        print(f"ASR Error: {e}")
+        log.error("ASR error: %s", e)
         await websocket.close()
+    finally:
+        active_sockets.dec()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,150 @@
+"""
+共享内存环形缓冲区
+API 进程与推理进程之间传输帧、人脸裁剪和 PCM 音频时不经过 pickle/管道拷贝：
+数组直接写入 multiprocessing.shared_memory 中的固定大小槽位，消息里只传 (槽位, 序号)。
+单生产者（创建方）/ 单消费者（挂载方），消费者用完后释放槽位。
+"""
+
+from multiprocessing import shared_memory
+from typing import Tuple
+
+import numpy as np
+
+# 槽位状态
+FREE = 0
+READY = 1
+
+MAX_DIMS = 4
+
+SLOT_HEADER = np.dtype([
+    ("state", "<u4"),
+    ("ndim", "<u4"),
+    ("seq", "<u8"),
+    ("nbytes", "<u8"),
+    ("dtype", "S8"),
+    ("shape", "<i8", (MAX_DIMS,)),
+])
+
+
+class RingFullError(Exception):
+    """没有空闲槽位"""
+
+
+class StaleSlotError(Exception):
+    """槽位已被复用，序号与引用不一致"""
+
+
+class ShmRing:
+    """
+    固定槽位的共享内存环
+
+    Args:
+        name: 共享内存名称，挂载方用它打开同一块内存
+        slots: 槽位数
+        slot_bytes: 每个槽位可容纳的最大数组字节数
+        create: True 为创建方（生产者，负责 unlink），False 为挂载方
+    """
+
+    def __init__(self, name: str = None, slots: int = 8, slot_bytes: int = 8 << 20, create: bool = True):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.header_bytes = SLOT_HEADER.itemsize * slots
+        size = self.header_bytes + slots * slot_bytes
+        self.owner = create
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = _attach_untracked(name)
+        self.headers = np.ndarray((slots,), dtype=SLOT_HEADER, buffer=self.shm.buf)
+        if create:
+            self.headers[:] = np.zeros(slots, dtype=SLOT_HEADER)
+        self._next = 0
+        self._seq = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def spec(self) -> Tuple[str, int, int]:
+        """挂载所需的参数，可安全地发送给子进程"""
+        return self.shm.name, self.slots, self.slot_bytes
+
+    @classmethod
+    def attach(cls, spec: Tuple[str, int, int]) -> "ShmRing":
+        name, slots, slot_bytes = spec
+        return cls(name, slots, slot_bytes, create=False)
+
+    def fits(self, array: np.ndarray) -> bool:
+        return array.nbytes <= self.slot_bytes and array.ndim <= MAX_DIMS
+
+    def put(self, array: np.ndarray) -> Tuple[int, int]:
+        """把数组拷贝进一个空闲槽位，返回引用 (slot, seq)"""
+        if not self.fits(array):
+            raise ValueError(f"Array of {array.nbytes} bytes / {array.ndim} dims does not fit a ring slot")
+        for i in range(self.slots):
+            slot = (self._next + i) % self.slots
+            if self.headers[slot]["state"] == FREE:
+                break
+        else:
+            raise RingFullError(f"All {self.slots} ring slots are in use")
+        self._next = (slot + 1) % self.slots
+        self._seq += 1
+
+        dst = self._slot_array(slot, array.dtype, array.shape)
+        np.copyto(dst, array, casting="no")
+        header = self.headers[slot]
+        header["ndim"] = array.ndim
+        header["nbytes"] = array.nbytes
+        header["dtype"] = array.dtype.str.encode()
+        header["shape"][:] = 0
+        header["shape"][:array.ndim] = array.shape
+        header["seq"] = self._seq
+        # 状态最后写，消费者看到 READY 时其余字段已就绪
+        header["state"] = READY
+        return slot, self._seq
+
+    def view(self, ref: Tuple[int, int]) -> np.ndarray:
+        """引用对应数组的零拷贝视图，在 release 之前有效"""
+        slot, seq = ref
+        header = self.headers[slot]
+        if header["state"] != READY or int(header["seq"]) != seq:
+            raise StaleSlotError(f"Slot {slot} no longer holds message {seq}")
+        shape = tuple(int(d) for d in header["shape"][:int(header["ndim"])])
+        return self._slot_array(slot, np.dtype(header["dtype"].decode()), shape)
+
+    def release(self, ref: Tuple[int, int]):
+        slot, seq = ref
+        header = self.headers[slot]
+        if int(header["seq"]) == seq:
+            header["state"] = FREE
+
+    def in_use(self) -> int:
+        return int((self.headers["state"] != FREE).sum())
+
+    def _slot_array(self, slot: int, dtype, shape) -> np.ndarray:
+        offset = self.header_bytes + slot * self.slot_bytes
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+
+    def close(self):
+        # 视图必须先释放，否则 SharedMemory.close 会因导出的缓冲区报错
+        self.headers = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # 仍有外部视图引用这块内存，交给进程退出时回收
+            pass
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    # 挂载方不登记到 resource_tracker，避免它退出时把创建方的内存 unlink 掉。
+    # Python < 3.13 没有 track 参数；multiprocessing 启动的子进程与父进程共用同一个
+    # resource_tracker（按名称去重），重复登记无害
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
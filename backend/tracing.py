@@ -0,0 +1,157 @@
+"""
+对话轮次的延迟追踪
+一轮对话是一个 trace（trace_id），各阶段是 span（单调时钟的起止时间）：
+- 语音对话：/ws/asr 出终稿时生成 trace_id 发给前端，前端带着它请求 /chat 和 /tts，
+  最后把浏览器侧看到的耗时报回 /traces/{trace_id}；
+- 电话模式：/ws/phone 在实时对话的 ASR 事件处开一轮，到回复的第一段音频结束。
+最近的 trace 保存在环形缓冲里（/traces 查询），每个 span 也可以逐行追加到 JSONL 文件。
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+_TRACE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class Trace:
+    def __init__(self, trace_id: str, kind: str, attrs: dict):
+        self.trace_id = trace_id
+        self.kind = kind
+        self.attrs = attrs
+        self.wall_start = time.time()
+        self.start = time.monotonic()
+        self.spans: List[dict] = []
+
+    def to_dict(self) -> dict:
+        spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        end_ms = max((s["start_ms"] + s["duration_ms"] for s in spans), default=0.0)
+        start_ms = min((s["start_ms"] for s in spans), default=0.0)
+        return {
+            "trace_id": self.trace_id,
+            "kind": self.kind,
+            "started_at": round(self.wall_start, 3),
+            "attrs": self.attrs,
+            "total_ms": round(end_ms - min(start_ms, 0.0), 1),
+            "spans": spans,
+        }
+
+
+class Tracer:
+    """
+    Args:
+        capacity: 环形缓冲保留的 trace 数
+        export_path: JSONL 文件路径，每个 span 一行；为空时不写文件
+    """
+
+    def __init__(self, capacity: int = 200, export_path: Optional[str] = None):
+        self.capacity = capacity
+        self.export_path = export_path
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._file = None
+
+    @staticmethod
+    def valid_id(trace_id: Optional[str]) -> bool:
+        return bool(trace_id) and bool(_TRACE_ID.match(trace_id))
+
+    def new_trace(self, kind: str, trace_id: Optional[str] = None, **attrs) -> str:
+        """开始一轮；trace_id 不合法或为空时生成新的"""
+        if not self.valid_id(trace_id):
+            trace_id = uuid.uuid4().hex[:16]
+        with self._lock:
+            self._get_or_create(trace_id, kind, attrs)
+        return trace_id
+
+    def _get_or_create(self, trace_id: str, kind: str, attrs: dict) -> Trace:
+        trace = self._traces.get(trace_id)
+        if trace is None:
+            trace = Trace(trace_id, kind, attrs)
+            self._traces[trace_id] = trace
+            while len(self._traces) > self.capacity:
+                self._traces.popitem(last=False)
+        else:
+            trace.attrs.update(attrs)
+        return trace
+
+    def add_span(self, trace_id: Optional[str], name: str, start: float, end: Optional[float] = None, **attrs):
+        """
+        记录一个 span
+
+        Args:
+            trace_id: 所属 trace；为空或不合法时忽略，缓冲里没有的 trace 会新建（kind 为 external）
+            start / end: time.monotonic() 时间戳，end 为空表示现在
+        """
+        if not self.valid_id(trace_id):
+            return
+        end = time.monotonic() if end is None else end
+        with self._lock:
+            trace = self._get_or_create(trace_id, "external", {})
+            span = {"name": name, "start_ms": round((start - trace.start) * 1000, 1),
+                    "duration_ms": round((end - start) * 1000, 1), **attrs}
+            trace.spans.append(span)
+            if self.export_path:
+                self._export({"trace_id": trace_id, "kind": trace.kind,
+                              "ts": round(trace.wall_start + (start - trace.start), 3), **span})
+
+    @contextmanager
+    def span(self, trace_id: Optional[str], name: str, **attrs):
+        start = time.monotonic()
+        try:
+            yield attrs
+        finally:
+            self.add_span(trace_id, name, start, **attrs)
+
+    def _export(self, record: dict):
+        try:
+            if self._file is None:
+                directory = os.path.dirname(self.export_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.export_path, "a", encoding="utf-8", buffering=1)
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"[Tracing] Export failed, disabling: {e}")
+            self.export_path = None
+
+    def get(self, trace_id: str) -> Optional[dict]:
+        with self._lock:
+            trace = self._traces.get(trace_id)
+            return trace.to_dict() if trace else None
+
+    def recent(self, limit: int = 50, kind: Optional[str] = None) -> List[dict]:
+        """最近的 trace，新的在前"""
+        with self._lock:
+            traces = [t for t in reversed(self._traces.values()) if kind is None or t.kind == kind]
+            return [t.to_dict() for t in traces[:limit]]
+
+    def summary(self, kind: Optional[str] = None) -> Dict[str, dict]:
+        """按 span 名汇总缓冲里的耗时：次数、p50、p95、最大值"""
+        durations: Dict[str, List[float]] = {}
+        with self._lock:
+            for trace in self._traces.values():
+                if kind is None or trace.kind == kind:
+                    for span in trace.spans:
+                        durations.setdefault(span["name"], []).append(span["duration_ms"])
+        result = {}
+        for name, values in sorted(durations.items()):
+            values.sort()
+            result[name] = {
+                "count": len(values),
+                "p50_ms": values[len(values) // 2],
+                "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max_ms": values[-1],
+            }
+        return result
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
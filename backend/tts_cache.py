@@ -0,0 +1,264 @@
+"""
+TTS 合成结果缓存
+键 = 规范化文本 + 音色 + 提供方 + 韵律参数；内存层（LRU，按字节数限制）+ 磁盘层（LRU，按字节数限制），
+相同请求并发时只合成一次（single-flight），并统计命中率。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """全角/半角统一（NFKC）、去首尾空白、合并连续空白"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class TTSCache:
+    """
+    Args:
+        cache_dir: 磁盘层目录，为 None 时只用内存层
+        memory_bytes: 内存层容量上限（字节）
+        disk_bytes: 磁盘层容量上限（字节）
+        max_entry_bytes: 超过该大小的音频不缓存
+        inflight_timeout: 领头请求最长占用秒数；超时后等待者自行合成，登记也被清除
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, memory_bytes: int = 32 << 20,
+                 disk_bytes: int = 512 << 20, max_entry_bytes: int = 8 << 20, inflight_timeout: float = 60.0):
+        self.cache_dir = cache_dir
+        self.inflight_timeout = inflight_timeout
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.max_entry_bytes = max_entry_bytes
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+        self._disk_lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.inflight_timeouts = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._load_disk_index()
+
+    @staticmethod
+    def key(text: str, voice: str, provider: str, **params) -> str:
+        raw = json.dumps([normalize_text(text), voice, provider, sorted(params.items())], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # ---- lookup / store ----
+
+    async def get(self, key: str) -> Optional[bytes]:
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.hits_memory += 1
+            return data
+        if key in self._disk:
+            data = await asyncio.to_thread(self._read_disk, key)
+            if data is not None:
+                self.hits_disk += 1
+                self._put_memory(key, data)
+                return data
+        # 未命中在真正开始合成（lead）时才计数，等到同 key 合成结果的请求算作命中
+        return None
+
+    async def put(self, key: str, data: bytes):
+        if not data or len(data) > self.max_entry_bytes:
+            return
+        self._put_memory(key, data)
+        if self.cache_dir:
+            await asyncio.to_thread(self._write_disk, key, data)
+
+    # ---- single-flight ----
+
+    async def get_or_create(self, key: str, factory: Callable[[], Awaitable[bytes]]) -> bytes:
+        """命中直接返回；否则同一 key 只有一个调用真正执行 factory，其余等待其结果"""
+        data = await self.get(key)
+        if data is not None:
+            return data
+        data = await self.wait_inflight(key)
+        if data is not None:
+            return data
+
+        future = self.lead(key)
+        data = None
+        try:
+            data = await factory()
+            await self.put(key, data)
+            return data
+        finally:
+            self._finish(key, future, data)
+
+    async def wait_inflight(self, key: str) -> Optional[bytes]:
+        """同一 key 正在合成时等待它完成；领头请求失败或超过 inflight_timeout 时返回 None"""
+        future = self._inflight.get(key)
+        if future is None:
+            return None
+        try:
+            data = await asyncio.wait_for(asyncio.shield(future), self.inflight_timeout)
+        except asyncio.TimeoutError:
+            return None
+        if data is not None:
+            self.coalesced += 1
+        return data
+
+    async def stream_through(self, key: str, chunks: AsyncIterator[bytes],
+                             future: Optional[asyncio.Future] = None) -> AsyncIterator[bytes]:
+        """
+        作为领头请求转发流式音频：完整结束后写入缓存并唤醒等待者，
+        失败或客户端中途断开时等待者得到 None，自行合成
+
+        Args:
+            future: 合成开始前已由 lead() 登记的领头 future；为空时在这里登记
+        """
+        future = future or self.lead(key)
+        buffer = bytearray()
+        data = None
+        try:
+            async for chunk in chunks:
+                buffer.extend(chunk)
+                yield chunk
+            data = bytes(buffer)
+            await self.put(key, data)
+        finally:
+            self._finish(key, future, data)
+
+    def lead(self, key: str) -> asyncio.Future:
+        """
+        登记为该 key 的领头请求，之后同 key 的 wait_inflight() 都等它的结果
+
+        要在开始合成之前调用（合成开始前到达的相同请求也要能合并），
+        并且必须以 stream_through() 结束或在失败时调用 abandon()，否则等待者不会被唤醒。
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inflight[key] = future
+        self.misses += 1
+        # 兜底：领头请求既没结束也没 abandon（例如响应体从未被迭代）时，到期自动放弃
+        handle = loop.call_later(self.inflight_timeout, self._expire, key, future)
+        future.add_done_callback(lambda _: handle.cancel())
+        return future
+
+    def abandon(self, key: str, future: asyncio.Future):
+        """领头请求没有产出可缓存的结果（合成失败、降级到其他提供方），等待者得到 None"""
+        self._finish(key, future, None)
+
+    def _expire(self, key: str, future: asyncio.Future):
+        if not future.done():
+            self.inflight_timeouts += 1
+            self._finish(key, future, None)
+
+    def _finish(self, key: str, future: asyncio.Future, data: Optional[bytes]):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.done():
+            future.set_result(data)
+
+    # ---- memory tier ----
+
+    def _put_memory(self, key: str, data: bytes):
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    # ---- disk tier ----
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".mp3")
+
+    def _load_disk_index(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".mp3"):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        # 按最近使用时间（mtime，命中时会刷新）从旧到新
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._disk_lock:
+                self._disk_size -= self._disk.pop(key, 0)
+            return None
+        with self._disk_lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+        return data
+
+    def _write_disk(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[TTSCache] write failed: {e}")
+            return
+        with self._disk_lock:
+            self._disk_size -= self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            self._disk_size += len(data)
+            evict = []
+            while self._disk_size > self.disk_bytes and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_size -= size
+                evict.append(old_key)
+        for old_key in evict:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    # ---- metrics ----
+
+    def stats(self) -> dict:
+        hits = self.hits_memory + self.hits_disk + self.coalesced
+        lookups = hits + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_size,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_size,
+            "inflight": len(self._inflight),
+            "inflight_timeouts": self.inflight_timeouts,
+        }
@@ -0,0 +1,222 @@
+"""
+TTS 提供方路由
+按提供方统计首包延迟分位数和错误率；首选提供方超过其 p95 仍未出声时，向备选提供方发出对冲请求，
+谁先返回第一片音频就用谁；连续失败的提供方熔断一段时间后再半开试探。
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+try:
+    from backend.tts_stream import prefetch
+except ImportError:
+    from tts_stream import prefetch
+
+# factory(text, voice) -> 音频分片的异步迭代器
+StreamFactory = Callable[[str, str], AsyncIterator[bytes]]
+
+
+class CircuitBreaker:
+    """连续失败 failure_threshold 次后打开，cooldown 秒后半开放行一个试探请求"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = self.CLOSED
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.HALF_OPEN:
+            # 只放行一个试探请求，结果出来之前其余请求仍视为熔断
+            self._state = self.OPEN
+            self.opened_at = time.monotonic()
+            return True
+        return state == self.CLOSED
+
+    def record_success(self):
+        self.failures = 0
+        self._state = self.CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self._state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class ProviderStats:
+    """滑动窗口内的首包延迟和成功/失败记录"""
+
+    def __init__(self, window: int = 200):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.hedges_won = 0
+
+    def record(self, latency: Optional[float], ok: bool):
+        self.requests += 1
+        self.outcomes.append(ok)
+        if ok and latency is not None:
+            self.latencies.append(latency)
+        if not ok:
+            self.errors += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def error_rate(self) -> float:
+        return 1.0 - sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class TTSRouter:
+    """
+    Args:
+        providers: 提供方名称 -> StreamFactory，字典顺序即默认的备选顺序
+        hedge_min_samples: 样本不足时用 default_hedge_delay 作为对冲阈值
+        default_hedge_delay: 默认对冲阈值（秒）
+        min_hedge_delay / max_hedge_delay: 对冲阈值的上下限（秒）
+    """
+
+    def __init__(self, providers: Dict[str, StreamFactory], hedge_min_samples: int = 20,
+                 default_hedge_delay: float = 1.5, min_hedge_delay: float = 0.2, max_hedge_delay: float = 5.0,
+                 failure_threshold: int = 3, cooldown: float = 30.0):
+        self.providers = providers
+        self.hedge_min_samples = hedge_min_samples
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.stats_by_provider = {name: ProviderStats() for name in providers}
+        self.breakers = {name: CircuitBreaker(failure_threshold, cooldown) for name in providers}
+        self.hedged = 0
+
+    def hedge_delay(self, name: str) -> float:
+        stats = self.stats_by_provider[name]
+        if len(stats.latencies) < self.hedge_min_samples:
+            return self.default_hedge_delay
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, stats.percentile(0.95)))
+
+    def _next_candidate(self, candidates: List[str]) -> Optional[str]:
+        # 熔断检查放到真正要发请求时，半开状态的试探名额不会被白白占用
+        while candidates:
+            name = candidates.pop(0)
+            if self.breakers[name].allow():
+                return name
+        return None
+
+    async def stream(self, text: str, voice: str, preferred: str) -> Tuple[str, AsyncIterator[bytes]]:
+        """
+        返回 (实际使用的提供方, 已取到第一片的音频迭代器)
+
+        Raises:
+            Exception: 所有提供方都失败时抛出最后一个错误
+        """
+        if preferred not in self.providers:
+            preferred = next(iter(self.providers))
+        candidates = [preferred] + [name for name in self.providers if name != preferred]
+        pending: Dict[asyncio.Task, Tuple[str, float]] = {}
+        launched: List[str] = []
+        last_error: Optional[BaseException] = None
+
+        def launch(name):
+            task = asyncio.ensure_future(prefetch(self.providers[name](text, voice)))
+            pending[task] = (name, time.monotonic())
+            launched.append(name)
+
+        # 全部熔断时仍然尝试首选，总比直接报错好
+        launch(self._next_candidate(candidates) or preferred)
+        try:
+            while pending:
+                # 还有备选时，等到当前最早请求的对冲阈值为止
+                timeout = None
+                if candidates:
+                    first_name, first_start = next(iter(pending.values()))
+                    timeout = max(0.0, first_start + self.hedge_delay(first_name) - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    name = self._next_candidate(candidates)
+                    if name:
+                        self.hedged += 1
+                        print(f"[TTSRouter] {first_name} slower than {self.hedge_delay(first_name):.2f}s, hedging with {name}")
+                        launch(name)
+                    continue
+
+                for task in done:
+                    name, start = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        self._record(name, time.monotonic() - start, True)
+                        if name != launched[0]:
+                            self.stats_by_provider[name].hedges_won += 1
+                        return name, self._watch(name, task.result())
+                    last_error = error
+                    print(f"[TTSRouter] {name} failed: {error}")
+                    self._record(name, None, False)
+                    if not pending:
+                        name = self._next_candidate(candidates)
+                        if name:
+                            launch(name)
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(_close_stream)
+
+        raise last_error or Exception("No TTS provider available")
+
+    async def _watch(self, name: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """流中途出错也计入熔断"""
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except Exception:
+            self.breakers[name].record_failure()
+            self.stats_by_provider[name].errors += 1
+            raise
+
+    def _record(self, name: str, latency: Optional[float], ok: bool):
+        self.stats_by_provider[name].record(latency, ok)
+        if ok:
+            self.breakers[name].record_success()
+        else:
+            self.breakers[name].record_failure()
+
+    def stats(self) -> dict:
+        result = {"hedged": self.hedged, "providers": {}}
+        for name, stats in self.stats_by_provider.items():
+            p50, p95 = stats.percentile(0.5), stats.percentile(0.95)
+            result["providers"][name] = {
+                "requests": stats.requests,
+                "errors": stats.errors,
+                "error_rate": round(stats.error_rate(), 4),
+                "p50_first_chunk_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_first_chunk_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "hedge_delay_ms": round(self.hedge_delay(name) * 1000, 1),
+                "hedges_won": stats.hedges_won,
+                "breaker": self.breakers[name].state,
+            }
+        return result
+
+
+def _close_stream(task: asyncio.Task):
+    """对冲失败的一方若已拿到音频流，关闭它以释放连接"""
+    if task.cancelled() or task.exception() is not None:
+        return
+    asyncio.ensure_future(task.result().aclose())
@@ -0,0 +1,56 @@
+"""
+流式 TTS 工具
+把 edge-tts / 火山引擎的音频分片原样转发给客户端，不落临时文件。
+"""
+
+import asyncio
+from typing import AsyncIterator
+
+import edge_tts
+
+
+async def stream_edge_tts(text: str, voice: str, retries: int = 3, retry_delay: float = 1.0) -> AsyncIterator[bytes]:
+    """
+    edge-tts 的 MP3 分片（Communicate.stream）
+
+    只有在还没产出任何音频时才重试，已经发给客户端的分片无法撤回
+    """
+    for attempt in range(retries):
+        sent = False
+        try:
+            async for chunk in edge_tts.Communicate(text, voice).stream():
+                if chunk["type"] == "audio" and chunk["data"]:
+                    sent = True
+                    yield chunk["data"]
+            return
+        except Exception as e:
+            if sent or attempt == retries - 1:
+                raise
+            print(f"Edge TTS retry error: {e}")
+            await asyncio.sleep(retry_delay)
+
+
+async def prefetch(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    先取出第一个分片再返回生成器
+
+    连接/鉴权/合成错误会在这里抛出，调用方仍可返回普通的错误响应，
+    而不是发出 200 之后再中断流
+    """
+    iterator = chunks.__aiter__()
+    try:
+        first = await iterator.__anext__()
+    except StopAsyncIteration:
+        raise Exception("No audio data received")
+
+    async def _chained():
+        try:
+            yield first
+            async for chunk in iterator:
+                yield chunk
+        finally:
+            # 提前关闭时把底层生成器一并关闭，释放它持有的连接
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
+
+    return _chained()
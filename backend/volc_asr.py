@@ -1,7 +1,6 @@
 import asyncio
 import aiohttp
 import json
-import struct
 import gzip
 import uuid
 import logging
@@ -9,6 +8,11 @@ import os
 import subprocess
 from typing import Optional, List, Dict, Any, Tuple, AsyncGenerator
 
+try:
+    import backend.volc_codec as codec
+except ImportError:
+    import volc_codec as codec
+
 # 配置日志
 logger = logging.getLogger(__name__)
 
@@ -106,6 +110,9 @@ class AsrRequestHeader:
     def default_header() -> 'AsrRequestHeader':
         return AsrRequestHeader()
 
+# Requests use JSON serialization and gzip, as in AsrRequestHeader.default_header()
+_encoder = codec.FrameEncoder(serialization=SerializationType.JSON, compression=CompressionType.GZIP)
+
 class RequestBuilder:
     @staticmethod
     def new_auth_headers(config: Config) -> Dict[str, str]:
@@ -118,9 +125,6 @@ class RequestBuilder:
 
     @staticmethod
     def new_full_client_request(seq: int) -> bytes:
-        header = AsrRequestHeader.default_header() \
-            .with_message_type_specific_flags(MessageTypeSpecificFlags.POS_SEQUENCE)
-        
         payload = {
             "user": {
                 "uid": "user_1"
@@ -143,46 +147,52 @@ class RequestBuilder:
             }
         }
         
-        payload_bytes = json.dumps(payload).encode('utf-8')
-        compressed_payload = CommonUtils.gzip_compress(payload_bytes)
-        payload_size = len(compressed_payload)
-        
-        request = bytearray()
-        request.extend(header.to_bytes())
-        request.extend(struct.pack('>i', seq))
-        request.extend(struct.pack('>I', payload_size))
-        request.extend(compressed_payload)
-        
-        return bytes(request)
+        return _encoder.encode(MessageType.CLIENT_FULL_REQUEST, payload,
+                               flags=MessageTypeSpecificFlags.POS_SEQUENCE, sequence=seq)
 
     @staticmethod
-    def new_audio_only_request(seq: int, segment: bytes, is_last: bool = False) -> bytes:
-        header = AsrRequestHeader.default_header()
+    def new_audio_only_request(seq: int, segment: bytes, is_last: bool = False,
+                               encoder: Optional[codec.FrameEncoder] = None) -> bytes:
+        """encoder: per-stream encoder carrying the audio compression policy (AsrWsClient.encoder)"""
         if is_last:
-            header.with_message_type_specific_flags(MessageTypeSpecificFlags.NEG_WITH_SEQUENCE)
+            flags = MessageTypeSpecificFlags.NEG_WITH_SEQUENCE
             seq = -seq
         else:
-            header.with_message_type_specific_flags(MessageTypeSpecificFlags.POS_SEQUENCE)
-        header.with_message_type(MessageType.CLIENT_AUDIO_ONLY_REQUEST)
-        
-        request = bytearray()
-        request.extend(header.to_bytes())
-        request.extend(struct.pack('>i', seq))
-        
-        compressed_segment = CommonUtils.gzip_compress(segment)
-        request.extend(struct.pack('>I', len(compressed_segment)))
-        request.extend(compressed_segment)
-        
-        return bytes(request)
+            flags = MessageTypeSpecificFlags.POS_SEQUENCE
+
+        return (encoder or _encoder).encode(MessageType.CLIENT_AUDIO_ONLY_REQUEST, segment, flags=flags, sequence=seq)
 
 class AsrResponse:
-    def __init__(self):
+    def __init__(self, frame: Optional[codec.Frame] = None):
         self.code = 0
         self.event = 0
         self.is_last_package = False
         self.payload_sequence = 0
         self.payload_size = 0
-        self.payload_msg = None
+        self._payload_msg = None
+        self._frame = frame
+        if frame is not None:
+            self.code = frame.error_code or 0
+            self.event = frame.event or 0
+            self.is_last_package = frame.is_last
+            self.payload_sequence = frame.sequence or 0
+            self.payload_size = frame.payload_size
+
+    @property
+    def payload_msg(self) -> Optional[Any]:
+        """Decompressed and JSON-decoded on first access"""
+        frame, self._frame = self._frame, None
+        if frame is not None and frame.payload_size and frame.serialization == SerializationType.JSON:
+            try:
+                self._payload_msg = frame.message
+            except Exception as e:
+                logger.error(f"Failed to parse payload: {e}")
+        return self._payload_msg
+
+    @payload_msg.setter
+    def payload_msg(self, value: Optional[Any]):
+        self._frame = None
+        self._payload_msg = value
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -197,75 +207,41 @@ class AsrResponse:
 class ResponseParser:
     @staticmethod
     def parse_response(msg: bytes) -> AsrResponse:
-        response = AsrResponse()
-        
-        if len(msg) < 4:
-             return response
-
-        header_size = msg[0] & 0x0f
-        message_type = msg[1] >> 4
-        message_type_specific_flags = msg[1] & 0x0f
-        serialization_method = msg[2] >> 4
-        message_compression = msg[2] & 0x0f
-        
-        payload = msg[header_size*4:]
-        
-        if message_type_specific_flags & 0x01:
-            if len(payload) >= 4:
-                response.payload_sequence = struct.unpack('>i', payload[:4])[0]
-                payload = payload[4:]
-        if message_type_specific_flags & 0x02:
-            response.is_last_package = True
-        if message_type_specific_flags & 0x04:
-            if len(payload) >= 4:
-                response.event = struct.unpack('>i', payload[:4])[0]
-                payload = payload[4:]
-            
-        if message_type == MessageType.SERVER_FULL_RESPONSE:
-            if len(payload) >= 4:
-                response.payload_size = struct.unpack('>I', payload[:4])[0]
-                payload = payload[4:]
-        elif message_type == MessageType.SERVER_ERROR_RESPONSE:
-            if len(payload) >= 8:
-                response.code = struct.unpack('>i', payload[:4])[0]
-                response.payload_size = struct.unpack('>I', payload[4:8])[0]
-                payload = payload[8:]
-            
-        if not payload:
-            return response
-            
-        if message_compression == CompressionType.GZIP:
-            try:
-                payload = CommonUtils.gzip_decompress(payload)
-            except Exception as e:
-                logger.error(f"Failed to decompress payload: {e}")
-                return response
-                
         try:
-            if serialization_method == SerializationType.JSON:
-                response.payload_msg = json.loads(payload.decode('utf-8'))
-        except Exception as e:
-            logger.error(f"Failed to parse payload: {e}")
-            
-        return response
+            frame = codec.decode(msg)
+        except codec.FrameError as e:
+            logger.error(f"Failed to parse frame: {e}")
+            return AsrResponse()
+        return AsrResponse(frame)
 
 class AsrWsClient:
-    def __init__(self, url: str, config: Config, segment_duration: int = 200):
+    def __init__(self, url: str, config: Config, segment_duration: int = 200, audio_compression: str = "none",
+                 session: Optional[aiohttp.ClientSession] = None):
         self.seq = 1
         self.url = url
         self.config = config # Store config
         self.segment_duration = segment_duration
+        # PCM barely compresses; audio frames follow audio_compression ("none" / "gzip" / "adaptive")
+        self.encoder = codec.FrameEncoder(
+            serialization=SerializationType.JSON,
+            compression=CompressionType.GZIP,
+            policies={MessageType.CLIENT_AUDIO_ONLY_REQUEST: codec.CompressionPolicy(audio_compression)}
+        )
         self.conn = None
-        self.session = None  # 添加session引用
+        # Shared application session (http_sessions); only a session created here is closed on exit
+        self.session = session
+        self._owns_session = session is None
 
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession()
+            self._owns_session = True
         return self
     
     async def __aexit__(self, exc_type, exc, tb):
         if self.conn and not self.conn.closed:
             await self.conn.close()
-        if self.session and not self.session.closed:
+        if self._owns_session and self.session and not self.session.closed:
             await self.session.close()
         
     async def create_connection(self) -> None:
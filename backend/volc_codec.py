@@ -0,0 +1,324 @@
+"""
+火山引擎二进制协议编解码
+TTS（v1 ws_binary）、流式 ASR（v3 sauc）和实时对话（v3 realtime）共用同一种帧格式：
+
+    4 字节头: 版本(4bit)|头长(4bit), 消息类型(4bit)|标志(4bit), 序列化(4bit)|压缩(4bit), 保留(8bit)
+    [头扩展]          头长 > 1 时，(头长 - 1) * 4 字节
+    [sequence int32]  标志含 0b0001 时
+    [error uint32]    错误帧
+    [event int32]     标志含 0b0100 时，其后（连接级事件除外）是 uint32 长度前缀的 session id / connect id
+    payload uint32 长度 + payload
+
+解码直接在 memoryview 上按偏移读取，不复制；payload 的解压和反序列化在第一次访问时才进行。
+"""
+
+import gzip
+import json
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+# Message types
+FULL_CLIENT_REQUEST = 0b0001
+AUDIO_ONLY_CLIENT = 0b0010
+FULL_SERVER_RESPONSE = 0b1001
+AUDIO_ONLY_SERVER = 0b1011  # 实时对话里也叫 SERVER_ACK
+FRONT_END_RESULT_SERVER = 0b1100
+ERROR = 0b1111
+
+# Message type specific flags
+NO_SEQUENCE = 0b0000
+POS_SEQUENCE = 0b0001
+LAST_NO_SEQUENCE = 0b0010
+NEG_SEQUENCE = 0b0011
+WITH_EVENT = 0b0100
+
+# Serialization
+RAW = 0b0000
+JSON = 0b0001
+THRIFT = 0b0011
+CUSTOM_SERIALIZATION = 0b1111
+
+# Compression
+NO_COMPRESSION = 0b0000
+GZIP = 0b0001
+CUSTOM_COMPRESSION = 0b1111
+
+# 连接级事件不带 session id；服务端的连接事件带的是 connect id
+CONNECTION_EVENTS = frozenset((1, 2))  # StartConnection, FinishConnection
+CONNECT_ID_EVENTS = frozenset((50, 51, 52))  # ConnectionStarted, ConnectionFailed, ConnectionFinished
+
+HEADER = struct.Struct(">BBBB")
+INT32 = struct.Struct(">i")
+UINT32 = struct.Struct(">I")
+
+
+def _layout(has_sequence: bool, has_error: bool, has_event: bool, with_size: bool) -> struct.Struct:
+    return struct.Struct(">BBBB" + ("i" if has_sequence else "") + ("I" if has_error else "")
+                         + ("i" if has_event else "") + ("I" if with_size else ""))
+
+
+# (sequence, error code, event) -> (定长部分 + payload 长度, 仅定长部分)；后者用于中间插入 session id 的帧
+_LAYOUTS = {
+    (seq, err, evt): (_layout(seq, err, evt, True), _layout(seq, err, evt, False))
+    for seq in (False, True) for err in (False, True) for evt in (False, True)
+}
+
+
+class FrameError(ValueError):
+    """帧被截断或格式不合法"""
+
+
+class Frame:
+    """
+    解码后的帧。字段按需读取：raw_payload 是指向原始数据的 memoryview，
+    payload（解压后）和 message（反序列化后）在第一次访问时计算并缓存。
+    """
+
+    __slots__ = ("message_type", "flags", "serialization", "compression", "sequence", "error_code",
+                 "event", "session_id", "connect_id", "raw_payload", "_payload", "_message")
+
+    def __init__(self, message_type: int, flags: int, serialization: int, compression: int):
+        self.message_type = message_type
+        self.flags = flags
+        self.serialization = serialization
+        self.compression = compression
+        self.sequence: Optional[int] = None
+        self.error_code: Optional[int] = None
+        self.event: Optional[int] = None
+        self.session_id: Optional[bytes] = None
+        self.connect_id: Optional[bytes] = None
+        self.raw_payload = memoryview(b"")
+        self._payload: Optional[bytes] = None
+        self._message: Any = None
+
+    @property
+    def is_last(self) -> bool:
+        return bool(self.flags & LAST_NO_SEQUENCE)
+
+    @property
+    def is_error(self) -> bool:
+        return self.message_type == ERROR
+
+    @property
+    def payload_size(self) -> int:
+        return len(self.raw_payload)
+
+    @property
+    def payload(self) -> bytes:
+        """解压后的 payload"""
+        if self._payload is None:
+            if self.compression == GZIP and self.raw_payload:
+                self._payload = gzip.decompress(self.raw_payload)
+            else:
+                self._payload = bytes(self.raw_payload)
+        return self._payload
+
+    @property
+    def message(self) -> Any:
+        """按序列化方式解析后的 payload：JSON -> 对象，RAW -> bytes，其他 -> str"""
+        if self._message is None:
+            if self.serialization == JSON:
+                self._message = json.loads(self.payload) if self.raw_payload else None
+            elif self.serialization == RAW:
+                self._message = self.payload
+            else:
+                self._message = self.payload.decode("utf-8")
+        return self._message
+
+
+def decode(data) -> Frame:
+    """
+    解析一帧（bytes / bytearray / memoryview），不复制 payload
+
+    Raises:
+        FrameError: 帧被截断或头长非法
+    """
+    view = data if isinstance(data, memoryview) else memoryview(data)
+    end = len(view)
+    if end < 4:
+        raise FrameError(f"Frame too short: {end} bytes")
+
+    b0, b1, b2, _ = HEADER.unpack_from(view)
+    offset = (b0 & 0x0f) * 4
+    if offset < 4:
+        raise FrameError(f"Invalid header size: {b0 & 0x0f}")
+    flags = b1 & 0x0f
+    frame = Frame(b1 >> 4, flags, b2 >> 4, b2 & 0x0f)
+
+    try:
+        if flags & POS_SEQUENCE:
+            frame.sequence = INT32.unpack_from(view, offset)[0]
+            offset += 4
+        if frame.message_type == ERROR:
+            frame.error_code = UINT32.unpack_from(view, offset)[0]
+            offset += 4
+        if flags & WITH_EVENT:
+            frame.event = event = INT32.unpack_from(view, offset)[0]
+            offset += 4
+            if event not in CONNECTION_EVENTS:
+                size = UINT32.unpack_from(view, offset)[0]
+                offset += 4
+                if offset + size > end:
+                    raise FrameError("Truncated session id")
+                if event in CONNECT_ID_EVENTS:
+                    frame.connect_id = bytes(view[offset:offset + size])
+                else:
+                    frame.session_id = bytes(view[offset:offset + size])
+                offset += size
+        # 只有头和可选字段、没有 payload 长度的帧（例如不带数据的 ACK）
+        if offset == end:
+            return frame
+        size = UINT32.unpack_from(view, offset)[0]
+    except struct.error:
+        raise FrameError(f"Truncated frame: {end} bytes") from None
+    offset += 4
+    if offset + size > end:
+        raise FrameError(f"Truncated payload: expected {size} bytes, got {end - offset}")
+    frame.raw_payload = view[offset:offset + size]
+    return frame
+
+
+def pack_frame(message_type: int, flags: int, serialization: int, compression: int, payload=b"",
+               sequence: int = 0, error_code: int = 0, event: int = 0, session_id: Optional[bytes] = None) -> bytes:
+    """
+    按标志位写出一帧，payload 原样写入（不做序列化/压缩）
+
+    定长部分用一次预编译的 struct.pack 写出，payload 只拷贝一次
+    """
+    has_sequence = bool(flags & POS_SEQUENCE)
+    has_error = message_type == ERROR
+    has_event = bool(flags & WITH_EVENT)
+    sized, unsized = _LAYOUTS[(has_sequence, has_error, has_event)]
+
+    fields = [(1 << 4) | 1, (message_type << 4) | flags, (serialization << 4) | compression, 0]
+    if has_sequence:
+        fields.append(sequence)
+    if has_error:
+        fields.append(error_code)
+    if has_event:
+        fields.append(event)
+
+    if session_id is None or not has_event:
+        return sized.pack(*fields, len(payload)) + payload
+    return b"".join((unsized.pack(*fields), UINT32.pack(len(session_id)), session_id,
+                     UINT32.pack(len(payload)), payload))
+
+
+class CompressionPolicy:
+    """
+    单条流的 payload 压缩策略，决定是否压缩以及头部的压缩位
+
+    - "none": 不压缩（PCM 这类噪声大的数据 gzip 几乎压不动，白白耗 CPU）
+    - "gzip": 用 level 级 gzip 压缩每一帧
+    - "adaptive": 试压一帧，压缩率（压缩后/原始）不高于 min_ratio 就继续压缩；
+      否则原样发送，probe_interval 帧之后再试压一次
+
+    有状态（adaptive 的测量结果），每条流应使用单独的实例。
+
+    Args:
+        mode: "none" / "gzip" / "adaptive"
+        level: gzip 压缩级别
+        min_ratio: adaptive 模式下值得压缩的最高压缩率
+        probe_interval: adaptive 模式下不压缩时，隔多少帧重新试压
+    """
+
+    MODES = ("none", "gzip", "adaptive")
+
+    def __init__(self, mode: str = "none", level: int = 1, min_ratio: float = 0.9, probe_interval: int = 50):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown compression mode: {mode}, expected one of {self.MODES}")
+        self.mode = mode
+        self.level = level
+        self.min_ratio = min_ratio
+        self.probe_interval = probe_interval
+        self.last_ratio: Optional[float] = None
+        self._skip = 0
+
+        self.frames = 0
+        self.compressed_frames = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def apply(self, payload) -> Tuple[Any, int]:
+        """返回 (要发送的 payload, 压缩位)"""
+        self.frames += 1
+        self.bytes_in += len(payload)
+        if self.mode == "none" or not payload:
+            result = payload, NO_COMPRESSION
+        elif self.mode == "gzip":
+            result = gzip.compress(payload, compresslevel=self.level), GZIP
+        elif self._skip:
+            self._skip -= 1
+            result = payload, NO_COMPRESSION
+        else:
+            compressed = gzip.compress(payload, compresslevel=self.level)
+            self.last_ratio = len(compressed) / len(payload)
+            if self.last_ratio <= self.min_ratio:
+                result = compressed, GZIP
+            else:
+                self._skip = self.probe_interval
+                result = payload, NO_COMPRESSION
+        if result[1] == GZIP:
+            self.compressed_frames += 1
+        self.bytes_out += len(result[0])
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "frames": self.frames,
+            "compressed_frames": self.compressed_frames,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "last_ratio": round(self.last_ratio, 3) if self.last_ratio is not None else None,
+        }
+
+
+class FrameEncoder:
+    """
+    客户端请求帧编码器：按序列化方式编码 payload（dict/list -> JSON），按压缩方式压缩，
+    带事件的帧自动附上 session id（连接级事件除外）。
+
+    Args:
+        session_id: 实时对话的会话 ID，可随时重新赋值
+        serialization: 默认序列化方式
+        compression: 默认压缩方式
+        policies: 消息类型 -> CompressionPolicy；未显式指定 compression 时按该策略压缩
+    """
+
+    def __init__(self, session_id: Optional[str] = None, serialization: int = JSON, compression: int = GZIP,
+                 policies: Optional[Dict[int, CompressionPolicy]] = None):
+        self.serialization = serialization
+        self.compression = compression
+        self.policies = policies or {}
+        self.session_id = session_id
+
+    @property
+    def session_id(self) -> Optional[str]:
+        return self._session_id
+
+    @session_id.setter
+    def session_id(self, value: Optional[str]):
+        self._session_id = value
+        self._session_bytes = value.encode("utf-8") if value is not None else None
+
+    def encode(self, message_type: int, payload: Any = b"", flags: int = NO_SEQUENCE, sequence: int = 0,
+               event: int = 0, serialization: Optional[int] = None, compression: Optional[int] = None) -> bytes:
+        serialization = self.serialization if serialization is None else serialization
+
+        if not isinstance(payload, (bytes, bytearray, memoryview)):
+            payload = json.dumps(payload).encode("utf-8")
+        policy = self.policies.get(message_type) if compression is None else None
+        if policy is not None:
+            payload, compression = policy.apply(payload)
+        else:
+            compression = self.compression if compression is None else compression
+            if compression == GZIP:
+                payload = gzip.compress(payload)
+
+        session_id = None
+        if flags & WITH_EVENT and event not in CONNECTION_EVENTS:
+            # 会话级事件总要写 session id 字段（没有时写空串），否则解码端会把 payload 长度当成它
+            session_id = self._session_bytes or b""
+        return pack_frame(message_type, flags, serialization, compression, payload,
+                          sequence=sequence, event=event, session_id=session_id)
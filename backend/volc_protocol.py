@@ -1,11 +1,14 @@
-import io
 import logging
-import struct
 from dataclasses import dataclass
 from enum import IntEnum
-from typing import Callable, List, Optional
+from typing import Optional, Union
 import websockets
 
+try:
+    from backend.volc_codec import decode, pack_frame
+except ImportError:
+    from volc_codec import decode, pack_frame
+
 logger = logging.getLogger(__name__)
 
 class MsgType(IntEnum):
@@ -33,6 +36,9 @@ class MsgTypeFlagBits(IntEnum):
     NegativeSeq = 0b11  # Last packet with sequence < 0
     WithEvent = 0b100  # Payload contains event number (int32)
 
+_MSG_TYPES = {m.value: m for m in MsgType}
+_FLAGS = {f.value: f for f in MsgTypeFlagBits}
+
 
 class VersionBits(IntEnum):
     """Version bits"""
@@ -71,7 +77,7 @@ class Message:
 
     sequence: int = 0
     error_code: int = 0
-    payload: bytes = b""
+    payload: Union[bytes, memoryview] = b""
 
     @classmethod
     def from_bytes(cls, data: bytes) -> "Message":
@@ -79,118 +85,36 @@ class Message:
         if len(data) < 4: # Header is 4 bytes
             raise ValueError(f"Data too short: expected at least 4 bytes, got {len(data)}")
 
-        # Byte 0: Version (4) + Header Size (4)
-        b0 = data[0]
         # Byte 1: Msg Type (4) + Flags (4)
         b1 = data[1]
-        # Byte 2: Serialization (4) + Compression (4)
-        b2 = data[2]
-        # Byte 3: Reserved (8)
-        
-        msg_type = MsgType(b1 >> 4)
-        flag = MsgTypeFlagBits(b1 & 0b00001111)
-        
+        # Table lookups instead of enum construction; unknown values still raise ValueError
+        msg_type = _MSG_TYPES.get(b1 >> 4)
+        if msg_type is None:
+            msg_type = MsgType(b1 >> 4)
+        flag = _FLAGS.get(b1 & 0b00001111)
+        if flag is None:
+            flag = MsgTypeFlagBits(b1 & 0b00001111)
+
         msg = cls(type=msg_type, flag=flag)
         msg.unmarshal(data)
         return msg
 
     def marshal(self) -> bytes:
         """Serialize message to bytes"""
-        buffer = io.BytesIO()
-
-        # Write header (4 bytes)
-        # Byte 0
-        buffer.write(struct.pack("B", (self.version << 4) | self.header_size))
-        # Byte 1
-        buffer.write(struct.pack("B", (self.type << 4) | self.flag))
-        # Byte 2
-        buffer.write(struct.pack("B", (self.serialization << 4) | self.compression))
-        # Byte 3 (Reserved)
-        buffer.write(b"\x00")
-
-        # Write other fields based on type/flag
-        writers = self._get_writers()
-        for writer in writers:
-            writer(buffer)
-
-        return buffer.getvalue()
+        return pack_frame(self.type, self.flag, self.serialization, self.compression, self.payload,
+                          sequence=self.sequence, error_code=self.error_code)
 
     def unmarshal(self, data: bytes) -> None:
-        """Deserialize message from bytes"""
-        buffer = io.BytesIO(data)
-        
-        # Skip header (4 bytes) already parsed partially in from_bytes
-        buffer.read(4)
-
-        # Read other fields
-        readers = self._get_readers()
-        for reader in readers:
-            reader(buffer)
-
-        # Check for remaining data?
-        # In this simplified implementation we just read what we expect.
-
-    def _get_writers(self) -> List[Callable[[io.BytesIO], None]]:
-        """Get list of writer functions"""
-        writers = []
-
-        if self.type in [
-            MsgType.FullClientRequest,
-            MsgType.FullServerResponse,
-            MsgType.FrontEndResultServer,
-            MsgType.AudioOnlyClient,
-            MsgType.AudioOnlyServer,
-        ]:
-            if self.flag in [MsgTypeFlagBits.PositiveSeq, MsgTypeFlagBits.NegativeSeq]:
-                writers.append(self._write_sequence)
-        elif self.type == MsgType.Error:
-            writers.append(self._write_error_code)
-
-        writers.append(self._write_payload)
-        return writers
-
-    def _get_readers(self) -> List[Callable[[io.BytesIO], None]]:
-        """Get list of reader functions"""
-        readers = []
-
-        if self.type in [
-            MsgType.FullClientRequest,
-            MsgType.FullServerResponse,
-            MsgType.FrontEndResultServer,
-            MsgType.AudioOnlyClient,
-            MsgType.AudioOnlyServer,
-        ]:
-            if self.flag in [MsgTypeFlagBits.PositiveSeq, MsgTypeFlagBits.NegativeSeq]:
-                readers.append(self._read_sequence)
-        elif self.type == MsgType.Error:
-            readers.append(self._read_error_code)
-
-        readers.append(self._read_payload)
-        return readers
-
-    def _write_sequence(self, buffer: io.BytesIO) -> None:
-        buffer.write(struct.pack(">i", self.sequence))
-
-    def _write_error_code(self, buffer: io.BytesIO) -> None:
-        buffer.write(struct.pack(">I", self.error_code))
-
-    def _write_payload(self, buffer: io.BytesIO) -> None:
-        size = len(self.payload)
-        buffer.write(struct.pack(">I", size))
-        buffer.write(self.payload)
-
-    def _read_sequence(self, buffer: io.BytesIO) -> None:
-        self.sequence = struct.unpack(">i", buffer.read(4))[0]
-
-    def _read_error_code(self, buffer: io.BytesIO) -> None:
-        self.error_code = struct.unpack(">I", buffer.read(4))[0]
-
-    def _read_payload(self, buffer: io.BytesIO) -> None:
-        size_bytes = buffer.read(4)
-        if size_bytes:
-            size = struct.unpack(">I", size_bytes)[0]
-            if size > 0:
-                self.payload = buffer.read(size)
+        """Deserialize message from bytes (framing is handled by volc_codec)"""
+        frame = decode(data)
+        if frame.sequence is not None:
+            self.sequence = frame.sequence
+        if frame.error_code is not None:
+            self.error_code = frame.error_code
+        # A view into immutable bytes is safe to keep; only copy out of a mutable buffer
+        # (bytearray, reused receive buffer) that the caller may overwrite
+        raw = frame.raw_payload
+        self.payload = raw if raw.readonly else bytes(raw)
 
 
 async def receive_message(websocket: websockets.WebSocketClientProtocol) -> Message:
@@ -1,19 +1,21 @@
-import gzip
-import json
 import uuid
 import websockets
 import asyncio
-from typing import Dict, Any, Optional
+import time
+from typing import Callable, Dict, Any, List, Optional, Tuple
 import logging
 import copy
 
 try:
     import backend.volc_realtime_protocol as protocol
+    import backend.volc_codec as codec
 except ImportError:
     try:
         import volc_realtime_protocol as protocol
+        import volc_codec as codec
     except ImportError:
         from backend import volc_realtime_protocol as protocol
+        from backend import volc_codec as codec
 
 logger = logging.getLogger(__name__)
 
@@ -54,16 +56,23 @@ class RealtimeDialogClient:
                  access_token: str, 
                  resource_id: str = "volc.speech.dialog",
                  base_url: str = "wss://openspeech.bytedance.com/api/v3/realtime/dialogue",
-                 session_id: str = None):
+                 session_id: str = None,
+                 audio_compression: str = "none"):
         
         self.app_id = app_id
         self.access_token = access_token
         self.resource_id = resource_id
         self.base_url = base_url
         self.session_id = session_id or str(uuid.uuid4())
+        # Control messages stay gzip'd JSON; PCM frames follow audio_compression ("none" / "gzip" / "adaptive")
+        self.encoder = codec.FrameEncoder(
+            session_id=self.session_id,
+            policies={codec.AUDIO_ONLY_CLIENT: codec.CompressionPolicy(audio_compression)}
+        )
         self.ws = None
         self.logid = ""
         self.seq = 1
+        self.session_started = False
         
     async def __aenter__(self):
         # Default connect without voice override if used in context manager directly
@@ -74,6 +83,15 @@ class RealtimeDialogClient:
         await self.close()
 
     async def connect(self, voice: str = None, system_prompt: str = None, speaking_style: str = None):
+        await self.open()
+        await self.start_session(voice=voice, system_prompt=system_prompt, speaking_style=speaking_style)
+
+    @property
+    def is_open(self) -> bool:
+        return self.ws is not None and self.ws.close_code is None
+
+    async def open(self):
+        """TLS + WebSocket 握手并完成 StartConnection；之后随时可以 start_session"""
         headers = {
             "X-Api-App-ID": self.app_id,
             "X-Api-Access-Key": self.access_token,
@@ -107,11 +125,7 @@ class RealtimeDialogClient:
         
         # 1. Send StartConnection
         try:
-            req = bytearray(protocol.generate_header())
-            req.extend(int(1).to_bytes(4, 'big')) # Seq 1
-            payload = gzip.compress("{}".encode('utf-8'))
-            req.extend(len(payload).to_bytes(4, 'big'))
-            req.extend(payload)
+            req = self.encoder.encode(codec.FULL_CLIENT_REQUEST, {}, flags=codec.WITH_EVENT, event=1) # StartConnection
             
             await self.ws.send(req)
             resp = await self.ws.recv()
@@ -119,13 +133,19 @@ class RealtimeDialogClient:
             logger.info(f"StartConnection Response: {parsed}")
             
             if parsed.get('code') and parsed.get('code') != 0:
-                logger.error(f"StartConnection Failed with code: {parsed.get('code')}")
-                # Don't raise immediately, let's see if we can continue or if it's fatal
-                # Usually fatal.
+                # 服务端拒绝建连（鉴权失败、限流等），这条连接不可用，交给调用方处理（预连接池会退避重试）
+                raise Exception(f"StartConnection failed with code {parsed.get('code')}: {parsed.get('payload_msg')}")
         except Exception as e:
             logger.error(f"StartConnection Error: {e}")
             raise e
-        
+
+    async def start_session(self, voice: str = None, system_prompt: str = None, speaking_style: str = None,
+                            session_id: str = None):
+        """在已 open 的连接上发送 StartSession；session_id 为空时沿用构造时生成的"""
+        if session_id:
+            self.session_id = session_id
+            self.encoder.session_id = session_id
+
         # 2. Send StartSession
         try:
             session_config = copy.deepcopy(DEFAULT_START_SESSION_REQ)
@@ -144,17 +164,8 @@ class RealtimeDialogClient:
                 logger.info(f"Setting speaking_style to: {speaking_style}")
                 session_config["dialog"]["speaking_style"] = speaking_style
 
-            payload_json = json.dumps(session_config)
-            payload_bytes = gzip.compress(payload_json.encode('utf-8'))
-            
-            req = bytearray(protocol.generate_header())
-            req.extend(int(100).to_bytes(4, 'big')) # Seq 100
-            
-            req.extend(len(self.session_id).to_bytes(4, 'big'))
-            req.extend(self.session_id.encode('utf-8'))
-            
-            req.extend(len(payload_bytes).to_bytes(4, 'big'))
-            req.extend(payload_bytes)
+            req = self.encoder.encode(codec.FULL_CLIENT_REQUEST, session_config,
+                                      flags=codec.WITH_EVENT, event=100) # StartSession
             
             await self.ws.send(req)
             resp = await self.ws.recv()
@@ -163,6 +174,7 @@ class RealtimeDialogClient:
             
             if parsed.get('code') and parsed.get('code') != 0:
                 logger.error(f"StartSession Failed: {parsed}")
+            self.session_started = True
         except Exception as e:
             logger.error(f"StartSession Error: {e}")
             raise e
@@ -173,19 +185,13 @@ class RealtimeDialogClient:
             
         # Ref code: task_request
         # message_type=CLIENT_AUDIO_ONLY_REQUEST, serial_method=NO_SERIALIZATION
-        req = bytearray(protocol.generate_header(
-            message_type=protocol.CLIENT_AUDIO_ONLY_REQUEST,
-            serial_method=protocol.NO_SERIALIZATION
-        ))
-        
-        req.extend(int(200).to_bytes(4, 'big')) # Using 200 as per ref code
-        
-        req.extend(len(self.session_id).to_bytes(4, 'big'))
-        req.extend(self.session_id.encode('utf-8'))
-        
-        payload_bytes = gzip.compress(audio_data)
-        req.extend(len(payload_bytes).to_bytes(4, 'big'))
-        req.extend(payload_bytes)
+        req = self.encoder.encode(
+            codec.AUDIO_ONLY_CLIENT,
+            audio_data,
+            flags=codec.WITH_EVENT,
+            event=200, # TaskRequest
+            serialization=codec.RAW
+        )
         
         await self.ws.send(req)
         
@@ -198,18 +204,130 @@ class RealtimeDialogClient:
         return protocol.parse_response(msg_data)
         
     async def close(self):
-        if self.ws:
+        if self.ws and self.session_started:
             # Finish Session
             try:
-                finish_req = bytearray(protocol.generate_header())
-                finish_req.extend(int(102).to_bytes(4, 'big'))
-                payload = gzip.compress("{}".encode('utf-8'))
-                finish_req.extend(len(self.session_id).to_bytes(4, 'big'))
-                finish_req.extend(self.session_id.encode('utf-8'))
-                finish_req.extend(len(payload).to_bytes(4, 'big'))
-                finish_req.extend(payload)
+                finish_req = self.encoder.encode(codec.FULL_CLIENT_REQUEST, {},
+                                                 flags=codec.WITH_EVENT, event=102) # FinishSession
                 await self.ws.send(finish_req)
             except:
                 pass
-                
+
+        if self.ws:
             await self.ws.close()
+
+
+class RealtimeSessionPool:
+    """
+    Pre-connected realtime dialog sockets that already finished StartConnection.
+
+    A call claims one and only has to send StartSession, skipping the TLS,
+    WebSocket and StartConnection round-trips. Every claimed socket is used for
+    exactly one session (it is closed with the call); a background task refills
+    the pool up to ``size`` and recycles sockets idle for more than
+    ``idle_timeout`` seconds, before the server drops them. When the pool is
+    empty, or a warm socket turns out to be dead, the call connects cold.
+    """
+
+    def __init__(self, factory: Callable[[], RealtimeDialogClient], size: int = 1, idle_timeout: float = 20.0,
+                 retry_delay: float = 1.0, max_retry_delay: float = 60.0):
+        self.factory = factory
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._idle: List[Tuple[RealtimeDialogClient, float]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"opened": 0, "warm_claims": 0, "cold_claims": 0, "expired": 0, "failures": 0}
+
+    def start(self):
+        if self.size > 0 and self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def claim(self, voice: str = None, system_prompt: str = None,
+                    speaking_style: str = None) -> RealtimeDialogClient:
+        """取一个预连接的客户端并开始会话；失败的预连接直接丢弃，最后退回冷启动"""
+        while self._idle:
+            client, _ = self._idle.pop(0)  # oldest first, so none sits until it expires
+            self._wakeup.set()
+            if not client.is_open:
+                self.stats["expired"] += 1
+                await self._close(client)
+                continue
+            try:
+                await client.start_session(voice=voice, system_prompt=system_prompt, speaking_style=speaking_style)
+                self.stats["warm_claims"] += 1
+                return client
+            except Exception as e:
+                logger.warning(f"Warm realtime connection failed, discarding: {e}")
+                self.stats["failures"] += 1
+                await self._close(client)
+
+        self.stats["cold_claims"] += 1
+        self._wakeup.set()
+        client = self.factory()
+        try:
+            await client.connect(voice=voice, system_prompt=system_prompt, speaking_style=speaking_style)
+        except BaseException:
+            await self._close(client)
+            raise
+        return client
+
+    async def _run(self):
+        delay = self.retry_delay
+        while True:
+            # 先同步地把过期连接摘出来再关闭，避免和 claim 同时改列表
+            now = time.monotonic()
+            expired = [entry for entry in self._idle
+                       if now - entry[1] > self.idle_timeout or not entry[0].is_open]
+            self._idle = [entry for entry in self._idle if entry not in expired]
+            for client, _ in expired:
+                self.stats["expired"] += 1
+                await self._close(client)
+
+            if len(self._idle) < self.size:
+                client = self.factory()
+                try:
+                    await client.open()
+                except Exception as e:
+                    self.stats["failures"] += 1
+                    logger.warning(f"Realtime pre-connect failed, retrying in {delay:.0f}s: {e}")
+                    await self._close(client)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_retry_delay)
+                    continue
+                self._idle.append((client, time.monotonic()))
+                self.stats["opened"] += 1
+                delay = self.retry_delay
+                continue
+
+            # 睡到最早的连接过期，或者有连接被取走
+            self._wakeup.clear()
+            oldest = min(opened_at for _, opened_at in self._idle) if self._idle else now
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.1, oldest + self.idle_timeout - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+
+    @staticmethod
+    async def _close(client: RealtimeDialogClient):
+        try:
+            await client.close()
+        except Exception:
+            pass
+
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        idle, self._idle = self._idle, []
+        for client, _ in idle:
+            await self._close(client)
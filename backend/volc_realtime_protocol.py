@@ -1,5 +1,7 @@
-import gzip
-import json
+try:
+    import backend.volc_codec as codec
+except ImportError:
+    import volc_codec as codec
 
 PROTOCOL_VERSION = 0b0001
 DEFAULT_HEADER_SIZE = 0b0001
@@ -56,12 +58,13 @@ def generate_header(
     reserved （8bits) 保留字段
     header_extensions 扩展头(大小等于 8 * 4 * (header_size - 1) )
     """
-    header = bytearray()
     header_size = int(len(extension_header) / 4) + 1
-    header.append((version << 4) | header_size)
-    header.append((message_type << 4) | message_type_specific_flags)
-    header.append((serial_method << 4) | compression_type)
-    header.append(reserved_data)
+    header = bytearray(codec.HEADER.pack(
+        (version << 4) | header_size,
+        (message_type << 4) | message_type_specific_flags,
+        (serial_method << 4) | compression_type,
+        reserved_data,
+    ))
     header.extend(extension_header)
     return header
 
@@ -87,68 +90,37 @@ def parse_response(res):
     """
     if isinstance(res, str):
         return {}
-    if len(res) < 4:
+    try:
+        frame = codec.decode(res)
+    except codec.FrameError as e:
+        print(f"Error parsing frame: {e}")
         return {}
-        
-    protocol_version = res[0] >> 4
-    header_size = res[0] & 0x0f
-    message_type = res[1] >> 4
-    message_type_specific_flags = res[1] & 0x0f
-    serialization_method = res[2] >> 4
-    message_compression = res[2] & 0x0f
-    reserved = res[3]
-    header_extensions = res[4:header_size * 4]
-    payload = res[header_size * 4:]
+
     result = {}
-    payload_msg = None
-    payload_size = 0
-    start = 0
-    if message_type == SERVER_FULL_RESPONSE or message_type == SERVER_ACK:
+    if frame.message_type == SERVER_FULL_RESPONSE or frame.message_type == SERVER_ACK:
         result['message_type'] = 'SERVER_FULL_RESPONSE'
-        if message_type == SERVER_ACK:
+        if frame.message_type == SERVER_ACK:
             result['message_type'] = 'SERVER_ACK'
-        if message_type_specific_flags & NEG_SEQUENCE > 0:
-            if len(payload) >= 4:
-                result['seq'] = int.from_bytes(payload[:4], "big", signed=False)
-                start += 4
-        if message_type_specific_flags & MSG_WITH_EVENT > 0:
-            if len(payload) >= start + 4:
-                result['event'] = int.from_bytes(payload[start:start+4], "big", signed=False)
-                start += 4
-        payload = payload[start:]
-        
-        if len(payload) >= 4:
-            session_id_size = int.from_bytes(payload[:4], "big", signed=True)
-            if len(payload) >= 4 + session_id_size:
-                session_id = payload[4:session_id_size+4]
-                result['session_id'] = str(session_id)
-                payload = payload[4 + session_id_size:]
-                
-                if len(payload) >= 4:
-                    payload_size = int.from_bytes(payload[:4], "big", signed=False)
-                    payload_msg = payload[4:]
-    elif message_type == SERVER_ERROR_RESPONSE:
-        if len(payload) >= 4:
-            code = int.from_bytes(payload[:4], "big", signed=False)
-            result['code'] = code
-            if len(payload) >= 8:
-                payload_size = int.from_bytes(payload[4:8], "big", signed=False)
-                payload_msg = payload[8:]
-    
-    if payload_msg is None:
+        if frame.sequence is not None:
+            result['seq'] = frame.sequence
+        if frame.event is not None:
+            result['event'] = frame.event
+        if frame.session_id is not None:
+            result['session_id'] = frame.session_id.decode('utf-8', 'replace')
+        if frame.connect_id is not None:
+            result['connect_id'] = frame.connect_id.decode('utf-8', 'replace')
+    elif frame.is_error:
+        result['code'] = frame.error_code
+    else:
         return result
-        
+
+    # Decompression and JSON decoding happen here, on first access to the payload
     try:
-        if message_compression == GZIP:
-            payload_msg = gzip.decompress(payload_msg)
-        if serialization_method == JSON:
-            payload_msg = json.loads(str(payload_msg, "utf-8"))
-        elif serialization_method != NO_SERIALIZATION:
-            payload_msg = str(payload_msg, "utf-8")
+        payload_msg = frame.message
     except Exception as e:
         print(f"Error parsing payload: {e}")
-        pass
-        
+        payload_msg = bytes(frame.raw_payload)
+
     result['payload_msg'] = payload_msg
-    result['payload_size'] = payload_size
+    result['payload_size'] = frame.payload_size
     return result
@@ -2,93 +2,239 @@ import json
 import uuid
 import base64
 import os
+import time
 import websockets
 import asyncio
-from volc_protocol import full_client_request, receive_message, MsgType
+from contextlib import asynccontextmanager
+from volc_protocol import full_client_request
+import volc_codec as codec
 
 
 VOLC_APPID = os.environ.get("VOLC_TTS_APPID", "YOUR_TTS_APPID")
 VOLC_TOKEN = os.environ.get("VOLC_TTS_TOKEN", "YOUR_TTS_TOKEN")
 
+VOLC_TTS_ENDPOINT = "wss://openspeech.bytedance.com/api/v1/tts/ws_binary"
 
 VOLC_CLUSTER = "volcano_tts"
 
 def get_cluster(voice: str) -> str:
     if voice.startswith("S_"):
          return "volcano_icl"
-    
+
     return "volcano_tts"
 
-async def generate_volc_tts_ws(text: str, output_path: str, voice: str = "zh_female_meilinvyou_moon_bigtts", app_id=None, token=None, cluster=None):
+
+def _is_open(websocket) -> bool:
+    return websocket.close_code is None
+
+
+class _PooledConnection:
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+
+
+class TTSConnectionPool:
     """
-    Generate audio using Volcengine WebSocket API (Binary Protocol)
+    Warm, authenticated TTS WebSocket connections keyed by (appid, cluster).
+
+    A connection is handed to one request at a time and returned afterwards, so
+    sequential requests skip the TLS and WebSocket handshakes. Idle connections
+    are dropped after ``idle_timeout`` seconds or once they reach ``max_age``; a
+    connection idle for more than ``ping_after`` seconds is pinged before reuse.
+    Connections that saw an error are never returned to the pool.
+    """
+
+    def __init__(self, endpoint: str = VOLC_TTS_ENDPOINT, max_idle: int = 4, idle_timeout: float = 50.0,
+                 max_age: float = 600.0, ping_after: float = 10.0, ping_timeout: float = 2.0):
+        self.endpoint = endpoint
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self.ping_after = ping_after
+        self.ping_timeout = ping_timeout
+        self._idle = {}
+        self.stats = {"connects": 0, "reuses": 0, "discarded": 0}
+
+    @asynccontextmanager
+    async def acquire(self, app_id: str, token: str, cluster: str):
+        """Yield ``(websocket, reused)``; the socket goes back to the pool only if the block succeeds."""
+        key = (app_id, cluster, token)
+        conn = await self._take_idle(key)
+        reused = conn is not None
+        if conn is None:
+            headers = {"Authorization": f"Bearer;{token}"}
+            # websockets >= 10.0 uses additional_headers
+            websocket = await websockets.connect(self.endpoint, additional_headers=headers)
+            conn = _PooledConnection(websocket)
+            self.stats["connects"] += 1
+        else:
+            self.stats["reuses"] += 1
+
+        try:
+            yield conn.websocket, reused
+        except BaseException:
+            self.stats["discarded"] += 1
+            await self._close(conn)
+            raise
+        conn.uses += 1
+        conn.last_used = time.monotonic()
+        self._put_idle(key, conn)
+
+    async def _take_idle(self, key):
+        idle = self._idle.get(key, [])
+        while idle:
+            conn = idle.pop()  # most recently used first
+            now = time.monotonic()
+            if (not _is_open(conn.websocket) or now - conn.last_used > self.idle_timeout
+                    or now - conn.created_at > self.max_age):
+                self.stats["discarded"] += 1
+                await self._close(conn)
+                continue
+            if now - conn.last_used > self.ping_after and not await self._ping(conn):
+                self.stats["discarded"] += 1
+                await self._close(conn)
+                continue
+            return conn
+        return None
+
+    def _put_idle(self, key, conn):
+        if not _is_open(conn.websocket):
+            return
+        idle = self._idle.setdefault(key, [])
+        idle.append(conn)
+        while len(idle) > self.max_idle:
+            asyncio.ensure_future(self._close(idle.pop(0)))
+
+    async def _ping(self, conn) -> bool:
+        try:
+            pong = await conn.websocket.ping()
+            await asyncio.wait_for(pong, self.ping_timeout)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    async def _close(conn):
+        try:
+            await conn.websocket.close()
+        except Exception:
+            pass
+
+    def idle_count(self) -> int:
+        return sum(len(v) for v in self._idle.values())
+
+    async def close(self):
+        idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                await self._close(conn)
+
+
+# Shared by all /tts requests of this process
+tts_pool = TTSConnectionPool()
+
+
+def build_tts_request(text: str, voice: str, app_id: str, token: str, cluster: str) -> dict:
+    return {
+        "app": {
+            "appid": app_id,
+            "token": token,
+            "cluster": cluster
+        },
+        "user": {
+            "uid": str(uuid.uuid4())
+        },
+        "audio": {
+            "voice_type": voice,
+            "encoding": "mp3",
+            "speed_ratio": 1.0,
+            "volume_ratio": 1.0,
+            "pitch_ratio": 1.0,
+        },
+        "request": {
+            "reqid": str(uuid.uuid4()),
+            "text": text,
+            "text_type": "plain",
+            "operation": "submit",
+            "with_timestamp": 0
+        }
+    }
+
+
+async def _receive_audio(websocket, request_json: dict):
+    # Send request
+    await full_client_request(websocket, json.dumps(request_json).encode('utf-8'))
+
+    # Receive audio, yielding each AudioOnlyServer payload as it arrives
+    while True:
+        data = await websocket.recv()
+        if not isinstance(data, bytes):
+            raise ValueError(f"Unexpected message type: {type(data)}")
+        frame = codec.decode(data)
+
+        if frame.message_type == codec.FRONT_END_RESULT_SERVER:
+            continue
+        elif frame.message_type == codec.AUDIO_ONLY_SERVER:
+            if frame.payload_size:
+                yield frame.payload
+            if frame.is_last: # Last message
+                break
+        elif frame.is_error:
+            raise Exception(f"Volc Error: {frame.error_code} - {frame.payload.decode('utf-8', 'ignore')}")
+        else:
+             # For debug
+             print(f"Received other msg type: {frame.message_type}")
+
+
+async def stream_volc_tts(text: str, voice: str = "zh_female_meilinvyou_moon_bigtts", app_id=None, token=None, cluster=None, pool: TTSConnectionPool = None):
     """
-    endpoint = "wss://openspeech.bytedance.com/api/v1/tts/ws_binary"
-    
+    Stream MP3 chunks from the Volcengine WebSocket API (Binary Protocol) as they arrive.
+
+    Connections come from ``pool`` (the shared ``tts_pool`` by default). A pooled
+    connection the server has silently dropped is retried once on a fresh one, as
+    long as nothing has been yielded yet.
+    """
+    pool = pool or tts_pool
     current_appid = app_id if app_id else VOLC_APPID
     current_token = token if token else VOLC_TOKEN
     current_cluster = cluster if cluster else get_cluster(voice)
-    
-    headers = {"Authorization": f"Bearer;{current_token}"}
-    
+
     print(f"[VolcTTS] Requesting voice: {voice} on cluster: {current_cluster}") # Debug log
-    
+
+    request_json = build_tts_request(text, voice, current_appid, current_token, current_cluster)
+    received = 0
+    for attempt in range(2):
+        try:
+            async with pool.acquire(current_appid, current_token, current_cluster) as (websocket, reused):
+                async for chunk in _receive_audio(websocket, request_json):
+                    received += len(chunk)
+                    yield chunk
+            break
+        except websockets.ConnectionClosed:
+            if not reused or attempt or received:
+                raise
+            print("[VolcTTS] Pooled connection was closed, reconnecting")
+
+    if not received:
+        raise Exception("No audio data received")
+
+
+async def generate_volc_tts_ws(text: str, output_path: str, voice: str = "zh_female_meilinvyou_moon_bigtts", app_id=None, token=None, cluster=None, pool: TTSConnectionPool = None):
+    """
+    Generate audio using Volcengine WebSocket API (Binary Protocol)
+    """
     try:
-        # websockets >= 10.0 uses additional_headers
-        async with websockets.connect(endpoint, additional_headers=headers) as websocket:
-            request_json = {
-                "app": {
-                    "appid": current_appid,
-                    "token": current_token,
-                    "cluster": current_cluster
-                },
-                "user": {
-                    "uid": str(uuid.uuid4())
-                },
-                "audio": {
-                    "voice_type": voice,
-                    "encoding": "mp3",
-                    "speed_ratio": 1.0,
-                    "volume_ratio": 1.0,
-                    "pitch_ratio": 1.0,
-                },
-                "request": {
-                    "reqid": str(uuid.uuid4()),
-                    "text": text,
-                    "text_type": "plain",
-                    "operation": "submit",
-                    "with_timestamp": 0
-                }
-            }
-            
-            # Send request
-            await full_client_request(websocket, json.dumps(request_json).encode('utf-8'))
-            
-            # Receive audio
-            audio_data = bytearray()
-            while True:
-                msg = await receive_message(websocket)
-                
-                if msg.type == MsgType.FrontEndResultServer:
-                    continue
-                elif msg.type == MsgType.AudioOnlyServer:
-                    audio_data.extend(msg.payload)
-                    if msg.sequence < 0: # Last message
-                        break
-                elif msg.type == MsgType.Error:
-                    raise Exception(f"Volc Error: {msg.error_code} - {msg.payload.decode('utf-8', 'ignore')}")
-                else:
-                     # For debug
-                     print(f"Received other msg type: {msg.type}")
- 
-                 
-            if not audio_data:
-                raise Exception("No audio data received")
-                
-            with open(output_path, "wb") as f:
-                f.write(audio_data)
-                
-            return True
+        audio_data = bytearray()
+        async for chunk in stream_volc_tts(text, voice, app_id, token, cluster, pool):
+            audio_data.extend(chunk)
+
+        with open(output_path, "wb") as f:
+            f.write(audio_data)
+
+        return True
 
     except Exception as e:
         print(f"Volc TTS WS Failed: {e}")
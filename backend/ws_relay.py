@@ -0,0 +1,181 @@
+"""
+WebSocket 桥接的单向中继
+接收协程只把数据放进有界队列（不等待对端），由独立的发送协程写出，
+慢的一端不会再卡住另一端的接收：
+- 积压的音频超过 max_audio_ms 时丢弃最旧的音频（过时的语音播出去也没有意义），控制消息不丢；
+- 队列里相邻的音频合并成一次发送（不超过 max_batch_ms），减少小包；
+- clear_audio() 丢弃尚未发出的音频，例如用户插话打断播报时；
+- 统计排队时延（入队到发送完成）和队列深度。
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+AUDIO = 0
+MESSAGE = 1
+
+
+class RelayChannel:
+    """
+    Args:
+        name: 日志/统计中的名字
+        send_audio: async send_audio(bytes)
+        send_message: async send_message(obj)，不转发控制消息时可以为空
+        bytes_per_ms: 音频每毫秒字节数，用于把时长换算成字节
+        max_audio_ms: 队列中音频的最大积压时长，超过后丢弃最旧的音频
+        max_batch_ms: 合并发送的最大音频时长（0 表示不合并，保持原有分帧）
+        latency_window: 计算时延分位数时保留的最近样本数
+    """
+
+    def __init__(self, name: str, send_audio: Callable[[bytes], Awaitable[None]],
+                 send_message: Optional[Callable[[Any], Awaitable[None]]] = None, bytes_per_ms: float = 32.0,
+                 max_audio_ms: int = 2000, max_batch_ms: int = 0, latency_window: int = 256):
+        self.name = name
+        self._send_audio = send_audio
+        self._send_message = send_message
+        self.bytes_per_ms = bytes_per_ms
+        self.max_audio_bytes = int(max_audio_ms * bytes_per_ms)
+        self.max_batch_bytes = int(max_batch_ms * bytes_per_ms)
+
+        self._queue = deque()  # (kind, payload, enqueued_at)
+        self._audio_bytes = 0
+        self._ready = asyncio.Event()
+        self._closed = False
+        self._task: Optional[asyncio.Task] = None
+        self.error: Optional[BaseException] = None
+
+        self._latencies = deque(maxlen=latency_window)
+        self.items_in = 0
+        self.sends = 0
+        self.bytes_out = 0
+        self.dropped_items = 0
+        self.dropped_bytes = 0
+        self.cleared_bytes = 0
+        self.max_depth = 0
+        self.max_audio_ms = 0.0
+
+    def start(self) -> asyncio.Task:
+        """启动发送协程；发送出错时协程结束，错误保存在 error"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        return self._task
+
+    async def put_audio(self, data: bytes):
+        """入队音频，不会等待对端"""
+        if self._closed or not data:
+            return
+        self._queue.append((AUDIO, data, time.monotonic()))
+        self._audio_bytes += len(data)
+        self.items_in += 1
+        self._drop_stale()
+        self._touch()
+
+    async def put_message(self, message: Any):
+        """入队控制消息，不会被丢弃"""
+        if self._closed:
+            return
+        self._queue.append((MESSAGE, message, time.monotonic()))
+        self.items_in += 1
+        self._touch()
+
+    def clear_audio(self):
+        """丢弃所有尚未发出的音频，控制消息保留"""
+        if not self._audio_bytes:
+            return
+        self.cleared_bytes += self._audio_bytes
+        self._queue = deque(item for item in self._queue if item[0] != AUDIO)
+        self._audio_bytes = 0
+
+    def _drop_stale(self):
+        if self._audio_bytes <= self.max_audio_bytes:
+            return
+        kept = deque()
+        # 从最旧的音频开始丢，直到积压回到上限以内；控制消息原样保留
+        while self._queue and self._audio_bytes > self.max_audio_bytes:
+            item = self._queue.popleft()
+            if item[0] == AUDIO:
+                self._audio_bytes -= len(item[1])
+                self.dropped_items += 1
+                self.dropped_bytes += len(item[1])
+            else:
+                kept.append(item)
+        kept.extend(self._queue)
+        self._queue = kept
+
+    def _touch(self):
+        depth = len(self._queue)
+        if depth > self.max_depth:
+            self.max_depth = depth
+        audio_ms = self._audio_bytes / self.bytes_per_ms
+        if audio_ms > self.max_audio_ms:
+            self.max_audio_ms = audio_ms
+        self._ready.set()
+
+    async def _run(self):
+        try:
+            while True:
+                while not self._queue:
+                    if self._closed:
+                        return
+                    self._ready.clear()
+                    await self._ready.wait()
+
+                kind, payload, enqueued_at = self._queue.popleft()
+                if kind == AUDIO:
+                    self._audio_bytes -= len(payload)
+                    if self.max_batch_bytes and self._queue and self._queue[0][0] == AUDIO:
+                        parts, size = [payload], len(payload)
+                        while (self._queue and self._queue[0][0] == AUDIO
+                               and size + len(self._queue[0][1]) <= self.max_batch_bytes):
+                            data = self._queue.popleft()[1]
+                            self._audio_bytes -= len(data)
+                            parts.append(data)
+                            size += len(data)
+                        payload = b"".join(parts)
+                    await self._send_audio(payload)
+                    self.bytes_out += len(payload)
+                elif self._send_message is not None:
+                    await self._send_message(payload)
+                self.sends += 1
+                # 合并发送时按最早入队的那一块计时
+                self._latencies.append(time.monotonic() - enqueued_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = e
+            print(f"[Relay] {self.name} send failed: {e}")
+
+    async def close(self, drain_timeout: float = 1.0):
+        """停止接收新数据，在 drain_timeout 内尽量发完队列后结束发送协程"""
+        self._closed = True
+        self._ready.set()
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), drain_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self._task.cancel()
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        p50 = latencies[len(latencies) // 2] if latencies else 0.0
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+        return {
+            "items_in": self.items_in,
+            "sends": self.sends,
+            "bytes_out": self.bytes_out,
+            "depth": len(self._queue),
+            "max_depth": self.max_depth,
+            "buffered_ms": round(self._audio_bytes / self.bytes_per_ms, 1),
+            "max_buffered_ms": round(self.max_audio_ms, 1),
+            "dropped_items": self.dropped_items,
+            "dropped_ms": round(self.dropped_bytes / self.bytes_per_ms, 1),
+            "cleared_ms": round(self.cleared_bytes / self.bytes_per_ms, 1),
+            "latency_p50_ms": round(p50 * 1000, 1),
+            "latency_p95_ms": round(p95 * 1000, 1),
+            "latency_max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        }
@@ -17,6 +17,7 @@ export default defineConfig({
       '/upload_user_avatar': 'http://localhost:8004',
       '/upload_ai_avatar': 'http://localhost:8004',
       '/config': 'http://localhost:8004',
+      '/traces': 'http://localhost:8004',
       '/ws': {
         target: 'ws://localhost:8004',
         ws: true